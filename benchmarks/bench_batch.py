@@ -0,0 +1,63 @@
+"""
+レシピのバッチ実行のベンチマーク
+
+N個の小さなELFファイルに対してanalyze_elfを実行し、
+1つずつ順にrun_recipeする場合と、run_recipe_batchでプロセスプールに投げる場合のスループットを比べる。
+
+    python benchmarks/bench_batch.py [--files 8 32] [--jobs 1 2 4]
+"""
+import os
+import time
+import argparse
+import tempfile
+
+from common import ROOT, chdir, emit
+from bench_recipe import make_elf, FLAG
+
+RECIPE = "analyze_elf"
+
+
+def run(files, jobs):
+    results = []
+    with tempfile.TemporaryDirectory() as directory, chdir(ROOT):
+        from workspace import create_workspace
+        for count in files:
+            inputs = os.path.join(directory, f"inputs_{count}")
+            os.makedirs(inputs)
+            for i in range(count):
+                make_elf(os.path.join(inputs, f"sample_{i:04d}.elf"), 4096, ["benchmark sample", FLAG])
+
+            workspace = create_workspace("benchmark")
+            start = time.perf_counter()
+            for name in sorted(os.listdir(inputs)):
+                workspace.run_recipe(RECIPE, [os.path.join(inputs, name), FLAG])
+            seconds = time.perf_counter() - start
+            results.append({"files": count, "mode": "sequential", "seconds": seconds, "files_per_second": count / seconds})
+            workspace.close()
+
+            for max_workers in jobs:
+                workspace = create_workspace("benchmark")
+                progress = workspace.run_recipe_batch(RECIPE, os.path.join(inputs, "*"), [FLAG], max_workers=max_workers)
+                summary = progress.summary()
+                results.append({
+                    "files": count,
+                    "mode": f"batch-{max_workers}",
+                    "seconds": summary["seconds"],
+                    "files_per_second": summary["throughput"],
+                    "failed": summary["failed"],
+                    "mean_seconds": summary["mean_seconds"],
+                })
+                workspace.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+    emit("batch", run(args.files, args.jobs))
+
+
+if __name__ == "__main__":
+    main()
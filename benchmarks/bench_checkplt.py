@@ -0,0 +1,73 @@
+"""
+checkpltモジュールのベンチマーク
+
+システムのELFファイル(既定では/usr/bin)をN個調べる時間を測る
+    - spawn: 以前の使い方と同じく、ファイルごとにプロセスを起動して --json で調べる (files <= 32のときのみ)
+    - batch: 全てのファイルを1つのプロセスに渡し、jobs個のワーカプロセスで調べる
+
+    python benchmarks/bench_checkplt.py [--directory /usr/bin] [--files 32 256] [--jobs 1 4] [--repeat 3]
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+from common import ROOT, timeit, emit
+
+SCRIPT = os.path.join(ROOT, "modules/checkplt/checkplt.py")
+MAX_SPAWN_FILES = 32
+
+
+def find_elf_files(directory: str, count: int) -> list:
+    files = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.islink(path) or not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f:
+            if f.read(4) == b"\x7fELF":
+                files.append(path)
+        if len(files) == count:
+            break
+    return files
+
+
+def run(directory, files, jobs, repeat):
+    results = []
+    for count in files:
+        paths = find_elf_files(directory, count)
+        modes = {
+            f"batch_{number}": (lambda number=number: subprocess.run(
+                [sys.executable, SCRIPT, *paths, "--json", "-j", str(number)], stdout=subprocess.DEVNULL, check=True
+            ))
+            for number in jobs
+        }
+        if count <= MAX_SPAWN_FILES:
+            # 調べられないファイルでは終了コードが1になる
+            modes["spawn"] = lambda: [
+                subprocess.run([sys.executable, SCRIPT, path, "--json"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                for path in paths
+            ]
+        for mode, func in modes.items():
+            seconds = timeit(func, repeat)
+            results.append({
+                "files": len(paths),
+                "mode": mode,
+                "seconds": seconds,
+                "files_per_second": len(paths) / seconds,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--directory", default="/usr/bin")
+    parser.add_argument("--files", type=int, nargs="+", default=[32, 256])
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    emit("checkplt", run(args.directory, args.files, sorted(set(args.jobs)), args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+codecモジュールのベンチマーク
+
+フラグで始まる N MBのテキストを rot13 -> hex -> base64 の順に符号化したファイルを "from_base64|from_hex|rot13" で元に戻す時間を測る
+    - legacy: 以前のモジュールと同じく、段ごとにプロセス(base64 -d, xxd -r -p, tr)を起動し一時ファイルで受け渡す
+    - chain:  codecをこのプロセスで(built-inモジュールとして)呼び、ブロックごとにチェイン全体を通す
+    - auto:   チェインを自動で判定してから同じように復号する
+
+    python benchmarks/bench_codec.py [--megabytes 1 16] [--repeat 3]
+"""
+import os
+import random
+import string
+import base64
+import codecs
+import argparse
+import tempfile
+import subprocess
+
+from common import ROOT, timeit, chdir, emit
+from module import builtin
+from registry import module_registry
+from blob import blob_store
+
+CHAIN = "from_base64|from_hex|rot13"
+STAGES = [
+    ["base64", "-d"],
+    ["xxd", "-r", "-p"],
+    ["tr", "A-Za-z", "N-ZA-Mn-za-m"],
+]
+
+
+def legacy(path: str, directory: str) -> str:
+    for i, command in enumerate(STAGES):
+        output = os.path.join(directory, f"stage_{i}.bin")
+        with open(path, "rb") as stdin, open(output, "wb") as stdout:
+            subprocess.run(command, stdin=stdin, stdout=stdout, check=True)
+        path = output
+    return path
+
+
+def run(megabytes, repeat):
+    results = []
+    with tempfile.TemporaryDirectory() as directory, chdir(ROOT):
+        execution = module_registry.get("codec")["execution"]
+        # フレームワークと同じく、入力の読み込みと大きな結果のblob化も含めて測る
+        codec = lambda chain, path: builtin.call_entrypoint(execution["entrypoint"], "function", [chain, path], execution["load-inputs"])
+        # 大きな結果のblobはリポジトリのworkspaceではなく一時ディレクトリに置く
+        blob_store.directory = os.path.join(directory, "blobs")
+        for size in megabytes:
+            random.seed(0)
+            text = "flag{codec_chain}\n" + "".join(random.choices(string.ascii_letters + " \n", k=size * 1024 * 1024))
+            path = os.path.join(directory, f"input_{size}.txt")
+            with open(path, "wb") as f:
+                f.write(base64.encodebytes(codecs.encode(text, "rot13").encode().hex().encode()))
+
+            modes = {
+                "legacy": lambda: legacy(path, directory),
+                "chain": lambda: codec(CHAIN, path),
+                "auto": lambda: codec("auto", path),
+            }
+            for mode, func in modes.items():
+                seconds = timeit(func, repeat)
+                results.append({
+                    "megabytes": size,
+                    "mode": mode,
+                    "seconds": seconds,
+                    "megabytes_per_second": size / seconds,
+                })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--megabytes", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    emit("codec", run(args.megabytes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
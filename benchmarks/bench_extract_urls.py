@@ -0,0 +1,98 @@
+"""
+extract_urlsモジュールのベンチマーク
+
+tsharkの詳細表示に似た N MB のテキストからURLなどを取り出す時間を、外部モジュールとしてプロセスを起動して測る
+    - legacy: 以前の実装 (stdinを全てstrに読み込み、1つの正規表現でfindallする)
+    - url:    ファイルをmmapしてURLだけを探す (既定)
+    - all:    URL, メールアドレス, フラグ, IPアドレス, ドメインを探す
+url, allはワーカプロセスの数(jobs)を変えて測る
+
+    python benchmarks/bench_extract_urls.py [--megabytes 16 64] [--jobs 1 4] [--repeat 3]
+"""
+import os
+import sys
+import random
+import argparse
+import tempfile
+import subprocess
+
+from common import ROOT, timeit, emit
+
+SCRIPT = os.path.join(ROOT, "modules/extract_urls/extract_urls.py")
+
+LEGACY = r"""
+import re
+import sys
+text = sys.stdin.read()
+url_pattern = re.compile(r'https?://[\w/:%#\$&\?\(\)~\.=\+\-]+')
+for url in url_pattern.findall(text):
+    print(url)
+"""
+
+
+def make_dump(path: str, megabytes: int) -> None:
+    random.seed(0)
+    size = megabytes * 1024 * 1024
+    with open(path, "w") as f:
+        written = 0
+        frame = 0
+        while written < size:
+            frame += 1
+            host = f"host{random.randint(0, 2000)}.example{random.randint(0, 50)}.com"
+            src = f"10.0.{random.randint(0, 255)}.{random.randint(1, 254)}"
+            dst = f"93.184.{random.randint(0, 255)}.{random.randint(1, 254)}"
+            path_ = f"/api/v1/items/{random.randint(0, 100000)}?page={random.randint(0, 9)}"
+            lines = [
+                f"Frame {frame}: 512 bytes on wire (4096 bits), 512 bytes captured (4096 bits) on interface eth0, id 0",
+                f"Internet Protocol Version 4, Src: {src}, Dst: {dst}",
+                f"Transmission Control Protocol, Src Port: {random.randint(1024, 65535)}, Dst Port: 80, Seq: 1, Ack: 1, Len: 446",
+                "Hypertext Transfer Protocol",
+                f"    GET {path_} HTTP/1.1\\r\\n",
+                f"    Host: {host}\\r\\n",
+                "    User-Agent: Mozilla/5.0 (X11; Linux x86_64; rv:120.0) Gecko/20100101 Firefox/120.0\\r\\n",
+                f"    [Full request URI: http://{host}{path_}]",
+            ]
+            if frame % 1000 == 0:
+                lines.append(f"    Cookie: user=admin{frame}@corp.example.org; token=flag{{pcap_{frame}}}\\r\\n")
+            text = "\n".join(lines) + "\n\n"
+            f.write(text)
+            written += len(text)
+
+
+def run(megabytes, jobs, repeat):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in megabytes:
+            path = os.path.join(directory, f"dump_{size}.txt")
+            make_dump(path, size)
+
+            def legacy():
+                with open(path, "rb") as f:
+                    subprocess.run([sys.executable, "-c", LEGACY], stdin=f, stdout=subprocess.DEVNULL, check=True)
+
+            results.append({"megabytes": size, "mode": "legacy", "jobs": 1, "seconds": timeit(legacy, repeat)})
+            for types in ("url", "all"):
+                for count in jobs:
+                    command = [sys.executable, SCRIPT, "-t", types, "-j", str(count), path]
+                    output = subprocess.run(command, capture_output=True, check=True).stdout
+                    results.append({
+                        "megabytes": size,
+                        "mode": types,
+                        "jobs": count,
+                        "lines": output.count(b"\n"),
+                        "seconds": timeit(lambda: subprocess.run(command, stdout=subprocess.DEVNULL, check=True), repeat),
+                    })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--megabytes", type=int, nargs="+", default=[16, 64])
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    emit("extract_urls", run(args.megabytes, sorted(set(args.jobs)), args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+hashcalcモジュールのベンチマーク
+
+N個のファイル(合計 M MB)のMD5, SHA1, SHA256を計算する時間を測る
+    - legacy: 以前の実装と同じく、アルゴリズムごとに4096バイトずつファイルを読み直す (1ファイルずつ)
+    - spawn:  以前の使い方と同じく、ファイルとアルゴリズムごとにプロセスを起動する (files <= 8のときのみ)
+    - single: 1回の読み込みで全てのアルゴリズムを計算する (1スレッド)
+    - parallel: singleをスレッドプールで並列に行う
+
+    python benchmarks/bench_hashcalc.py [--files 1 64] [--megabytes 256] [--repeat 3]
+"""
+import os
+import sys
+import hashlib
+import argparse
+import tempfile
+import subprocess
+
+from common import ROOT, timeit, chdir, emit
+from module import builtin
+
+ALGORITHMS = ["MD5", "SHA1", "SHA256"]
+MAX_SPAWN_FILES = 8
+
+
+def legacy(files):
+    for path in files:
+        for algorithm in ALGORITHMS:
+            hash_obj = hashlib.new(algorithm)
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(4096), b""):
+                    hash_obj.update(chunk)
+            hash_obj.hexdigest()
+
+
+def spawn(files):
+    script = os.path.join(ROOT, "modules/hashcalc/hashcalc.py")
+    for path in files:
+        for algorithm in ALGORITHMS:
+            subprocess.run([sys.executable, script, path, algorithm], check=True, stdout=subprocess.DEVNULL)
+
+
+def run(files, megabytes, repeat):
+    results = []
+    with tempfile.TemporaryDirectory() as directory, chdir(ROOT):
+        hashcalc = builtin.load_entrypoint("modules/hashcalc/hashcalc.py:hashcalc")
+        for count in files:
+            target = os.path.join(directory, str(count))
+            os.makedirs(target)
+            size = megabytes * 1024 * 1024 // count
+            for i in range(count):
+                with open(os.path.join(target, f"{i:04d}.bin"), "wb") as f:
+                    f.write(os.urandom(size))
+            paths = sorted(os.path.join(target, name) for name in os.listdir(target))
+            modes = {
+                "legacy": lambda: legacy(paths),
+                "single": lambda: hashcalc(target, ",".join(ALGORITHMS), "1"),
+                "parallel": lambda: hashcalc(target, ",".join(ALGORITHMS)),
+            }
+            if count <= MAX_SPAWN_FILES:
+                modes["spawn"] = lambda: spawn(paths)
+            for mode, func in modes.items():
+                seconds = timeit(func, repeat)
+                results.append({
+                    "files": count,
+                    "megabytes": megabytes,
+                    "mode": mode,
+                    "seconds": seconds,
+                    "megabytes_per_second": megabytes / seconds,
+                })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, nargs="+", default=[1, 64])
+    parser.add_argument("--megabytes", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    emit("hashcalc", run(args.files, args.megabytes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
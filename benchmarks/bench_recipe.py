@@ -0,0 +1,102 @@
+"""
+レシピのend-to-endのベンチマーク
+
+生成した小さなELF(コードとフラグ文字列を埋め込んだもの)を入力にして
+analyze_elf / forensics_1 を実行し、Recipe()の作成からget_result()までの時間を測る。
+外部コマンド(strings, objdump, grep, exiftool)が無い環境ではそのステップは失敗した結果になるが、
+レシピ自体の実行時間は測れる。結果のキャッシュは一時ディレクトリに向けて毎回空にする。
+
+    python benchmarks/bench_recipe.py [--code-sizes 1024 16384 131072] [--repeat 5]
+"""
+import os
+import shutil
+import struct
+import argparse
+import tempfile
+
+from common import ROOT, timeit, chdir, emit
+from module import result_cache
+from recipe import Recipe
+
+RECIPES = ["analyze_elf", "forensics_1"]
+FLAG = "flag{benchmark}"
+BASE_ADDRESS = 0x400000
+
+
+def make_elf(path, code_size, strings):
+    """
+    x86-64の最小限のELF(.text, .rodata, .shstrtab)を書き出す
+
+    Args:
+        code_size (int): .textのバイト数(nopを並べて最後をretにする)
+        strings (list): .rodataに置く文字列
+    """
+    text = b"\x90" * (code_size - 1) + b"\xc3"
+    rodata = b"".join(s.encode() + b"\0" for s in strings)
+    shstrtab = b"\0.text\0.rodata\0.shstrtab\0"
+
+    text_offset = 64 + 56
+    rodata_offset = text_offset + len(text)
+    shstrtab_offset = rodata_offset + len(rodata)
+    section_offset = (shstrtab_offset + len(shstrtab) + 7) & ~7
+    end = section_offset + 64 * 4
+
+    header = struct.pack(
+        "<16sHHIQQQIHHHHHH",
+        b"\x7fELF\x02\x01\x01" + b"\0" * 9,
+        2, 0x3e, 1, BASE_ADDRESS + text_offset, 64, section_offset, 0, 64, 56, 1, 64, 4, 3,
+    )
+    program_header = struct.pack("<IIQQQQQQ", 1, 5, 0, BASE_ADDRESS, BASE_ADDRESS, end, end, 0x1000)
+    sections = [
+        struct.pack("<IIQQQQIIQQ", 0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+        struct.pack("<IIQQQQIIQQ", 1, 1, 6, BASE_ADDRESS + text_offset, text_offset, len(text), 0, 0, 1, 0),
+        struct.pack("<IIQQQQIIQQ", 7, 1, 2, BASE_ADDRESS + rodata_offset, rodata_offset, len(rodata), 0, 0, 1, 0),
+        struct.pack("<IIQQQQIIQQ", 15, 3, 0, 0, shstrtab_offset, len(shstrtab), 0, 0, 1, 0),
+    ]
+    with open(path, "wb") as f:
+        f.write(header + program_header + text + rodata + shstrtab)
+        f.write(b"\0" * (section_offset - f.tell()))
+        f.write(b"".join(sections))
+
+
+def run(code_sizes, repeat):
+    results = []
+    cache_directory = result_cache.directory
+    with tempfile.TemporaryDirectory() as directory, chdir(ROOT):
+        result_cache.directory = os.path.join(directory, "results")
+        try:
+            for code_size in code_sizes:
+                path = os.path.join(directory, f"sample_{code_size}.elf")
+                make_elf(path, code_size, ["benchmark sample", FLAG] + [f"string_{i:06d}" for i in range(code_size // 256)])
+                for recipe_name in RECIPES:
+                    def once():
+                        result_cache.clear()
+                        recipe = Recipe(recipe_name, {})
+                        recipe.run([path, FLAG])
+                        result = recipe.get_result()
+                        if hasattr(recipe, "recipe_dir"):
+                            shutil.rmtree(recipe.recipe_dir, ignore_errors=True)
+                        return result
+
+                    found = any(FLAG in str(output) for output in once())
+                    results.append({
+                        "recipe": recipe_name,
+                        "file_bytes": os.path.getsize(path),
+                        "flag_found": found,
+                        "seconds": timeit(once, repeat),
+                    })
+        finally:
+            result_cache.directory = cache_directory
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--code-sizes", type=int, nargs="+", default=[1024, 16384, 131072])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    emit("recipe", run(args.code_sizes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
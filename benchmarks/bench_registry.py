@@ -0,0 +1,84 @@
+"""
+レジストリのベンチマーク
+
+定義ファイルの数を増やしながら、以前の実装(毎回ディレクトリ全体を読み直してjsonschemaで検証する)と
+Registryのルックアップ時間を比較する。生成した定義ファイルだけを使うのでオフラインで動く。
+
+    python benchmarks/bench_registry.py [--sizes 10 100 1000] [--repeat 200]
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import jsonschema
+
+from common import ROOT, timeit, emit
+from registry import Registry
+
+
+def make_definitions(directory, count):
+    shutil.copy(os.path.join(ROOT, "modules/json/schema.json"), directory)
+    for i in range(count):
+        definition = {
+            "type": "external",
+            "name": f"bench_{i}",
+            "description": "benchmark module",
+            "execution": {"command": ["true", "{input.0}"]},
+            "prepare-module-directory": False,
+            "data": {"input": {"type": "json"}, "output": {"type": "json"}},
+        }
+        with open(os.path.join(directory, f"bench_{i}.json"), "w") as f:
+            json.dump(definition, f)
+
+
+def legacy_lookup(directory, name):
+    # 以前のModule.get_module_list()と同じ処理
+    module_list = {}
+    for file in os.listdir(directory):
+        if file.endswith('.json') and file != 'schema.json':
+            with open(os.path.join(directory, file), 'r') as f:
+                module_json = json.load(f)
+                jsonschema.validate(module_json, json.load(open(os.path.join(directory, 'schema.json'))))
+                module_list[module_json["name"]] = file
+    return module_list[name]
+
+
+def run(sizes, repeat):
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            make_definitions(directory, size)
+            registry = Registry(directory)
+
+            start = time.perf_counter()
+            registry.refresh()
+            cold = time.perf_counter() - start
+
+            target = f"bench_{size // 2}"
+            warm = timeit(lambda: registry.get(target), repeat)
+            listing = timeit(registry.files, max(1, repeat // 10))
+            legacy = timeit(lambda: legacy_lookup(directory, target), max(1, min(repeat, 200 // size)))
+
+            results.append({
+                "definitions": size,
+                "cold_build_s": cold,
+                "lookup_s": warm,
+                "list_s": listing,
+                "legacy_lookup_s": legacy,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="registry benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    emit("registry", run(args.sizes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+レシピのフラグ探索のベンチマーク
+
+strings風のデータ(ランダムな英数字の行)にフラグを埋め込み、N種類のフラグの形式で探す。
+形式ごとにgrepを起動する場合(これまでのレシピ)と、FlagScannerで1回だけ走査する場合の時間を比べる。
+FlagScannerはgrepと同じくUTF-8だけを探す場合と、UTF-16とbase64で埋め込まれたものも探す場合の両方を測る。
+
+    python benchmarks/bench_scanner.py [--formats 1 10 50] [--megabytes 16] [--repeat 3]
+"""
+import os
+import base64
+import random
+import string
+import argparse
+import tempfile
+import subprocess
+
+from common import timeit, emit
+from recipe.scanner import FlagScanner
+
+
+def make_formats(rng, count):
+    return ["flag"] + ["".join(rng.choices(string.ascii_letters, k=rng.randint(3, 8))) for _ in range(count - 1)]
+
+
+def make_data(rng, size, formats):
+    lines = []
+    total = 0
+    while total < size:
+        line = "".join(rng.choices(string.ascii_letters + string.digits, k=rng.randint(4, 40)))
+        lines.append(line)
+        total += len(line) + 1
+    data = "\n".join(lines).encode()
+    flag = f"{formats[-1]}{{benchmark}}"
+    return b"\n".join([data, flag.encode(), flag.encode("utf-16le"), base64.b64encode(flag.encode())])
+
+
+def run(formats, megabytes, repeat):
+    results = []
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        for count in formats:
+            names = make_formats(rng, count)
+            patterns = [rf"{name}\{{[^}}]*\}}" for name in names]
+            path = os.path.join(directory, f"data_{count}.txt")
+            with open(path, "wb") as f:
+                f.write(make_data(rng, megabytes * 1024 * 1024, names))
+
+            def grep():
+                found = []
+                for pattern in patterns:
+                    process = subprocess.run(["grep", "-aoE", pattern, path], stdout=subprocess.PIPE)
+                    found.extend(process.stdout.splitlines())
+                return found
+
+            scanner = FlagScanner(patterns, ["utf-8"])
+            all_scanner = FlagScanner(patterns)
+            results.append({
+                "formats": count,
+                "bytes": os.path.getsize(path),
+                "grep_matches": len(grep()),
+                "scanner_matches": len(scanner.scan_file(path)),
+                "all_encodings_matches": len(all_scanner.scan_file(path)),
+                "grep_seconds": timeit(grep, repeat),
+                "scanner_seconds": timeit(lambda: scanner.scan_file(path), repeat),
+                "all_encodings_seconds": timeit(lambda: all_scanner.scan_file(path), repeat),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--formats", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--megabytes", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    emit("scanner", run(args.formats, args.megabytes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+ワークスペース全体の全文検索のベンチマーク
+
+strings風の出力(ランダムな英数字の行)をN個持つワークスペースを作り、1つだけにフラグを埋め込む。
+WorkSpace.search (trigram索引で候補を絞ってから検索) と、全ての結果を正規表現で走査する場合の時間を比べる。
+索引を作る時間(結果の追加と最初の検索にかかる時間)も測る。
+
+    python benchmarks/bench_search.py [--sizes 10 100 1000] [--lines 1000] [--repeat 20]
+"""
+import re
+import time
+import random
+import string
+import argparse
+import tempfile
+
+from common import ROOT, timeit, chdir, emit
+
+PATTERN = r"flag\{[0-9a-f]+\}"
+
+
+def make_output(rng, lines):
+    return "\n".join("".join(rng.choices(string.ascii_letters + string.digits, k=rng.randint(4, 40))) for _ in range(lines))
+
+
+def run(sizes, lines, repeat):
+    results = []
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        with chdir(directory):
+            from workspace import create_workspace
+        with chdir(ROOT):
+            for size in sizes:
+                workspace = create_workspace("benchmark")
+                outputs = [make_output(rng, lines) for _ in range(size)]
+                outputs[size // 2] += "\nflag{0123456789abcdef}"
+                # コマンドの結果として直接登録する(索引の追加時間だけを測るため)
+                index = workspace.get_index()
+                for i, output in enumerate(outputs):
+                    workspace.cmd_state[f"cmd-{i}"] = {"cmd": ["strings"], "running": False, "status": "done", "output": output}
+                start = time.perf_counter()
+                for i, output in enumerate(outputs):
+                    index.add(f"cmd-{i}", output)
+                index_seconds = time.perf_counter() - start
+
+                regex = re.compile(PATTERN)
+
+                def scan():
+                    return [(i, match.start()) for i, output in enumerate(outputs) for match in regex.finditer(output)]
+
+                # 最初の検索ではメモリ上の転置索引を作る
+                start = time.perf_counter()
+                found = workspace.search(PATTERN)
+                first_search_seconds = time.perf_counter() - start
+                results.append({
+                    "results": size,
+                    "bytes": sum(map(len, outputs)),
+                    "matches": len(found),
+                    "index_seconds": index_seconds,
+                    "first_search_seconds": first_search_seconds,
+                    "search_seconds": timeit(lambda: workspace.search(PATTERN), repeat),
+                    "scan_seconds": timeit(scan, repeat),
+                })
+                workspace.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--lines", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    emit("search", run(args.sizes, args.lines, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+モジュール1回の実行にかかるオーバーヘッドのベンチマーク
+
+何もしないモジュールを実行方式ごとに用意し、Module()の作成からget_result()までの時間を測る
+    - external (シェル経由で true を実行)
+    - external-python (python3で空のスクリプトを実行)
+    - external-forkserver (同じスクリプトをforkserverで実行)
+    - built-in (同じ処理をプロセス内で関数として呼ぶ)
+結果のキャッシュは無効にしてある。
+
+    python benchmarks/bench_spawn.py [--repeat 50]
+"""
+import sys
+import argparse
+
+from common import timeit, temporary_root, emit
+from module import Module
+
+NOOP_SCRIPT = """
+def noop(*args):
+    return []
+
+
+if __name__ == "__main__":
+    print("[]")
+"""
+
+
+def make_definition(name, module_type, command, **execution):
+    definition = {
+        "type": module_type,
+        "name": name,
+        "description": "benchmark module",
+        "cache": False,
+        "execution": {"command": command, **execution},
+        "prepare-module-directory": False,
+        "data": {"input": {"type": "json"}, "output": {"type": "json"}},
+    }
+    if module_type == "built-in":
+        definition["method"] = "function"
+    return definition
+
+
+DEFINITIONS = {
+    "external": make_definition("noop_external", "external", ["true"]),
+    "external-python": make_definition("noop_python", "external", [sys.executable, "noop/noop.py"]),
+    "external-forkserver": make_definition("noop_forkserver", "external", [sys.executable, "noop/noop.py"], preload=[]),
+    "built-in": make_definition("noop_builtin", "built-in", [], entrypoint="noop/noop.py:noop"),
+}
+
+
+def run(repeat):
+    results = []
+    module_definitions = {definition["name"] + ".json": definition for definition in DEFINITIONS.values()}
+    with temporary_root(module_definitions, {"noop/noop.py": NOOP_SCRIPT}):
+        for kind, definition in DEFINITIONS.items():
+            def once():
+                module = Module(definition["name"], {})
+                module.run([])
+                module.get_result()
+
+            # forkserverの起動やentrypointの読み込みは初回だけなので計測から除く
+            once()
+            results.append({"kind": kind, "seconds": timeit(once, repeat)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    emit("spawn", run(args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+CLIの起動時間のベンチマーク
+
+modules/jsonとrecipesをコピーした一時ディレクトリで `python src/cli.py list module` を別プロセスとして起動し、時間を測る。
+    - python: 何もしないPythonの起動 (下限)
+    - eager-imports: 以前のcli.pyが起動時にimportしていたもの(prompt_toolkit, workspace, jsonschema)のimportだけ
+    - no-snapshot: レジストリのスナップショットが無い状態 (全ての定義をjsonschemaで検証する)
+    - snapshot: スナップショットがある状態 (2回目以降の起動)
+
+    python benchmarks/bench_startup.py [--repeat 10]
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from common import ROOT, timeit, chdir, emit
+
+CLI = os.path.join(ROOT, "src", "cli.py")
+COMMANDS = {
+    "python": [sys.executable, "-c", "pass"],
+    "eager-imports": [sys.executable, "-c", "import prompt_toolkit, jsonschema, workspace.manager"],
+    "no-snapshot": [sys.executable, CLI, "list", "module"],
+    "snapshot": [sys.executable, CLI, "list", "module"],
+}
+
+
+def run(repeat):
+    results = []
+    with tempfile.TemporaryDirectory() as directory, chdir(directory):
+        shutil.copytree(os.path.join(ROOT, "modules", "json"), os.path.join(directory, "modules", "json"))
+        shutil.copytree(os.path.join(ROOT, "recipes"), os.path.join(directory, "recipes"))
+        env = dict(os.environ, PYTHONPATH=os.path.join(ROOT, "src"))
+        for kind, command in COMMANDS.items():
+            def once():
+                if kind == "no-snapshot":
+                    shutil.rmtree(os.path.join(directory, ".cache"), ignore_errors=True)
+                subprocess.run(command, stdout=subprocess.DEVNULL, env=env, check=True)
+
+            # .pycを作っておく
+            once()
+            results.append({"kind": kind, "seconds": timeit(once, repeat)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    emit("startup", run(args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+レシピのステップ間のデータの受け渡しのベンチマーク
+
+N MBのファイルをcatするステップの出力を、wc -cするステップに渡すレシピを3通り用意して時間を比べる。
+    - tee: これまでのレシピのように | tee でファイルに書き、次のステップがそのファイルを読む
+    - stream: stdinでつなぎ、catの出力も結果として残す (このプロセスを経由してパイプへ書き込む)
+    - stream-nocapture: stdinでつなぎ、catの結果は残さない (プロセス同士を直接パイプでつなぐ)
+
+    python benchmarks/bench_stream.py [--megabytes 1 16 64] [--repeat 3]
+"""
+import os
+import json
+import shutil
+import argparse
+
+from common import ROOT, timeit, temporary_root, emit
+
+
+def make_definition(name, command):
+    return {
+        "type": "external",
+        "name": name,
+        "description": "benchmark module",
+        "cache": False,
+        "execution": {"command": command},
+        "prepare-module-directory": False,
+        "data": {"input": {"type": "json"}, "output": {"type": "json"}},
+    }
+
+
+def make_recipe(name, chain):
+    return {
+        "name": name,
+        "prepare-recipe-directory": True,
+        "execution-chain": chain,
+        "output": ["{count.output}"],
+    }
+
+
+MODULES = {
+    "cat.json": make_definition("cat", ["cat", "{input.0}"]),
+    "wc.json": make_definition("wc", ["wc", "-c", "{input.0}"]),
+}
+
+RECIPES = {
+    "tee": make_recipe("stream_tee", [
+        {"name": "cat", "type": "module", "inrecipe-name": "data", "arguments": ["{input.0} | tee {recipe_dir}/data.txt"]},
+        {"name": "wc", "type": "module", "inrecipe-name": "count", "arguments": ["< {recipe_dir}/data.txt"]},
+    ]),
+    "stream": make_recipe("stream_capture", [
+        {"name": "cat", "type": "module", "inrecipe-name": "data", "arguments": ["{input.0}"]},
+        {"name": "wc", "type": "module", "inrecipe-name": "count", "stdin": "data", "arguments": [""]},
+    ]),
+    "stream-nocapture": make_recipe("stream_nocapture", [
+        {"name": "cat", "type": "module", "inrecipe-name": "data", "capture": False, "arguments": ["{input.0}"]},
+        {"name": "wc", "type": "module", "inrecipe-name": "count", "stdin": "data", "arguments": [""]},
+    ]),
+}
+
+
+def run(megabytes, repeat):
+    results = []
+    files = {f"recipes/{recipe['name']}.json": json.dumps(recipe) for recipe in RECIPES.values()}
+    with temporary_root(MODULES, files) as directory:
+        shutil.copy(os.path.join(ROOT, "recipes/schema.json"), os.path.join(directory, "recipes"))
+        from recipe import Recipe
+        for size in megabytes:
+            path = os.path.join(directory, f"data_{size}.txt")
+            with open(path, "wb") as f:
+                f.write(b"0123456789abcdef" * (size * 1024 * 1024 // 16))
+            for kind, definition in RECIPES.items():
+                def once():
+                    recipe = Recipe(definition["name"], {})
+                    recipe.run([path])
+                    result = recipe.get_result()
+                    shutil.rmtree(recipe.recipe_dir, ignore_errors=True)
+                    return result
+
+                results.append({
+                    "kind": kind,
+                    "bytes": os.path.getsize(path),
+                    "result": str(once()[0]).split()[0],
+                    "seconds": timeit(once, repeat),
+                })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--megabytes", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    emit("stream", run(args.megabytes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+テンプレート展開のベンチマーク
+
+大きな変数ツリー(モジュール実行結果N個、それぞれ出力M要素)に対して
+    - 値を1つ参照するテンプレート ({m_k.output.0.value} を含むコマンド)
+    - 出力全体をjsonとして埋め込むテンプレート ({m_k.output})
+    - replace_template_nostrによる値の取り出し
+の1回あたりの時間を測る。compileは初回のみなので別に測る。
+
+    python benchmarks/bench_template.py [--sizes 10 100 1000] [--items 100] [--repeat 1000]
+"""
+import argparse
+
+from common import timeit, emit
+import utils
+
+
+def make_variables(size, items):
+    return {
+        f"m_{i}": {"output": [{"index": j, "value": f"flag{{{i}_{j}}}"} for j in range(items)]}
+        for i in range(size)
+    }
+
+
+def run(sizes, items, repeat):
+    results = []
+    for size in sizes:
+        variables = make_variables(size, items)
+        last = f"m_{size - 1}"
+        scalar = f"grep {{input.0}} {{{last}.output.{items - 1}.value}} | tee {{recipe_dir}}/out.txt"
+        whole = f"{{{last}.output}}"
+        variables["input"] = ["flag"]
+        variables["recipe_dir"] = "/tmp/recipe"
+
+        def compile_once():
+            utils.compile_template.cache_clear()
+            utils.compile_template(scalar)
+
+        results.append({
+            "definitions": size,
+            "items": items,
+            "compile_seconds": timeit(compile_once, repeat),
+            "render_scalar_seconds": timeit(lambda: utils.replace_template(variables, scalar), repeat),
+            "render_whole_seconds": timeit(lambda: utils.replace_template(variables, whole), max(1, repeat // 10)),
+            "resolve_seconds": timeit(lambda: utils.replace_template_nostr(variables, whole), repeat),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+    emit("template", run(args.sizes, args.items, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+実行トレースのオーバーヘッドのベンチマーク
+
+analyze_elfを、スパンを記録しない場合(collectの外)と記録する場合で実行し、
+1回あたりの時間と記録したスパン数、Chrome traceへの書き出しにかかる時間を比べる。
+結果のキャッシュは一時ディレクトリに向けて毎回空にする。
+
+    python benchmarks/bench_tracing.py [--repeat 5]
+"""
+import os
+import time
+import argparse
+import tempfile
+
+from common import ROOT, timeit, chdir, emit
+from bench_recipe import make_elf, FLAG
+from module import result_cache
+from recipe import Recipe
+import tracing
+
+RECIPE = "analyze_elf"
+
+
+def run(repeat):
+    results = []
+    cache_directory = result_cache.directory
+    with tempfile.TemporaryDirectory() as directory, chdir(ROOT):
+        result_cache.directory = os.path.join(directory, "results")
+        try:
+            path = os.path.join(directory, "sample.elf")
+            make_elf(path, 16384, ["benchmark sample", FLAG])
+
+            def once():
+                result_cache.clear()
+                recipe = Recipe(RECIPE, {})
+                recipe.run([path, FLAG])
+                return recipe.get_result()
+
+            def traced():
+                with tracing.collect() as trace:
+                    once()
+                return trace
+
+            once()
+            results.append({"mode": "untraced", "seconds": timeit(once, repeat)})
+            results.append({"mode": "traced", "seconds": timeit(traced, repeat), "spans": len(traced().spans)})
+
+            trace = traced().to_json()
+            output = os.path.join(directory, "trace.json")
+            start = time.perf_counter()
+            count = tracing.write_chrome_trace({"recipe": trace}, output)
+            results.append({"mode": "export", "seconds": time.perf_counter() - start, "spans": count, "bytes": os.path.getsize(output)})
+        finally:
+            result_cache.directory = cache_directory
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    emit("tracing", run(args.repeat))
+
+
+if __name__ == "__main__":
+    main()
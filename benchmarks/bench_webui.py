@@ -0,0 +1,174 @@
+"""
+Web UIの負荷試験
+
+サーバを別のプロセスで起動し、このプロセスからローカルのクライアントで接続する。
+    - http: C本のkeep-aliveの接続からGET /api/entriesを繰り返し、リクエスト/秒とレイテンシを測る
+    - stream: C個のWebSocketクライアントが1つのモジュールの出力を購読し、
+              開始から全員が完了の通知を受け取るまでの時間と、各クライアントが受け取った出力の量を測る
+
+    python benchmarks/bench_webui.py [--clients 10 100 500] [--requests 20] [--lines 2000]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+
+from common import ROOT, temporary_root, emit
+from framework.webui.protocol import connect_websocket
+
+SERVER = """
+import sys, asyncio
+sys.path.insert(0, sys.argv[1])
+from workspace import WorkSpace
+from framework import WebUIServer
+
+async def main():
+    server = WebUIServer(WorkSpace(workspace_name="benchmark"), "127.0.0.1", 0, max_connections=4096)
+    await server.start()
+    print(server.port, server.token, flush=True)
+    await server.serve_forever()
+
+asyncio.run(main())
+"""
+
+# JSONの配列を1行ずつflushしながら出力する
+STREAM = """
+import sys
+count = int(sys.argv[1])
+print("[", flush=True)
+for i in range(count):
+    print(f'"line {i:08d} ' + 'x' * 64 + '",', flush=True)
+print('"end"]', flush=True)
+"""
+
+MODULES = {
+    "stream.json": {
+        "type": "external",
+        "name": "stream",
+        "description": "benchmark module",
+        "cache": False,
+        "execution": {"command": ["python3", "stream.py", "{input.0}"]},
+        "prepare-module-directory": False,
+        "data": {"input": {"type": "json"}, "output": {"type": "json"}},
+    },
+}
+
+
+async def request(reader, writer, port, token, method, path, body=None):
+    data = json.dumps(body).encode() if body is not None else b""
+    writer.write((
+        f"{method} {path} HTTP/1.1\r\nHost: localhost:{port}\r\nX-PyCTF-Token: {token}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n"
+    ).encode() + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (line := await reader.readline()) != b"\r\n":
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def http_load(port, token, clients, requests):
+    latencies = []
+
+    async def client():
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for _ in range(requests):
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, port, token, "GET", "/api/entries")
+            latencies.append(time.perf_counter() - start)
+            assert status == 200
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "mode": "http",
+        "clients": clients,
+        "requests": len(latencies),
+        "seconds": seconds,
+        "requests_per_second": len(latencies) / seconds,
+        "p50_seconds": latencies[len(latencies) // 2],
+        "p99_seconds": latencies[int(len(latencies) * 0.99)],
+    }
+
+
+async def stream_load(port, token, clients, lines):
+    websockets = [await connect_websocket("127.0.0.1", port, token=token) for _ in range(clients)]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    start = time.perf_counter()
+    _, response = await request(reader, writer, port, token, "POST", "/api/modules/run", {"name": "stream", "args": [str(lines)]})
+    id = response["id"]
+    for websocket in websockets:
+        await websocket.send({"subscribe": id})
+
+    async def receive(websocket):
+        received = lagged = 0
+        first = None
+        while True:
+            message = json.loads(await websocket.receive())
+            if message.get("id") != id and message["type"] != "lagged":
+                continue
+            if message["type"] == "output":
+                first = first or time.perf_counter()
+                received += len(message["data"])
+            elif message["type"] == "lagged":
+                lagged += message["dropped"]
+            elif message["type"] == "status" and message["status"] not in ("pending", "running"):
+                return received, lagged, first, time.perf_counter()
+
+    results = await asyncio.gather(*(receive(websocket) for websocket in websockets))
+    _, result = await request(reader, writer, port, token, "GET", f"/api/entries/{id}/result?page_size=10")
+    writer.close()
+    for websocket in websockets:
+        await websocket.close()
+        websocket.writer.close()
+    received = [result[0] for result in results]
+    firsts = [result[2] - start for result in results if result[2] is not None]
+    return {
+        "mode": "stream",
+        "clients": clients,
+        "lines": lines,
+        "seconds": max(result[3] for result in results) - start,
+        "first_output_seconds": max(firsts) if firsts else None,
+        "min_received_bytes": min(received),
+        "max_received_bytes": max(received),
+        "dropped_messages": sum(result[1] for result in results),
+        "result_lines": len(result["lines"]),
+    }
+
+
+def run(clients, requests, lines):
+    results = []
+    with temporary_root(MODULES, {"stream.py": STREAM}) as directory:
+        server = subprocess.Popen([sys.executable, "-c", SERVER, os.path.join(ROOT, "src")], cwd=directory, stdout=subprocess.PIPE)
+        try:
+            port, token = server.stdout.readline().decode().split()
+            port = int(port)
+            for count in clients:
+                results.append(asyncio.run(http_load(port, token, count, requests)))
+                results.append(asyncio.run(stream_load(port, token, count, lines)))
+        finally:
+            server.terminate()
+            server.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--lines", type=int, default=2000)
+    args = parser.parse_args()
+    emit("webui", run(args.clients, args.requests, args.lines))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+ワークスペースの保存/読み込みのベンチマーク
+
+built-inモジュール(xor)の実行結果をN個持つワークスペースを作り、
+    - save_workspace_unsafe / load_workspace_unsafe (pickle)
+    - save_workspace (全件の初回保存と、1件だけ増えたあとの差分保存) / load_workspace
+の時間とファイルサイズを測る。load_workspaceは結果本体を遅延して読むので、1件目の結果の取得時間も測る。
+ワークスペースは一時ディレクトリに保存する。
+
+    python benchmarks/bench_workspace.py [--sizes 10 100 1000] [--payload 4096] [--repeat 5]
+"""
+import os
+import time
+import argparse
+import tempfile
+
+from common import ROOT, timeit, chdir, emit
+
+
+def run(sizes, payload, repeat):
+    # workspaceパッケージはimport時にcwdにworkspaceディレクトリを作るので一時ディレクトリで読み込む
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        with chdir(directory):
+            from workspace import create_workspace, save_workspace, load_workspace, save_workspace_unsafe, load_workspace_unsafe
+        with chdir(ROOT):
+            for size in sizes:
+                workspace = create_workspace("benchmark")
+                for i in range(size):
+                    workspace.run_module("xor", [os.urandom(payload // 2).hex(), os.urandom(payload // 2).hex()])
+                pickle_path = os.path.join(directory, f"workspace_{size}.pickle")
+                store_path = os.path.join(directory, f"workspace_{size}.db")
+
+                start = time.perf_counter()
+                save_workspace(workspace, store_path)
+                store_save = time.perf_counter() - start
+
+                def save_delta():
+                    workspace.run_module("xor", ["delta", "delta"])
+                    save_workspace(workspace, store_path)
+                save_delta_seconds = timeit(save_delta, repeat)
+                workspace.close()
+
+                def load():
+                    loaded = load_workspace(store_path)
+                    loaded.close()
+
+                def load_first_result():
+                    loaded = load_workspace(store_path)
+                    loaded.get_module_result(next(iter(loaded.module_state)))
+                    loaded.close()
+
+                results.append({
+                    "modules": size,
+                    "payload_bytes": payload,
+                    "pickle_save_seconds": timeit(lambda: save_workspace_unsafe(workspace, pickle_path), repeat),
+                    "pickle_load_seconds": timeit(lambda: load_workspace_unsafe(pickle_path), repeat),
+                    "pickle_file_bytes": os.path.getsize(pickle_path),
+                    "store_save_seconds": store_save,
+                    "store_save_delta_seconds": save_delta_seconds,
+                    "store_load_seconds": timeit(load, repeat),
+                    "store_load_first_result_seconds": timeit(load_first_result, repeat),
+                    "store_file_bytes": os.path.getsize(store_path),
+                })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--payload", type=int, default=4096)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    emit("workspace", run(args.sizes, args.payload, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
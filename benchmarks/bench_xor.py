@@ -0,0 +1,88 @@
+"""
+xorモジュールのベンチマーク
+
+英文を繰り返した N MB のデータ(途中にフラグを1つ含む)を鍵でXORしたファイルに対して、
+    - repeat: 鍵を指定したXOR
+    - brute: 1バイトと短い鍵の総当たり (上位10件)
+をNumPyの場合とNumPyを使わない場合で測る。legacyは以前の1文字ずつのXOR(chr(ord(a) ^ ord(b)))の時間。
+
+    python benchmarks/bench_xor.py [--megabytes 1 8] [--repeat 3]
+"""
+import os
+import argparse
+import tempfile
+
+from common import ROOT, timeit, chdir, emit
+from module import builtin
+from registry import module_registry
+from blob import blob_store
+
+TEXT = b"The quick brown fox jumps over the lazy dog while the analyst reads the logs. "
+FLAG = b"flag{benchmark_xor}"
+KEYS = [b"\x5a", b"k3y", b"\x01\x02\x03\x04"]
+
+
+def make_data(megabytes):
+    size = megabytes * 1024 * 1024
+    text = (TEXT * (size // len(TEXT) + 1))[:size]
+    return text[:size // 2] + FLAG + text[size // 2:]
+
+
+def run(megabytes, repeat):
+    results = []
+    with tempfile.TemporaryDirectory() as directory, chdir(ROOT):
+        execution = module_registry.get("xor")["execution"]
+        # フレームワークと同じく、入力の読み込みと大きな結果のblob化も含めて測る
+        xor = lambda path, key: builtin.call_entrypoint(execution["entrypoint"], "function", [path, key], execution["load-inputs"])
+        # 大きな結果のblobはリポジトリのworkspaceではなく一時ディレクトリに置く
+        blob_store.directory = os.path.join(directory, "blobs")
+        engine = builtin.load_entrypoint("modules/xor/xor.py:xor_bytes").__globals__
+        numpy = engine["np"]
+        for size in megabytes:
+            plain = make_data(size)
+            for key in KEYS:
+                path = os.path.join(directory, f"data_{size}_{key.hex()}.bin")
+                with open(path, "wb") as f:
+                    f.write(engine["xor_bytes"](plain, key))
+                for backend in (["numpy"] if numpy is not None else []) + ["python"]:
+                    engine["np"] = numpy if backend == "numpy" else None
+                    try:
+                        candidates = xor(path, "brute")
+                        results.append({
+                            "megabytes": size,
+                            "key_bytes": len(key),
+                            "mode": "brute",
+                            "backend": backend,
+                            "found": candidates[0]["key_hex"] == key.hex() and FLAG.decode() in candidates[0]["flags"],
+                            "seconds": timeit(lambda: xor(path, "brute"), repeat),
+                        })
+                        results.append({
+                            "megabytes": size,
+                            "key_bytes": len(key),
+                            "mode": "repeat",
+                            "backend": backend,
+                            "seconds": timeit(lambda: xor(path, "hex:" + key.hex()), repeat),
+                        })
+                    finally:
+                        engine["np"] = numpy
+            text = plain.decode("latin-1")
+            results.append({
+                "megabytes": size,
+                "key_bytes": len(text),
+                "mode": "legacy",
+                "backend": "python",
+                "seconds": timeit(lambda: engine["xor_strings"](text, text), 1),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--megabytes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    emit("xor", run(args.megabytes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
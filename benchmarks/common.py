@@ -0,0 +1,62 @@
+"""
+ベンチマーク共通の処理
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+
+def timeit(func, repeat: int) -> float:
+    """
+    Returns:
+        float: 1回あたりの平均秒数
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+@contextlib.contextmanager
+def chdir(path: str):
+    # モジュール/レシピ/ワークスペースはcwdからの相対パスで探される
+    old = os.getcwd()
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(old)
+
+
+@contextlib.contextmanager
+def temporary_root(module_definitions: dict = None, files: dict = None):
+    """
+    modules/json(スキーマ+指定した定義)だけを持つ一時的なルートディレクトリを作りcwdにする
+
+    Args:
+        module_definitions (dict): ファイル名 -> モジュール定義
+        files (dict): 相対パス -> 中身(str)
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, "modules/json"))
+        shutil.copy(os.path.join(ROOT, "modules/json/schema.json"), os.path.join(directory, "modules/json"))
+        for file, definition in (module_definitions or {}).items():
+            with open(os.path.join(directory, "modules/json", file), "w") as f:
+                json.dump(definition, f)
+        for path, content in (files or {}).items():
+            os.makedirs(os.path.dirname(os.path.join(directory, path)), exist_ok=True)
+            with open(os.path.join(directory, path), "w") as f:
+                f.write(content)
+        with chdir(directory):
+            yield directory
+
+
+def emit(name: str, results) -> None:
+    print(json.dumps({"benchmark": name, "results": results}, indent=4))
@@ -0,0 +1,118 @@
+"""
+全てのベンチマークを実行して1つのjsonにまとめる
+
+    python benchmarks/run.py [--quick] [--only spawn template] [--output result.json] [--baseline old.json]
+
+--baselineに以前の結果を渡すと、*_seconds / seconds が threshold 倍以上遅くなった項目を regressions に列挙する。
+"""
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+
+from common import ROOT
+import bench_registry
+import bench_spawn
+import bench_template
+import bench_recipe
+import bench_workspace
+import bench_search
+import bench_scanner
+import bench_stream
+import bench_batch
+import bench_startup
+import bench_tracing
+import bench_webui
+import bench_xor
+import bench_hashcalc
+import bench_extract_urls
+import bench_codec
+import bench_checkplt
+
+# ベンチマーク名 -> (通常の引数, --quickのときの引数)
+BENCHMARKS = {
+    "registry": (bench_registry.run, {"sizes": [10, 100, 1000], "repeat": 200}, {"sizes": [10, 100], "repeat": 20}),
+    "spawn": (bench_spawn.run, {"repeat": 50}, {"repeat": 5}),
+    "template": (bench_template.run, {"sizes": [10, 100, 1000], "items": 100, "repeat": 1000}, {"sizes": [10, 100], "items": 10, "repeat": 100}),
+    "recipe": (bench_recipe.run, {"code_sizes": [1024, 16384, 131072], "repeat": 5}, {"code_sizes": [1024], "repeat": 1}),
+    "workspace": (bench_workspace.run, {"sizes": [10, 100, 1000], "payload": 4096, "repeat": 5}, {"sizes": [10, 100], "payload": 1024, "repeat": 1}),
+    "search": (bench_search.run, {"sizes": [10, 100, 1000], "lines": 1000, "repeat": 20}, {"sizes": [10, 100], "lines": 100, "repeat": 2}),
+    "scanner": (bench_scanner.run, {"formats": [1, 10, 50], "megabytes": 16, "repeat": 3}, {"formats": [1, 10], "megabytes": 1, "repeat": 1}),
+    "stream": (bench_stream.run, {"megabytes": [1, 16, 64], "repeat": 3}, {"megabytes": [1], "repeat": 1}),
+    "batch": (bench_batch.run, {"files": [8, 32], "jobs": [1, 2, 4]}, {"files": [4], "jobs": [2]}),
+    "startup": (bench_startup.run, {"repeat": 10}, {"repeat": 2}),
+    "tracing": (bench_tracing.run, {"repeat": 5}, {"repeat": 1}),
+    "webui": (bench_webui.run, {"clients": [10, 100, 500], "requests": 20, "lines": 2000}, {"clients": [10], "requests": 5, "lines": 200}),
+    "xor": (bench_xor.run, {"megabytes": [1, 8], "repeat": 3}, {"megabytes": [1], "repeat": 1}),
+    "hashcalc": (bench_hashcalc.run, {"files": [1, 64], "megabytes": 256, "repeat": 3}, {"files": [1, 8], "megabytes": 16, "repeat": 1}),
+    "extract_urls": (bench_extract_urls.run, {"megabytes": [16, 64], "jobs": [1, 4], "repeat": 3}, {"megabytes": [4], "jobs": [1], "repeat": 1}),
+    "codec": (bench_codec.run, {"megabytes": [1, 16], "repeat": 3}, {"megabytes": [1], "repeat": 1}),
+    "checkplt": (bench_checkplt.run, {"directory": "/usr/bin", "files": [32, 256], "jobs": [1, 4], "repeat": 3}, {"directory": "/usr/bin", "files": [16], "jobs": [1], "repeat": 1}),
+}
+
+
+def get_version():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": sys.version,
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def find_regressions(results, baseline, threshold):
+    """
+    同じベンチマークの同じ位置の結果同士で、秒数の項目を比較する
+    """
+    regressions = []
+    for name, rows in results.items():
+        for index, (row, old_row) in enumerate(zip(rows, baseline.get(name, []))):
+            for key, value in row.items():
+                if key != "seconds" and not key.endswith("_seconds"):
+                    continue
+                old_value = old_row.get(key)
+                if old_value and value / old_value >= threshold:
+                    regressions.append({"benchmark": name, "index": index, "metric": key, "ratio": value / old_value})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quick", action="store_true", help="小さな入力と少ない繰り返しで実行する")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS))
+    parser.add_argument("--output", help="結果を書き出すファイル (省略時は標準出力)")
+    parser.add_argument("--baseline", help="比較する以前の結果のファイル")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        func, kwargs, quick_kwargs = BENCHMARKS[name]
+        print(f"running {name}...", file=sys.stderr)
+        results[name] = func(**(quick_kwargs if args.quick else kwargs))
+
+    report = {"version": get_version(), "quick": args.quick, "benchmarks": results}
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        report["baseline"] = baseline["version"]
+        report["regressions"] = find_regressions(results, baseline["benchmarks"], args.threshold)
+
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
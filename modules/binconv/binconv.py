@@ -19,6 +19,13 @@ def convert_from_binary(binary_value):
     except ValueError:
         return "Invalid input"
 
+def binconv(data, base):
+    base = int(base)
+    if base == 2:
+        return convert_from_binary(data)
+    else:
+        return convert_to_binary(data, base)
+
 def main():
     if len(sys.argv) != 3:
         print("Usage: python binconv.py <data> <base>")
@@ -26,13 +33,7 @@ def main():
         print("Example: python binconv.py A 16")
         sys.exit(1)
 
-    data = sys.argv[1]
-    base = int(sys.argv[2])
-
-    if base == 2:
-        result = convert_from_binary(data)
-    else:
-        result = convert_to_binary(data, base)
+    result = binconv(sys.argv[1], sys.argv[2])
     print(result)
 
 if __name__ == "__main__":
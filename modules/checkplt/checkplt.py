@@ -1,150 +1,361 @@
-import sys
-import json
-import struct
-import argparse
-import pygments.lexers.asm
-from elftools.elf.elffile import ELFFile
-from capstone import *
-from rich.console import Console
-from rich.panel import Panel
-from rich.table import Table
-from rich.syntax import Syntax
-
-
-def console_print(string):
-    if not args.json:
-        console.print(string)
-    
-def detect_tampered_linking(elf_file_path):
-    with open(elf_file_path, 'rb') as file:
-        elffile = ELFFile(file)
-        
-        relaplt = elffile.get_section_by_name('.rela.plt')
-        dynsym = elffile.get_section_by_name('.dynsym')
-        got = elffile.get_section_by_name('.got')
-        plt = elffile.get_section_by_name('.plt')
-        plt_sec = elffile.get_section_by_name('.plt.sec')
-        got_plt = elffile.get_section_by_name('.got.plt')
-        
-        if plt is None:
-            console_print("[bold red]no .plt section")
-            sys.exit(1)
-        if got_plt is None:
-            console_print("[bold yellow]no .got.plt section")
-            console_print("[bold yellow]maybe not lazy binding?")
-            
-        if plt and plt_sec is None:
-            plt_stub_instructions = get_plt_target(plt.header.sh_addr, plt.data())
-        elif got_plt and plt_sec:
-            plt_stub_instructions = get_plt_sec_target(plt.header.sh_addr, plt.data(), plt_sec.header.sh_addr, plt_sec.data(), got_plt.header.sh_addr, got_plt.data())
-        elif got and plt_sec:
-            plt_stub_instructions = get_plt_sec_target(plt.header.sh_addr, plt.data(), plt_sec.header.sh_addr, plt_sec.data(), got.header.sh_addr, got.data())
-        else:
-            console_print("[bold red]no .got.plt and .plt.sec section")
-            sys.exit(1)
-
-        if len(plt_stub_instructions) != int(relaplt.data_size / relaplt.entry_size):
-            console_print(f"[bold yellow]dynamic linking count {len(plt_stub_instructions)} != .rela.plt entry count {int(relaplt.data_size / relaplt.entry_size)}")
-
-        relaplt_table = Table(title=".rela.plt")
-        relaplt_table.add_column("", justify="center", style="cyan bold")
-        relaplt_table.add_column("symbol", justify="left", style="cyan")
-        relaplt_table.add_column("r_offset", justify="left", style="green")
-        relaplt_table.add_column("r_info", justify="left", style="cyan")
-        relaplt_table.add_column("type", justify="left", style="cyan")
-        console_print(relaplt_table)
-        
-        results = []
-        for idx, rel in enumerate(relaplt.iter_relocations()):
-            symbol = dynsym.get_symbol(rel.entry.r_info_sym)
-            symbol_name = symbol.name
-            relaplt_table.add_row(str(idx), f"{rel.entry.r_info_sym}({symbol_name})", hex(rel.entry.r_offset), hex(rel.entry.r_info), hex(rel.entry.r_info_type))
-            # r_offsetがpltスタブ内のjmp命令のジャンプ先と一致するか確認
-            if len(plt_stub_instructions) > idx:
-                jmp_target = next((instruction['jmp_target'] for instruction in plt_stub_instructions if instruction['push_value'] == idx))
-                if rel.entry.r_offset != jmp_target:
-                    results.append({"tampered": True, "index": idx, "symbol": symbol_name, "dynamic": jmp_target, "r_offset": rel.entry.r_offset})
-                else:
-                    results.append({"tampered": False, "index": idx, "symbol": symbol_name, "dynamic": jmp_target, "r_offset": rel.entry.r_offset})
-                    
-                    
-        result_table = Table(title="[bold]Result")
-        result_table.add_column("", justify="center", style="cyan bold")
-        result_table.add_column("symbol", justify="left", style="cyan")
-        result_table.add_column("dynamic", justify="left", style="green")
-        result_table.add_column("", justify="center", style="dim")
-        result_table.add_column("r_offset", justify="left", style="green")
-        for result in results:
-            if result["tampered"] :
-                result_table.add_row(f"[red]{str(result['index'])}", f"[red bold]{result['symbol']}", hex(result["dynamic"]), "->", f"[red bold]{hex(result['r_offset'])}({next(result_['symbol'] for result_ in results if result['r_offset'] == result_['dynamic'])})")
-            else:
-                result_table.add_row(str(result['index']), result["symbol"], hex(result["dynamic"]), "->", hex(result["r_offset"]))
-
-        console_print(result_table)
-        
-        return results
-        
-
-def get_plt_target(plt_start, plt_data):
-    md = Cs(CS_ARCH_X86, CS_MODE_64)
-    md.detail = True
-    plt_stub_instructions = []
-    disasm_result = []
-    instructions = list(md.disasm(plt_data, plt_start))
-    for i in range(len(instructions)-2):
-        op_str = instructions[i].op_str
-        if instructions[i].mnemonic == 'jmp' and instructions[i+1].mnemonic == 'push' and instructions[i+2].mnemonic == 'jmp':
-            jmp_target = instructions[i].disp + instructions[i+1].address
-            push_value = instructions[i+1].operands[0].imm
-            plt_stub_instructions.append({'jmp_target': jmp_target, 'push_value': push_value})
-            disasm_result.append(f"{hex(instructions[i].address)} {instructions[i].mnemonic} {op_str} -> [{hex(jmp_target)}]")
-        else:
-            disasm_result.append(f"{hex(instructions[i].address)} {instructions[i].mnemonic} {op_str}")
-
-    console_print(Panel(Syntax("\n".join(disasm_result), lexer=pygments.lexers.asm.CObjdumpLexer()), title=".plt", expand=False))
-    return plt_stub_instructions
-
-def get_plt_sec_target(plt_start, plt_data, plt_sec_start, plt_sec_data, got_start, got_data):
-    md = Cs(CS_ARCH_X86, CS_MODE_64)
-    md.detail = True
-    plt_stub_instructions = []
-    disasm_result = []
-    plt_sec_instructions = list(md.disasm(plt_sec_data, plt_sec_start))
-    plt_instructions = list(md.disasm(plt_data, plt_start))
-    for i in range(len(plt_sec_instructions)):
-        op_str = plt_sec_instructions[i].op_str
-        if plt_sec_instructions[i].mnemonic == 'bnd jmp' and plt_sec_instructions[i+1].mnemonic == 'nop':
-            jmp_target = plt_sec_instructions[i].disp + plt_sec_instructions[i+1].address
-            got_plt_jmp_address = struct.unpack('<Q', got_data[jmp_target - got_start: jmp_target - got_start + 8])[0]
-            for j in range(len(plt_instructions)):
-                if plt_instructions[j].address == got_plt_jmp_address:
-                    if plt_instructions[j].mnemonic == 'push':
-                        push_value = plt_instructions[j].operands[0].imm
-                        plt_stub_instructions.append({'jmp_target': jmp_target, 'push_value': push_value})
-                        disasm_result.append(f"{hex(plt_sec_instructions[i].address)} {plt_sec_instructions[i].mnemonic} {op_str} -> [{hex(jmp_target)}] -> (.plt){hex(got_plt_jmp_address)} {plt_instructions[j].mnemonic} {push_value}")
-                    elif plt_instructions[j+1].mnemonic == 'push':
-                        push_value = plt_instructions[j+1].operands[0].imm
-                        plt_stub_instructions.append({'jmp_target': jmp_target, 'push_value': push_value})
-                        disasm_result.append(f"{hex(plt_sec_instructions[i].address)} {plt_sec_instructions[i].mnemonic} {op_str} -> [{hex(jmp_target)}] -> (.plt){hex(got_plt_jmp_address)} {plt_instructions[j].mnemonic} (.plt){hex(plt_instructions[j+1].address)} {plt_instructions[j+1].mnemonic} {push_value}")
-                    else:
-                        disasm_result.append(f"{hex(plt_sec_instructions[i].address)} {plt_sec_instructions[i].mnemonic} {op_str}")
-        else:
-            disasm_result.append(f"{hex(plt_sec_instructions[i].address)} {plt_sec_instructions[i].mnemonic} {op_str}")
-                    
-    console_print(Panel(Syntax("\n".join(disasm_result), lexer=pygments.lexers.asm.CObjdumpLexer()), title=".plt.sec", expand=False))
-
-    return plt_stub_instructions
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description='Check plt ^_-')
-    parser.add_argument('elf_file_path', type=str, help='Path to the ELF file')
-    parser.add_argument('--json', action='store_true', help='Print JSON if specified')
-
-    args = parser.parse_args()
-    
-    console = Console()
-
-    results = detect_tampered_linking(args.elf_file_path)
-    
-    if args.json:
-        print(json.dumps(results, indent=4))
+import os
+import re
+import sys
+import glob
+import json
+import struct
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from elftools.elf.elffile import ELFFile
+from elftools.common.exceptions import ELFError
+from capstone import *
+
+ELF_MAGIC = b'\x7fELF'
+RELA = struct.Struct('<QQq')        # Elf64_Rela (r_offset, r_info, r_addend)
+SYMBOL = struct.Struct('<IBBHQQ')   # Elf64_Sym (st_name, st_info, st_other, st_shndx, st_value, st_size)
+# "qword ptr [rip + 0x2fe2]" の 0x2fe2 (メモリのオペランドの定数)
+MEMORY_DISPLACEMENT = re.compile(r'\[(?:.*([+-]) )?(0x[0-9a-f]+|[0-9]+)\]')
+PARALLEL_THRESHOLD = 8  # これより少ないファイルはこのプロセスだけで調べる
+# 1つのファイルを調べられなかったときの例外 (複数のファイルを調べるときは {"error": ...} にして続ける)
+CHECK_ERRORS = (ValueError, OSError, ELFError, struct.error, CsError)
+
+_disassembler = None
+
+
+def get_disassembler():
+    # Capstoneのハンドルはプロセスごとに1つだけ作り、全てのファイルで使い回す
+    global _disassembler
+    if _disassembler is None:
+        _disassembler = Cs(CS_ARCH_X86, CS_MODE_64)
+    return _disassembler
+
+
+def get_displacement(op_str):
+    # capstoneのdetailのdispと同じ値 (メモリのオペランドが無ければ0)
+    # detailを作ると命令ごとに時間がかかるので、disasm_liteのオペランドの文字列から読む
+    match = MEMORY_DISPLACEMENT.search(op_str)
+    if match is None:
+        return 0
+    value = int(match.group(2), 0)
+    return -value if match.group(1) == '-' else value
+
+
+def get_immediate(op_str):
+    try:
+        return int(op_str, 0)
+    except ValueError:
+        return None
+
+
+def read_relocations(elffile, relaplt, dynsym):
+    """
+    .rela.pltのエントリをシンボル名と一緒に読む
+    pyelftoolsでエントリやシンボルを1つずつ解析すると遅いので、セクションのデータをまとめてstructで読む
+
+    Returns:
+        list: (r_offset, r_info, シンボルの番号, シンボル名) のリスト
+    """
+    if relaplt.entry_size != RELA.size:
+        raise ValueError(f".rela.plt entry size {relaplt.entry_size} is not supported")
+    symbols = dynsym.data()
+    strings = elffile.get_section(dynsym['sh_link']).data()
+    relocations = []
+    for r_offset, r_info, _ in RELA.iter_unpack(relaplt.data()):
+        r_info_sym = r_info >> 32
+        st_name = SYMBOL.unpack_from(symbols, r_info_sym * SYMBOL.size)[0]
+        symbol_name = strings[st_name:strings.index(b'\0', st_name)].decode('latin-1')
+        relocations.append((r_offset, r_info, r_info_sym, symbol_name))
+    return relocations
+
+
+def detect_tampered_linking(elf_file_path, verbose=False):
+    """
+    .rela.pltのr_offsetと、pltスタブが実際にジャンプする先(GOTのアドレス)を比べる
+
+    Args:
+        elf_file_path (str): ELFファイルのパス
+        verbose (bool): 表示用の逆アセンブル結果と.rela.pltの一覧も返すか
+
+    Returns:
+        dict: results(シンボルごとの結果), warnings, verboseならdisassemblyとrelocationsも
+    """
+    with open(elf_file_path, 'rb') as file:
+        elffile = ELFFile(file)
+        if elffile['e_machine'] != 'EM_X86_64' or elffile.elfclass != 64:
+            raise ValueError(f"unsupported architecture {elffile['e_machine']} (ELF{elffile.elfclass})")
+
+        relaplt = elffile.get_section_by_name('.rela.plt')
+        dynsym = elffile.get_section_by_name('.dynsym')
+        got = elffile.get_section_by_name('.got')
+        plt = elffile.get_section_by_name('.plt')
+        plt_sec = elffile.get_section_by_name('.plt.sec')
+        got_plt = elffile.get_section_by_name('.got.plt')
+
+        warnings = []
+        if plt is None:
+            raise ValueError("no .plt section")
+        if relaplt is None or dynsym is None:
+            raise ValueError("no .rela.plt or .dynsym section")
+        if got_plt is None:
+            warnings.append("no .got.plt section")
+            warnings.append("maybe not lazy binding?")
+
+        disasm_result = [] if verbose else None
+        if plt and plt_sec is None:
+            title = ".plt"
+            plt_stub_instructions = get_plt_target(plt.header.sh_addr, plt.data(), disasm_result)
+        elif got_plt and plt_sec:
+            title = ".plt.sec"
+            plt_stub_instructions = get_plt_sec_target(plt.header.sh_addr, plt.data(), plt_sec.header.sh_addr, plt_sec.data(), got_plt.header.sh_addr, got_plt.data(), disasm_result)
+        elif got and plt_sec:
+            title = ".plt.sec"
+            plt_stub_instructions = get_plt_sec_target(plt.header.sh_addr, plt.data(), plt_sec.header.sh_addr, plt_sec.data(), got.header.sh_addr, got.data(), disasm_result)
+        else:
+            raise ValueError("no .got.plt and .plt.sec section")
+
+        relocation_count = int(relaplt.data_size / relaplt.entry_size)
+        if len(plt_stub_instructions) != relocation_count:
+            warnings.append(f"dynamic linking count {len(plt_stub_instructions)} != .rela.plt entry count {relocation_count}")
+
+        # pushする値(.rela.pltの番号) -> jmpのジャンプ先 (同じ値が複数あれば最初のもの)
+        jmp_targets = {}
+        for instruction in plt_stub_instructions:
+            jmp_targets.setdefault(instruction['push_value'], instruction['jmp_target'])
+
+        relocations = read_relocations(elffile, relaplt, dynsym)
+        results = []
+        for idx, (r_offset, r_info, r_info_sym, symbol_name) in enumerate(relocations):
+            # r_offsetがpltスタブ内のjmp命令のジャンプ先と一致するか確認
+            if len(plt_stub_instructions) > idx and idx in jmp_targets:
+                jmp_target = jmp_targets[idx]
+                results.append({"tampered": r_offset != jmp_target, "index": idx, "symbol": symbol_name, "dynamic": jmp_target, "r_offset": r_offset})
+
+    report = {"results": results, "warnings": warnings}
+    if verbose:
+        report["disassembly"] = (title, disasm_result)
+        report["relocations"] = [
+            (idx, r_info_sym, symbol_name, r_offset, r_info, r_info & 0xffffffff)
+            for idx, (r_offset, r_info, r_info_sym, symbol_name) in enumerate(relocations)
+        ]
+    return report
+
+
+def get_plt_target(plt_start, plt_data, disasm_result=None):
+    """
+    .pltの jmp [GOT] / push n / jmp の並びから、pushする値とjmpのジャンプ先を取り出す
+    disasm_resultにリストを渡すと表示用の逆アセンブル結果を追加する
+    """
+    md = get_disassembler()
+    plt_stub_instructions = []
+    # (address, size, mnemonic, op_str) のリスト
+    instructions = list(md.disasm_lite(plt_data, plt_start))
+    for i in range(len(instructions)-2):
+        address, _, mnemonic, op_str = instructions[i]
+        push_value = get_immediate(instructions[i+1][3]) if instructions[i+1][2] == 'push' else None
+        if mnemonic == 'jmp' and push_value is not None and instructions[i+2][2] == 'jmp':
+            jmp_target = get_displacement(op_str) + instructions[i+1][0]
+            plt_stub_instructions.append({'jmp_target': jmp_target, 'push_value': push_value})
+            if disasm_result is not None:
+                disasm_result.append(f"{hex(address)} {mnemonic} {op_str} -> [{hex(jmp_target)}]")
+        elif disasm_result is not None:
+            disasm_result.append(f"{hex(address)} {mnemonic} {op_str}")
+    return plt_stub_instructions
+
+
+def get_plt_sec_target(plt_start, plt_data, plt_sec_start, plt_sec_data, got_start, got_data, disasm_result=None):
+    """
+    .plt.secの bnd jmp [GOT] から、GOTの初期値が指す.pltの push n を辿る
+    disasm_resultにリストを渡すと表示用の逆アセンブル結果を追加する
+    """
+    md = get_disassembler()
+    plt_stub_instructions = []
+    plt_sec_instructions = list(md.disasm_lite(plt_sec_data, plt_sec_start))
+    plt_instructions = list(md.disasm_lite(plt_data, plt_start))
+    # .pltの命令のアドレス -> 番号 (.plt.secの各エントリで.pltを探し直さない)
+    plt_index = {instruction[0]: j for j, instruction in enumerate(plt_instructions)}
+    for i in range(len(plt_sec_instructions)):
+        address, _, mnemonic, op_str = plt_sec_instructions[i]
+        if mnemonic == 'bnd jmp' and i + 1 < len(plt_sec_instructions) and plt_sec_instructions[i+1][2] == 'nop':
+            jmp_target = get_displacement(op_str) + plt_sec_instructions[i+1][0]
+            got_plt_jmp_address = struct.unpack('<Q', got_data[jmp_target - got_start: jmp_target - got_start + 8])[0]
+            j = plt_index.get(got_plt_jmp_address)
+            if j is None:
+                continue
+            _, _, plt_mnemonic, plt_op_str = plt_instructions[j]
+            if plt_mnemonic == 'push' and get_immediate(plt_op_str) is not None:
+                push_value = get_immediate(plt_op_str)
+                plt_stub_instructions.append({'jmp_target': jmp_target, 'push_value': push_value})
+                if disasm_result is not None:
+                    disasm_result.append(f"{hex(address)} {mnemonic} {op_str} -> [{hex(jmp_target)}] -> (.plt){hex(got_plt_jmp_address)} {plt_mnemonic} {push_value}")
+            elif j + 1 < len(plt_instructions) and plt_instructions[j+1][2] == 'push' and get_immediate(plt_instructions[j+1][3]) is not None:
+                push_value = get_immediate(plt_instructions[j+1][3])
+                plt_stub_instructions.append({'jmp_target': jmp_target, 'push_value': push_value})
+                if disasm_result is not None:
+                    disasm_result.append(f"{hex(address)} {mnemonic} {op_str} -> [{hex(jmp_target)}] -> (.plt){hex(got_plt_jmp_address)} {plt_mnemonic} (.plt){hex(plt_instructions[j+1][0])} push {push_value}")
+            elif disasm_result is not None:
+                disasm_result.append(f"{hex(address)} {mnemonic} {op_str}")
+        elif disasm_result is not None:
+            disasm_result.append(f"{hex(address)} {mnemonic} {op_str}")
+    return plt_stub_instructions
+
+
+def expand_paths(paths):
+    """
+    ファイル、ディレクトリ(再帰的に中のファイル全て)、globをELFファイルのパスのリストにする
+    シンボリックリンクなどで同じファイルを指すパスは最初のものだけにする
+    """
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+        elif os.path.isdir(path):
+            for directory, directories, names in os.walk(path):
+                directories.sort()
+                files.extend(os.path.join(directory, name) for name in sorted(names))
+        else:
+            matches = sorted(glob.glob(path, recursive=True))
+            if not matches:
+                raise FileNotFoundError(f"Error: {path} is not found.")
+            # 壊れたシンボリックリンクなど、ファイルでもディレクトリでもないものはそのまま残して後で除く
+            for match in matches:
+                files.extend(expand_paths([match]) if os.path.isdir(match) else [match])
+
+    elf_files = []
+    seen = set()
+    for file in files:
+        try:
+            real_path = os.path.realpath(file)
+            if real_path in seen or not os.path.isfile(real_path):
+                continue
+            seen.add(real_path)
+            with open(real_path, 'rb') as f:
+                if f.read(4) == ELF_MAGIC:
+                    elf_files.append(file)
+        except OSError:
+            continue
+    return elf_files
+
+
+def check_file(elf_file_path):
+    try:
+        return detect_tampered_linking(elf_file_path)["results"]
+    except CHECK_ERRORS as e:
+        return {"error": str(e)}
+
+
+def check_files(elf_file_paths, jobs=None):
+    """
+    複数のELFファイルを調べる ファイルが多ければjobs個のプロセスで並列に調べる
+
+    Returns:
+        dict: ファイルのパス -> 結果のリスト (調べられなければ {"error": ...})
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(elf_file_paths) < PARALLEL_THRESHOLD:
+        return {path: check_file(path) for path in elf_file_paths}
+    with ProcessPoolExecutor(jobs) as executor:
+        # 小さなファイルが多いので、いくつかずつまとめてワーカに渡す
+        chunksize = max(1, len(elf_file_paths) // (jobs * 4))
+        return dict(zip(elf_file_paths, executor.map(check_file, elf_file_paths, chunksize=chunksize)))
+
+
+def print_report(console, report):
+    # richとpygmentsは表示するときだけ読み込む (--jsonでは使わない)
+    import pygments.lexers.asm
+    from rich.panel import Panel
+    from rich.table import Table
+    from rich.syntax import Syntax
+
+    title, disasm_result = report["disassembly"]
+    console.print(Panel(Syntax("\n".join(disasm_result), lexer=pygments.lexers.asm.CObjdumpLexer()), title=title, expand=False))
+    for warning in report["warnings"]:
+        console.print(f"[bold yellow]{warning}")
+
+    relaplt_table = Table(title=".rela.plt")
+    relaplt_table.add_column("", justify="center", style="cyan bold")
+    relaplt_table.add_column("symbol", justify="left", style="cyan")
+    relaplt_table.add_column("r_offset", justify="left", style="green")
+    relaplt_table.add_column("r_info", justify="left", style="cyan")
+    relaplt_table.add_column("type", justify="left", style="cyan")
+    for idx, r_info_sym, symbol_name, r_offset, r_info, r_info_type in report["relocations"]:
+        relaplt_table.add_row(str(idx), f"{r_info_sym}({symbol_name})", hex(r_offset), hex(r_info), hex(r_info_type))
+    console.print(relaplt_table)
+
+    results = report["results"]
+    # jmpのジャンプ先 -> シンボル名 (書き換えられたr_offsetが本来どのシンボルのものかを示す)
+    symbol_by_dynamic = {}
+    for result in results:
+        symbol_by_dynamic.setdefault(result['dynamic'], result['symbol'])
+    result_table = Table(title="[bold]Result")
+    result_table.add_column("", justify="center", style="cyan bold")
+    result_table.add_column("symbol", justify="left", style="cyan")
+    result_table.add_column("dynamic", justify="left", style="green")
+    result_table.add_column("", justify="center", style="dim")
+    result_table.add_column("r_offset", justify="left", style="green")
+    for result in results:
+        if result["tampered"]:
+            result_table.add_row(f"[red]{str(result['index'])}", f"[red bold]{result['symbol']}", hex(result["dynamic"]), "->", f"[red bold]{hex(result['r_offset'])}({symbol_by_dynamic.get(result['r_offset'], '?')})")
+        else:
+            result_table.add_row(str(result['index']), result["symbol"], hex(result["dynamic"]), "->", hex(result["r_offset"]))
+    console.print(result_table)
+
+
+def print_summary(console, checked):
+    from rich.table import Table
+
+    summary_table = Table(title="[bold]Result")
+    summary_table.add_column("file", justify="left", style="cyan")
+    summary_table.add_column("symbols", justify="right", style="green")
+    summary_table.add_column("tampered", justify="left")
+    for path, results in checked.items():
+        if isinstance(results, dict):
+            summary_table.add_row(f"[dim]{path}", "", f"[dim]{results['error']}")
+            continue
+        tampered = [result['symbol'] for result in results if result["tampered"]]
+        if tampered:
+            summary_table.add_row(f"[red bold]{path}", str(len(results)), f"[red bold]{', '.join(tampered)}")
+        else:
+            summary_table.add_row(path, str(len(results)), "")
+    console.print(summary_table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check plt ^_-')
+    parser.add_argument('elf_file_path', type=str, nargs='+', help='Path to the ELF files, directories or globs')
+    parser.add_argument('--json', action='store_true', help='Print JSON if specified')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes for multiple files (default: cpu count)')
+    args = parser.parse_args()
+
+    console = None
+    if not args.json:
+        from rich.console import Console
+        console = Console()
+
+    # 1つのファイルなら詳しく表示する
+    if len(args.elf_file_path) == 1 and os.path.isfile(args.elf_file_path[0]):
+        try:
+            report = detect_tampered_linking(args.elf_file_path[0], verbose=not args.json)
+        except CHECK_ERRORS as e:
+            if console is not None:
+                console.print(f"[bold red]{e}")
+            sys.exit(1)
+        if args.json:
+            print(json.dumps(report["results"], indent=4))
+        else:
+            print_report(console, report)
+        return
+
+    try:
+        elf_file_paths = expand_paths(args.elf_file_path)
+    except FileNotFoundError as e:
+        print(e)
+        sys.exit(1)
+    checked = check_files(elf_file_paths, args.jobs)
+    if args.json:
+        print(json.dumps(checked, indent=4))
+    else:
+        print_summary(console, checked)
+
+
+if __name__ == "__main__":
+    main()
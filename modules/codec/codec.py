@@ -0,0 +1,558 @@
+import os
+import re
+import sys
+import zlib
+import base64
+import string
+import binascii
+import urllib.parse
+
+BLOCK_SIZE = 1024 * 1024         # 入力を一度に流す大きさ 各段の処理はこの大きさのバッファで行う
+INLINE_RESULT_SIZE = 64 * 1024   # これより大きい結果はtext/hexにせずbytesのまま返す
+PREVIEW_SIZE = 64
+SAMPLE_SIZE = 64 * 1024          # autoで符号化の種類を調べるのに使う先頭の大きさ
+MAX_AUTO_DEPTH = 8
+PRINTABLE_RATIO = 0.85
+WHITESPACE = b" \t\r\n\v\f"
+PRINTABLE = string.printable.encode()
+FLAG_PATTERN = re.compile(rb"(?:flag|FLAG|ctf|CTF)\{[\x20-\x7c\x7e]{0,200}\}")
+# 復号した結果が表示できる文字でなくても、これで始まれば正しく復号できたとみなす
+MAGICS = (b"\x1f\x8b", b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"%PDF", b"PK\x03\x04", b"\x7fELF", b"BZh", b"\xfd7zXZ")
+
+
+class Codec:
+    """
+    ストリームの変換
+    update()で受け取った分を変換して返し、まとまらずに残った分はfinal()で返す
+    """
+    # チェインの中での名前とその説明 (CODECSへの登録に使う)
+    name = None
+    description = ""
+
+    def update(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def final(self) -> bytes:
+        return b""
+
+
+class Translate(Codec):
+    """1バイトずつ置き換える (rot13など)"""
+    def __init__(self, table: bytes) -> None:
+        self.table = table
+
+    def update(self, data: bytes) -> bytes:
+        return bytes(data).translate(self.table)
+
+
+class Aligned(Codec):
+    """
+    入力をsizeバイトの倍数ごとにconvert()で変換する (base64など)
+    ignoreの文字(空白など)は変換の前に取り除く
+    """
+    size = 1
+    ignore = None
+
+    def __init__(self) -> None:
+        self.rest = b""
+
+    def convert(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def update(self, data: bytes) -> bytes:
+        data = bytes(data)
+        if self.ignore is not None:
+            data = data.translate(None, self.ignore)
+        if self.rest:
+            data = self.rest + data
+        length = len(data) - len(data) % self.size
+        self.rest = data[length:]
+        return self.convert(data[:length]) if length else b""
+
+    def final(self) -> bytes:
+        rest, self.rest = self.rest, b""
+        return self.convert(rest) if rest else b""
+
+
+class ToBase64(Aligned):
+    name = "to_base64"
+    description = "Base64で符号化する"
+    size = 3
+
+    def convert(self, data: bytes) -> bytes:
+        return binascii.b2a_base64(data, newline=False)
+
+
+class FromBase64(Aligned):
+    name = "from_base64"
+    description = "Base64(URL safeも)を復号する 空白は無視する"
+    size = 4
+    ignore = WHITESPACE
+    URLSAFE = bytes.maketrans(b"-_", b"+/")
+
+    def convert(self, data: bytes) -> bytes:
+        # 最後の区切りが4文字に足りない場合はパディングを補う
+        if b"-" in data or b"_" in data:
+            data = data.translate(self.URLSAFE)
+        return binascii.a2b_base64(data + b"=" * (-len(data) % 4))
+
+
+class ToBase32(Aligned):
+    name = "to_base32"
+    description = "Base32で符号化する"
+    size = 5
+
+    def convert(self, data: bytes) -> bytes:
+        return base64.b32encode(data)
+
+
+class FromBase32(Aligned):
+    name = "from_base32"
+    description = "Base32を復号する 空白は無視する"
+    size = 8
+    ignore = WHITESPACE
+
+    def convert(self, data: bytes) -> bytes:
+        return base64.b32decode(data + b"=" * (-len(data) % 8), casefold=True)
+
+
+class ToHex(Aligned):
+    name = "to_hex"
+    description = "16進数の文字列にする"
+
+    def convert(self, data: bytes) -> bytes:
+        return binascii.hexlify(data)
+
+
+class FromHex(Aligned):
+    name = "from_hex"
+    description = "16進数の文字列を復号する 空白と:は無視する"
+    size = 2
+    ignore = WHITESPACE + b":"
+
+    def convert(self, data: bytes) -> bytes:
+        return binascii.unhexlify(data)
+
+
+# バイト -> "01001000" の表
+BITS = [format(byte, "08b").encode() for byte in range(256)]
+
+class ToBinary(Codec):
+    name = "to_binary"
+    description = "1バイトずつ空白で区切った2進数の文字列にする"
+
+    def __init__(self) -> None:
+        self.first = True
+
+    def update(self, data: bytes) -> bytes:
+        if not data:
+            return b""
+        output = b" ".join(map(BITS.__getitem__, bytes(data)))
+        if not self.first:
+            output = b" " + output
+        self.first = False
+        return output
+
+
+class FromBinary(Aligned):
+    name = "from_binary"
+    description = "2進数の文字列(8文字で1バイト)を復号する 空白は無視する"
+    size = 8
+    ignore = WHITESPACE
+
+    def convert(self, data: bytes) -> bytes:
+        return int(data, 2).to_bytes(len(data) // 8, "big")
+
+
+class FromUrl(Codec):
+    name = "from_url"
+    description = "URLエンコード(%xx)を復号する"
+
+    def __init__(self) -> None:
+        self.rest = b""
+
+    def update(self, data: bytes) -> bytes:
+        data = self.rest + bytes(data)
+        # 末尾の%xxが途中で切れていれば次の入力と一緒に復号する
+        cut = data.rfind(b"%", max(0, len(data) - 2))
+        if cut == -1:
+            cut = len(data)
+        self.rest = data[cut:]
+        return urllib.parse.unquote_to_bytes(data[:cut])
+
+    def final(self) -> bytes:
+        rest, self.rest = self.rest, b""
+        return urllib.parse.unquote_to_bytes(rest)
+
+
+class ToUrl(Codec):
+    name = "to_url"
+    description = "URLエンコードする"
+
+    def update(self, data: bytes) -> bytes:
+        return urllib.parse.quote_from_bytes(bytes(data), safe="").encode()
+
+
+class Xor(Codec):
+    name = "xor"
+    description = "鍵(hex:... または文字列)を繰り返してXORする"
+
+    def __init__(self, key: str) -> None:
+        self.key = bytes.fromhex(key[4:]) if key.startswith("hex:") else key.encode()
+        if not self.key:
+            raise ValueError("Error: xor key is empty.")
+        self.offset = 0
+
+    def update(self, data: bytes) -> bytes:
+        if not data:
+            return b""
+        length = len(data)
+        # 前の入力の続きの位置から鍵を繰り返す
+        shifted = self.key[self.offset:] + self.key[:self.offset]
+        self.offset = (self.offset + length) % len(self.key)
+        stream = (shifted * (length // len(shifted) + 1))[:length]
+        return (int.from_bytes(data, "big") ^ int.from_bytes(stream, "big")).to_bytes(length, "big")
+
+
+class Inflate(Codec):
+    name = "inflate"
+    description = "gzip/zlibで圧縮されたデータを展開する"
+
+    def __init__(self) -> None:
+        # wbits=47でgzipとzlibのヘッダを自動で判定する
+        self.decompressor = zlib.decompressobj(47)
+
+    def update(self, data: bytes) -> bytes:
+        return self.decompressor.decompress(data) if data else b""
+
+    def final(self) -> bytes:
+        return self.decompressor.flush()
+
+
+class Gzip(Codec):
+    name = "gzip"
+    description = "gzipで圧縮する"
+
+    def __init__(self) -> None:
+        self.compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+
+    def update(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) if data else b""
+
+    def final(self) -> bytes:
+        return self.compressor.flush()
+
+
+class ToHexdump(Codec):
+    name = "to_hexdump"
+    description = "xxdと同じ形式の16進ダンプにする"
+    WIDTH = 16
+    DISPLAY = bytes(byte if 0x20 <= byte < 0x7f else ord(".") for byte in range(256))
+
+    def __init__(self) -> None:
+        self.offset = 0
+        self.rest = b""
+
+    def format(self, data: bytes) -> bytes:
+        lines = []
+        for start in range(0, len(data), self.WIDTH):
+            line = data[start:start + self.WIDTH]
+            groups = binascii.hexlify(line, " ", -2).decode()
+            lines.append(f"{self.offset:08x}: {groups:<39}  {line.translate(self.DISPLAY).decode()}\n")
+            self.offset += len(line)
+        return "".join(lines).encode()
+
+    def update(self, data: bytes) -> bytes:
+        data = self.rest + bytes(data)
+        length = len(data) - len(data) % self.WIDTH
+        self.rest = data[length:]
+        return self.format(data[:length])
+
+    def final(self) -> bytes:
+        rest, self.rest = self.rest, b""
+        return self.format(rest)
+
+
+class Rot(Translate):
+    name = "rot"
+    description = "アルファベットをn文字ずらす (rot13はrot(13))"
+
+    def __init__(self, shift: str = "13") -> None:
+        shift = int(shift) % 26
+        lower = string.ascii_lowercase.encode()
+        upper = string.ascii_uppercase.encode()
+        super().__init__(bytes.maketrans(lower + upper, lower[shift:] + lower[:shift] + upper[shift:] + upper[:shift]))
+
+
+class Rot13(Rot):
+    name = "rot13"
+    description = "rot(13)と同じ"
+
+    def __init__(self) -> None:
+        super().__init__("13")
+
+
+class FromBase(Codec):
+    name = "from_base"
+    description = "n進数の整数を10進数の文字列にする (入力全体で1つの数)"
+
+    def __init__(self, base: str) -> None:
+        self.base = int(base)
+        self.digits = []
+
+    def update(self, data: bytes) -> bytes:
+        self.digits.append(bytes(data))
+        return b""
+
+    def final(self) -> bytes:
+        value = b"".join(self.digits).translate(None, WHITESPACE)
+        return str(int(value, self.base)).encode() if value else b""
+
+
+class ToBase(FromBase):
+    name = "to_base"
+    description = "10進数の整数をn進数の文字列にする (入力全体で1つの数)"
+    DIGITS = string.digits + string.ascii_lowercase
+
+    def final(self) -> bytes:
+        value = b"".join(self.digits).translate(None, WHITESPACE)
+        if not value:
+            return b""
+        number = int(value)
+        sign, number = ("-", -number) if number < 0 else ("", number)
+        digits = []
+        while True:
+            number, digit = divmod(number, self.base)
+            digits.append(self.DIGITS[digit])
+            if number == 0:
+                break
+        return (sign + "".join(reversed(digits))).encode()
+
+
+CODECS = {codec.name: codec for codec in (
+    ToBase64, FromBase64, ToBase32, FromBase32, ToHex, FromHex, ToBinary, FromBinary,
+    ToUrl, FromUrl, Xor, Inflate, Gzip, ToHexdump, Rot, Rot13, FromBase, ToBase,
+)}
+STAGE_PATTERN = re.compile(r"\s*([a-z0-9_]+)\s*(?:\((.*?)\))?\s*$")
+
+
+def parse_chain(chain: str) -> list:
+    """
+    "from_base64|rot(13)|xor(hex:41)" のようなチェインを解釈して、Codecのリストを作る
+
+    Returns:
+        list: Codecのインスタンスのリスト
+    """
+    codecs = []
+    for stage in chain.split("|"):
+        match = STAGE_PATTERN.match(stage)
+        if match is None or match.group(1) not in CODECS:
+            raise ValueError(f"Error: codec {stage.strip()} is not found.")
+        args = [arg.strip() for arg in match.group(2).split(",")] if match.group(2) else []
+        codecs.append(CODECS[match.group(1)](*args))
+    return codecs
+
+
+class Pipeline:
+    """
+    Codecを順に繋いだもの
+    各段の出力をすぐに次の段へ渡すので、全体を一度にメモリに持たない
+    """
+    def __init__(self, codecs: list) -> None:
+        self.codecs = codecs
+
+    def update(self, data: bytes) -> bytes:
+        for codec in self.codecs:
+            if not data:
+                return b""
+            data = codec.update(data)
+        return data
+
+    def final(self) -> bytes:
+        # 前の段のfinal()で出た分を次の段に渡してから、その段を終える
+        data = b""
+        for codec in self.codecs:
+            data = (codec.update(data) if data else b"") + codec.final()
+        return data
+
+
+def is_plausible(data: bytes) -> bool:
+    """
+    復号した結果がもっともらしいか (ほぼ表示できる文字か、既知のファイルの形式か)
+    """
+    if not data:
+        return False
+    if data.startswith(MAGICS):
+        return True
+    printable = len(data) - len(data.translate(None, PRINTABLE))
+    return printable / len(data) >= PRINTABLE_RATIO
+
+
+def looks_compressed(data: bytes) -> bool:
+    return data.startswith(b"\x1f\x8b") or (len(data) >= 2 and data[0] == 0x78 and (data[0] * 256 + data[1]) % 31 == 0)
+
+
+# autoで試す順 (文字の種類が少ない符号化から)
+DETECTORS = [
+    ("inflate", looks_compressed),
+    ("from_binary", re.compile(rb"[01]{8,}").fullmatch),
+    ("from_hex", re.compile(rb"[0-9a-fA-F]{2,}").fullmatch),
+    ("from_base32", re.compile(rb"[A-Z2-7]{8,}=*").fullmatch),
+    ("from_base64", re.compile(rb"[A-Za-z0-9+/\-_]{4,}=*").fullmatch),
+    ("from_url", re.compile(rb"[^%]*%[0-9a-fA-F]{2}.*", re.DOTALL).fullmatch),
+]
+
+
+def run_sample(chain: list, sample: bytes, truncated: bool = False) -> bytes:
+    # 途中で切ったサンプルの末尾はまとまりきらないので、final()を呼ばずに捨てる
+    pipeline = Pipeline(parse_chain("|".join(chain)))
+    return pipeline.update(sample) + (b"" if truncated else pipeline.final())
+
+
+def detect_chain(data) -> list:
+    """
+    先頭のSAMPLE_SIZEだけを使い、符号化の種類を推測して復号を繰り返す
+    どれにも当てはまらなくなるか、フラグが現れたら止める
+    最後に、rotでずらすとフラグが現れる場合はそれも加える
+
+    Returns:
+        list: チェインの各段の名前 (何も当てはまらなければ空)
+    """
+    chain = []
+    sample = bytes(data[:SAMPLE_SIZE])
+    truncated = len(data) > SAMPLE_SIZE
+    for _ in range(MAX_AUTO_DEPTH):
+        if FLAG_PATTERN.search(sample):
+            return chain
+        stripped = sample.translate(None, WHITESPACE)
+        for name, detector in DETECTORS:
+            if not detector(stripped if name != "inflate" else sample):
+                continue
+            try:
+                decoded = run_sample([name], sample, truncated)
+            except (ValueError, binascii.Error, zlib.error):
+                continue
+            # 復号してもっともらしいもの、またはさらに復号できそうなものだけを選ぶ
+            if is_plausible(decoded) or looks_compressed(decoded):
+                chain.append(name)
+                sample = decoded
+                break
+        else:
+            break
+    if not FLAG_PATTERN.search(sample):
+        for shift in range(1, 26):
+            if FLAG_PATTERN.search(Rot(str(shift)).update(sample)):
+                chain.append("rot13" if shift == 13 else f"rot({shift})")
+                break
+    return chain
+
+
+class Output:
+    """
+    変換の結果を集める
+    """
+    def __init__(self) -> None:
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self.chunks.append(data)
+        self.size += len(data)
+
+    def get_result(self, chain: str) -> dict:
+        data = b"".join(self.chunks)
+        if self.size <= INLINE_RESULT_SIZE:
+            return {"chain": chain, "size": self.size, "text": data.decode("utf-8", "backslashreplace"), "hex": data.hex()}
+        # 大きな結果はbytesのまま返す (フレームワークが大きさに応じてblobにする)
+        return {"chain": chain, "size": self.size, "data": data, "preview": data[:PREVIEW_SIZE].decode("ascii", "backslashreplace")}
+
+
+def run_chain(chain: str, data) -> dict:
+    """
+    dataをBLOCK_SIZEずつチェインに流す
+
+    Args:
+        chain (str): チェイン "auto"なら推測する
+        data (bytes | mmap.mmap): 入力
+
+    Returns:
+        dict: {"chain", "size", "text", "hex"} 大きな結果は {"chain", "size", "data", "preview"}
+    """
+    if chain == "auto":
+        chain = "|".join(detect_chain(data))
+    pipeline = Pipeline(parse_chain(chain) if chain else [])
+    output = Output()
+    for offset in range(0, len(data), BLOCK_SIZE):
+        output.write(pipeline.update(data[offset:offset + BLOCK_SIZE]))
+    output.write(pipeline.final())
+    return output.get_result(chain)
+
+
+def codec(chain: str, *inputs) -> object:
+    """
+    built-inモジュールのエントリポイント
+
+    Args:
+        chain (str): "from_base64|rot13|from_hex" のようなチェイン "auto"なら符号化の種類を推測する
+        inputs (bytes | list): 入力 リストや複数の入力は1つずつ変換する
+            モジュールとして実行した場合は、ファイルのパス、"hex:...", "b64:..." または文字列をフレームワークが読み込んで渡す (codec.jsonのload-inputs)
+
+    Returns:
+        dict | list: 入力が1つなら結果、複数ならそのリスト
+    """
+    if chain != "auto":
+        # 入力を読む前にチェインの誤りを知らせる
+        parse_chain(chain)
+    sources = []
+    for source in inputs:
+        sources.extend(source if isinstance(source, list) else [source])
+    if not sources:
+        raise ValueError("Error: input is not found.")
+    results = [run_chain(chain, source.encode() if isinstance(source, str) else source) for source in sources]
+    return results[0] if len(inputs) == 1 and not isinstance(inputs[0], list) else results
+
+
+def get_text(result: dict) -> str:
+    """
+    結果の全体をテキストにする
+    """
+    if "text" in result:
+        return result["text"]
+    return result["data"].decode("utf-8", "backslashreplace")
+
+
+# 以前は外部コマンドだったモジュール (b64decode.json, b64encode.json, rot13.json) のエントリポイント
+# 引数はファイルのパスやhex:/b64:として読まず、文字列そのものを変換する
+def b64decode(data: str) -> str:
+    return get_text(run_chain("from_base64", data.encode()))
+
+
+def b64encode(data: str) -> str:
+    return get_text(run_chain("to_base64", data.encode()))
+
+
+def rot13(data: str) -> str:
+    return get_text(run_chain("rot13", data.encode()))
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python codec.py <chain | auto> <file | string>...")
+        print("Codecs:")
+        for name, codec_class in CODECS.items():
+            print(f"  {name:<12} {codec_class.description}")
+        sys.exit(1)
+
+    sources = []
+    for source in sys.argv[2:]:
+        if os.path.isfile(source):
+            with open(source, "rb") as f:
+                source = f.read()
+        sources.append(source)
+    for result in [codec(sys.argv[1], source) for source in sources]:
+        print(f"[{result['chain']}] {get_text(result)}")
+
+if __name__ == "__main__":
+    main()
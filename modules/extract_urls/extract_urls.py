@@ -1,22 +1,214 @@
+import os
 import re
 import sys
+import mmap
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python extract_urls.py <text>")
-        sys.exit(1)
+CHUNK_SIZE = 8 * 1024 * 1024          # 1つのワーカに渡す大きさ
+PARALLEL_THRESHOLD = 32 * 1024 * 1024  # これより小さい入力はこのプロセスだけで処理する
+
+# ドメインの形をしたファイル名を除くための拡張子
+FILE_EXTENSIONS = {
+    b"bin", b"bmp", b"c", b"conf", b"cpp", b"css", b"csv", b"dll", b"doc", b"docx", b"elf", b"exe", b"gif", b"gz", b"h",
+    b"htm", b"html", b"ini", b"jpeg", b"jpg", b"js", b"json", b"log", b"md", b"o", b"pcap", b"pcapng", b"pdf", b"php",
+    b"png", b"py", b"pyc", b"so", b"svg", b"tar", b"tmp", b"txt", b"xml", b"yaml", b"yml", b"zip",
+}
+LABEL = rb"[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?"
+
+# 種類 -> (パターン, マッチの左に続く部分を逆から読んだパターン)
+# reはパターンが文字列で始まればその文字列を高速に探してから照合する (文字集合で始まると1文字ずつ試すので遅い)
+# そのためパターンは各種類で必ず現れる文字(@, {, .)から始め、その左側はマッチしてから逆順にして取り出す
+# IPアドレスの最初の数字は長さ(1-3)ごとの後読みのグループで取る
+# URLの長さは制限しない (マッチはチャンクの区切りをまたがないので、長いURLも切らずにそのまま返す)
+PATTERNS = {
+    "url": (rb"https?://[\w/:%#\$&\?\(\)~\.=\+\-]+", None),
+    "email": (rb"@(?:" + LABEL + rb"\.){1,8}[A-Za-z]{2,24}(?![\w-])", rb"[\w.+-]{1,64}(?![\w.+-])"),
+    "flag": (rb"\{(?:(?<=flag\{)|(?<=FLAG\{)|(?<=Flag\{)|(?<=ctf\{)|(?<=CTF\{))[\x20-\x7c\x7e]{0,200}\}", rb"(?:galf|GALF|galF|ftc|FTC)[A-Za-z0-9_]{0,16}(?!\w)"),
+    "ip": (rb"(\.(?:(?<=(?<![\w.])([0-9]{3})\.)|(?<=(?<![\w.])([0-9]{2})\.)|(?<=(?<![\w.])([0-9])\.))[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3})(?![\w]|\.[0-9])", None),
+    "domain": (rb"\.(?:" + LABEL + rb"\.){0,6}[A-Za-z]{2,24}(?![\w@-]|\.\w)", LABEL + rb"(?![\w.-])"),
+}
+DEFAULT_TYPES = ["url"]
+MAX_PREFIX = 80  # マッチの左に続く部分の最大の長さ
+
+# どのパターンにもマッチしない文字 (改行などの制御文字と非ASCII)
+# この文字の直後でデータを区切れば、どのマッチも区切りをまたがないので、チャンクを重ねずに別々に探せる
+SEPARATOR = re.compile(rb"[^\x20-\x7e]")
+
+_compiled = {kind: (re.compile(pattern), re.compile(prefix) if prefix else None) for kind, (pattern, prefix) in PATTERNS.items()}
+
+def is_valid(kind: str, value: bytes) -> bool:
+    if kind == "ip":
+        return all(int(octet) <= 255 for octet in value.split(b"."))
+    if kind == "domain":
+        return value.rpartition(b".")[2].lower() not in FILE_EXTENSIONS
+    return True
+
+
+def scan(buffer, types: tuple, start: int = 0, end: int = None) -> dict:
+    """
+    bufferの[start, end)からURLなどを探す
+    startとendはSEPARATORの直後(またはデータの端)でなければならない
+
+    Args:
+        buffer (bytes | mmap.mmap): データ
+        types (tuple): 探す種類
+
+    Returns:
+        dict: 種類 -> 値のリスト (出現順、重複なし)
+    """
+    end = len(buffer) if end is None else end
+    found = {}
+    for kind in types:
+        pattern, prefix = _compiled[kind]
+        if prefix is None:
+            values = dict.fromkeys(pattern.findall(buffer, start, end))
+            if pattern.groups:
+                # (最初の数字より後, 最初の数字の候補...) を繋げる
+                values = dict.fromkeys(b"".join(groups[1:]) + groups[0] for groups in values)
+        else:
+            values = {}
+            for match in pattern.finditer(buffer, start, end):
+                position = match.start()
+                left = prefix.match(buffer[max(start, position - MAX_PREFIX):position][::-1])
+                if left is not None:
+                    values[left.group()[::-1] + match.group()] = None
+        # 重複を除いてから確かめるので、何度も現れる値は一度しか調べない
+        found[kind] = [value.decode("latin-1") for value in values if is_valid(kind, value)]
+    return found
+
+
+def split_chunks(buffer, chunk_size: int) -> list:
+    """
+    Returns:
+        list: (start, end) のリスト 境界はSEPARATORの直後にする
+    """
+    boundaries = [0]
+    while boundaries[-1] < len(buffer):
+        match = SEPARATOR.search(buffer, boundaries[-1] + chunk_size)
+        boundaries.append(match.end() if match else len(buffer))
+    return list(zip(boundaries, boundaries[1:]))
 
-    text = sys.argv[1]
 
-    # URLの正規表現パターン
-    url_pattern = re.compile(r'https?://[\w/:%#\$&\?\(\)~\.=\+\-]+')
+def scan_file(path: str, types: tuple, start: int = 0, end: int = None) -> dict:
+    # ワーカプロセスではファイルを開き直してmmapする (データをプロセス間でコピーしない)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return scan(mapped, types, start, end)
+
+
+def scan_stream(stream, types: tuple, executor=None, max_pending: int = 1) -> list:
+    """
+    パイプなどサイズの分からない入力をCHUNK_SIZEずつ読みながら探す
+    executorがあれば読んだチャンクをワーカに渡し、読み込みと並行して探す (max_pending個まで)
+
+    Returns:
+        list: チャンクごとのscanの結果
+    """
+    results = []
+    pending = []
+    rest = b""
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        data = rest + chunk if rest else chunk
+        if not chunk:
+            cut = len(data)
+        else:
+            # 最後の改行(無ければ新しく読んだ部分の最初の区切り)までを探し、残りは次に読んだものと一緒に探す
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                match = SEPARATOR.search(data, len(rest))
+                cut = match.end() if match else 0
+        if cut > 0:
+            if executor is None:
+                results.append(scan(data, types, 0, cut))
+            else:
+                pending.append(executor.submit(scan, data[:cut], types))
+                # 読み込みが先に進みすぎてメモリを使いすぎないようにする
+                while len(pending) > max_pending:
+                    results.append(pending.pop(0).result())
+        if not chunk:
+            break
+        rest = data[cut:]
+    results.extend(future.result() for future in pending)
+    return results
+
+
+def extract(sources: list, types: list = None, jobs: int = None) -> dict:
+    """
+    ファイル("-"ならstdin、ファイルでなければ文字列そのもの)からURLなどを取り出す
+    大きなファイルはmmapしてチャンクに分け、jobs個のプロセスで並列に探す
+
+    Args:
+        sources (list): 入力
+        types (list): 探す種類 (PATTERNSのキー)
+        jobs (int): ワーカプロセスの数 Noneならcpuの数
+
+    Returns:
+        dict: 種類 -> 値のリスト (出現順、重複なし)
+    """
+    types = tuple(kind for kind in PATTERNS if kind in (types or DEFAULT_TYPES))
+    jobs = jobs or os.cpu_count() or 1
+    executor = None
+    results = []
+    try:
+        for source in sources:
+            if source == "-":
+                # パイプは大きさが分からないので、並列にするかは最初から決める
+                if jobs > 1 and executor is None:
+                    executor = ProcessPoolExecutor(jobs)
+                results.extend(scan_stream(sys.stdin.buffer, types, executor, jobs * 2))
+            elif os.path.isfile(source):
+                size = os.path.getsize(source)
+                if size == 0:
+                    continue
+                if size < PARALLEL_THRESHOLD or jobs == 1:
+                    results.append(scan_file(source, types))
+                    continue
+                with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    chunks = split_chunks(mapped, max(CHUNK_SIZE, size // (jobs * 4) + 1))
+                if executor is None:
+                    executor = ProcessPoolExecutor(jobs)
+                futures = [executor.submit(scan_file, source, types, start, end) for start, end in chunks]
+                results.extend(future.result() for future in futures)
+            else:
+                results.append(scan(source.encode(), types))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    # チャンクごとの結果を順に繋げ、チャンクをまたいだ重複を除く
+    extracted = {kind: {} for kind in types}
+    for result in results:
+        for kind, values in result.items():
+            extracted[kind].update(dict.fromkeys(values))
+    return {kind: list(values) for kind, values in extracted.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract URLs (and IPs, domains, emails, flags) from files, stdin or text.")
+    parser.add_argument("sources", nargs="+", help="file, - (stdin) or text")
+    parser.add_argument("-t", "--types", default=",".join(DEFAULT_TYPES), help=f"comma separated types or all ({', '.join(PATTERNS)})")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: cpu count)")
+    parser.add_argument("--json", action="store_true", help="print {type: [values]} as JSON")
+    args = parser.parse_args()
+
+    types = list(PATTERNS) if args.types == "all" else [kind.strip() for kind in args.types.split(",")]
+    for kind in types:
+        if kind not in PATTERNS:
+            parser.error(f"unknown type: {kind}")
 
-    # テキストからURLを抽出
-    urls = url_pattern.findall(text)
+    extracted = extract(args.sources, types, args.jobs)
 
-    # 結果を出力
-    for url in urls:
-        print(url)
+    # 結果を出力 (種類が1つなら1行に1つの値、複数なら "種類\t値")
+    if args.json:
+        print(json.dumps(extracted, indent=4))
+    elif len(extracted) == 1:
+        for value in next(iter(extracted.values())):
+            print(value)
+    else:
+        for kind, values in extracted.items():
+            for value in values:
+                print(f"{kind}\t{value}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,27 +1,153 @@
-import hashlib
+import os
 import sys
+import glob
+import json
+import mmap
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
-def calculate_hash(file_path, algorithm):
-    hash_obj = hashlib.new(algorithm)
+DEFAULT_ALGORITHMS = ("MD5", "SHA1", "SHA256")
+BLOCK_SIZE = 1024 * 1024         # 一度にupdateする大きさ (2047バイトを超えるとhashlibはGILを解放する)
+MMAP_THRESHOLD = 4 * 1024 * 1024  # これより大きいファイルはmmapして読む
+SHAKE_LENGTH = 32                 # shake_*は出力の長さが可変なので固定のバイト数で出す
+
+def parse_algorithms(algorithm) -> list:
+    """
+    Args:
+        algorithm (str | list): "MD5,SHA1" のようなカンマ区切り、またはそのリスト "all"ならhashlibが必ず持つもの全て
+
+    Returns:
+        list: 大文字のアルゴリズム名
+    """
+    if not algorithm:
+        return list(DEFAULT_ALGORITHMS)
+    if isinstance(algorithm, str):
+        algorithm = algorithm.split(",")
+    names = []
+    for name in algorithm:
+        name = name.strip().upper()
+        if name == "ALL":
+            names.extend(guaranteed.upper() for guaranteed in sorted(hashlib.algorithms_guaranteed))
+        elif name:
+            try:
+                hashlib.new(name.lower())
+            except ValueError:
+                raise ValueError(f"Invalid algorithm specified: {name}")
+            names.append(name)
+    return list(dict.fromkeys(names))
+
+
+def expand_paths(paths) -> list:
+    """
+    ファイル、ディレクトリ(再帰的に中のファイル全て)、glob(**も使える)をファイルのパスのリストにする
+
+    Args:
+        paths (str | list): パス
+
+    Returns:
+        list: ファイルのパス (重複なし、入力の順)
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+        elif os.path.isdir(path):
+            for directory, directories, names in os.walk(path):
+                directories.sort()
+                files.extend(os.path.join(directory, name) for name in sorted(names))
+        else:
+            matches = sorted(glob.glob(path, recursive=True))
+            if not matches:
+                raise FileNotFoundError(f"Error: {path} is not found.")
+            for match in matches:
+                files.extend(expand_paths(match) if os.path.isdir(match) else [match])
+    return list(dict.fromkeys(file for file in files if os.path.isfile(file)))
+
+
+def calculate_hashes(file_path, algorithms) -> dict:
+    """
+    ファイルを一度だけ読み、全てのアルゴリズムのハッシュを計算する
+    ブロックごとに全てのハッシュを更新するので、大きなファイルでも同じデータを何度もディスクから読まない
+
+    Returns:
+        dict: アルゴリズム名 -> ハッシュ(16進数)
+    """
+    hash_objs = [hashlib.new(algorithm.lower()) for algorithm in algorithms]
     with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_obj.update(chunk)
-    return hash_obj.hexdigest()
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                for offset in range(0, size, BLOCK_SIZE):
+                    block = view[offset:offset + BLOCK_SIZE]
+                    for hash_obj in hash_objs:
+                        hash_obj.update(block)
+                    block.release()
+        else:
+            # 小さなファイルはmmapの準備の方が高くつくので、バッファに読み込む
+            buffer = bytearray(min(max(size, 1), BLOCK_SIZE))
+            with memoryview(buffer) as view:
+                while length := f.readinto(buffer):
+                    for hash_obj in hash_objs:
+                        hash_obj.update(view[:length])
+    return {
+        algorithm: hash_obj.hexdigest(SHAKE_LENGTH) if algorithm.startswith("SHAKE") else hash_obj.hexdigest()
+        for algorithm, hash_obj in zip(algorithms, hash_objs)
+    }
+
+
+def calculate_hash(file_path, algorithm):
+    return calculate_hashes(file_path, [algorithm.upper()])[algorithm.upper()]
+
+
+def hash_files(files: list, algorithms: list, workers: int = None) -> dict:
+    """
+    複数のファイルをスレッドプールで並列にハッシュする
+    読めなかったファイルは {"error": ...} にする
+
+    Returns:
+        dict: ファイルのパス -> (アルゴリズム名 -> ハッシュ)
+    """
+    def calculate(file_path):
+        try:
+            return calculate_hashes(file_path, algorithms)
+        except OSError as e:
+            return {"error": str(e)}
+
+    if len(files) <= 1 or workers == 1:
+        return {file_path: calculate(file_path) for file_path in files}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(files, executor.map(calculate, files)))
+
+
+def hashcalc(file_path, algorithm=None, workers=None):
+    """
+    built-inモジュールのエントリポイント
+
+    Args:
+        file_path (str | list): ファイル、ディレクトリ、またはglob
+        algorithm (str): カンマ区切りのアルゴリズム名 (省略時はMD5,SHA1,SHA256、"all"で全て)
+        workers (str): 並列に読むスレッドの数
+
+    Returns:
+        dict: ファイルのパス -> (アルゴリズム名 -> ハッシュ)
+    """
+    algorithms = parse_algorithms(algorithm)
+    return hash_files(expand_paths(file_path), algorithms, int(workers) if workers else None)
 
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python hashcalc.py <file_path> <algorithm>")
-        print("Supported algorithms: MD5, SHA1, SHA256")
+    if len(sys.argv) < 2:
+        print("Usage: python hashcalc.py <file | directory | glob> [algorithm,...] [workers]")
+        print("Supported algorithms: " + ", ".join(sorted(name.upper() for name in hashlib.algorithms_available)))
         sys.exit(1)
 
-    file_path = sys.argv[1]
-    algorithm = sys.argv[2].upper()
-
-    if algorithm in ("MD5", "SHA1", "SHA256"):
-        hash_value = calculate_hash(file_path, algorithm)
-        print(f"{algorithm}: {hash_value}")
-    else:
-        print("Invalid algorithm specified.")
+    try:
+        result = hashcalc(*sys.argv[1:4])
+    except (ValueError, FileNotFoundError) as e:
+        print(e)
+        sys.exit(1)
+    print(json.dumps(result, indent=4))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
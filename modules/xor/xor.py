@@ -1,24 +1,386 @@
+import os
+import re
 import sys
+import math
+import base64
+from collections import Counter
+
+# NumPyが無い環境ではbytes.translateと整数のXORで同じ処理をする (遅いが結果は同じ)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_TOP = 10
+DEFAULT_MAX_KEY_LENGTH = 4
+INLINE_RESULT_SIZE = 64 * 1024   # これより大きいXORの結果はtext/hexにせずbytesのまま返す
+PREVIEW_SIZE = 64
+FLAG_PREFIXES = (b"flag{", b"FLAG{", b"ctf{", b"CTF{")
+MAX_FLAG_LENGTH = 200
+MAX_FLAG_HITS = 16
+MAX_HISTOGRAM_PERIOD = 64
+
+# 英文での文字の出現頻度(%) 大文字は小文字と同じ扱い
+ENGLISH_FREQUENCY = {
+    "a": 8.2, "b": 1.5, "c": 2.8, "d": 4.3, "e": 12.7, "f": 2.2, "g": 2.0, "h": 6.1, "i": 7.0,
+    "j": 0.15, "k": 0.77, "l": 4.0, "m": 2.4, "n": 6.7, "o": 7.5, "p": 1.9, "q": 0.095, "r": 6.0,
+    "s": 6.3, "t": 9.1, "u": 2.8, "v": 0.98, "w": 2.4, "x": 0.15, "y": 2.0, "z": 0.074,
+}
+
+
+def _make_weights() -> list:
+    """
+    バイト値ごとの点数 復号結果の平均がscoreになる
+    英字は頻度の対数、空白は最も高く、その他の表示可能な文字は少し、制御文字と0x80以上は大きく減点する
+    """
+    weights = []
+    for byte in range(256):
+        char = chr(byte)
+        if char.lower() in ENGLISH_FREQUENCY:
+            weight = 2.0 + math.log(ENGLISH_FREQUENCY[char.lower()]) / 2
+            if char.isupper():
+                weight -= 0.5
+        elif char == " ":
+            weight = 3.5
+        elif char.isdigit() or char in "\n\r\t{}_.,-:'\"!?()":
+            weight = 1.0
+        elif 0x20 <= byte < 0x7f:
+            weight = 0.0
+        else:
+            weight = -6.0
+        weights.append(weight)
+    return weights
+
+
+WEIGHTS = _make_weights()
+PRINTABLE = [1 if 0x20 <= byte < 0x7f or byte in (0x09, 0x0a, 0x0d) else 0 for byte in range(256)]
+
+
+def make_flag_pattern(prefixes: list):
+    """
+    Returns:
+        re.Pattern: prefixで始まり}で終わる表示可能な文字列
+    """
+    return re.compile(b"(?:" + b"|".join(re.escape(prefix) for prefix in prefixes) + rb")[\x20-\x7c\x7e]{0,%d}\}" % MAX_FLAG_LENGTH)
+
+
+def xor_bytes(data, key: bytes) -> bytes:
+    """
+    dataをkeyの繰り返しとXORする
+
+    Args:
+        data (bytes | mmap.mmap): データ
+        key (bytes): 鍵 (1バイト以上)
+
+    Returns:
+        bytes: 結果
+    """
+    length = len(data)
+    if not key:
+        raise ValueError("Error: key is empty.")
+    if length == 0:
+        return b""
+    if np is not None:
+        array = np.frombuffer(data, dtype=np.uint8)
+        keys = np.frombuffer(key, dtype=np.uint8)
+        if len(key) == 1:
+            return np.bitwise_xor(array, keys[0]).tobytes()
+        # 鍵の長さごとの行に並べて、鍵をブロードキャストしてXORする
+        usable = length - length % len(key)
+        result = np.empty(length, dtype=np.uint8)
+        np.bitwise_xor(array[:usable].reshape(-1, len(key)), keys, out=result[:usable].reshape(-1, len(key)))
+        np.bitwise_xor(array[usable:], keys[:length - usable], out=result[usable:])
+        return result.tobytes()
+    if len(key) == 1:
+        return bytes(data[:]).translate(bytes(byte ^ key[0] for byte in range(256)))
+    # データ全体を1つの整数にしてXORすると、Pythonのループを使わずに済む
+    repeated = (key * (length // len(key) + 1))[:length]
+    return (int.from_bytes(data[:], "big") ^ int.from_bytes(repeated, "big")).to_bytes(length, "big")
+
+
+def byte_histograms(data, period: int = 1):
+    """
+    period個の列(i % periodが同じ位置)ごとのバイト値の出現回数
+
+    Returns:
+        ndarray | list: (period, 256) の出現回数
+    """
+    if np is not None:
+        array = np.frombuffer(data, dtype=np.uint8)
+        return np.stack([np.bincount(array[column::period], minlength=256) for column in range(period)])
+    raw = bytes(data[:])
+    histograms = []
+    for column in range(period):
+        counter = Counter(raw[column::period])
+        histograms.append([counter.get(byte, 0) for byte in range(256)])
+    return histograms
+
+
+def fold_histograms(histograms, length: int):
+    """
+    周期periodの列ごとの出現回数から、周期length(periodの約数)の列ごとの出現回数を作る
+    """
+    period = len(histograms)
+    if np is not None:
+        return histograms.reshape(period // length, length, 256).sum(axis=0)
+    return [[sum(counts) for counts in zip(*histograms[column::length])] for column in range(length)]
+
+
+def score_keys(histogram) -> list:
+    """
+    1つの列の出現回数から、256通りの1バイト鍵それぞれで復号した結果の点数を求める
+    鍵kで復号するとバイト値bはb^kになるので、データを復号せずに出現回数の並べ替えだけで計算できる
+
+    Returns:
+        ndarray | list: 鍵ごとの (1バイトあたりの点数, 表示可能な文字の割合)
+    """
+    if np is not None:
+        histogram = np.asarray(histogram, dtype=np.float64)
+        total = max(histogram.sum(), 1.0)
+        # permuted[k, p] = 鍵kで復号したときに平文がpになるバイトの数
+        values = np.arange(256)
+        permuted = histogram[values[None, :] ^ values[:, None]]
+        scores = permuted @ np.asarray(WEIGHTS) / total
+        printable = permuted @ np.asarray(PRINTABLE, dtype=np.float64) / total
+        return np.stack([scores, printable], axis=1)
+    total = max(sum(histogram), 1)
+    present = [(byte, count) for byte, count in enumerate(histogram) if count]
+    result = []
+    for key in range(256):
+        score = sum(count * WEIGHTS[byte ^ key] for byte, count in present) / total
+        printable = sum(count * PRINTABLE[byte ^ key] for byte, count in present) / total
+        result.append((score, printable))
+    return result
+
+
+def find_flag_keys(data, prefixes: list, max_key_length: int) -> list:
+    """
+    平文にprefixが含まれる鍵を、復号せずにデータから直接探す
+    平文のi文字目とi+L文字目のXORは、鍵の長さがLなら暗号文でも同じになることを使う
+    偶然の一致を除くため、prefixが鍵より2文字以上長い場合だけ探し、見つけた位置を復号してフラグの形になっているか確かめる
+
+    Returns:
+        list: (鍵, 平文でprefixが始まる位置) のリスト
+    """
+    pattern_of_flag = make_flag_pattern(prefixes)
+    found = []
+    raw = bytes(data[:]) if np is None else None
+    array = np.frombuffer(data, dtype=np.uint8) if np is not None else None
+    for length in range(1, max_key_length + 1):
+        if len(data) <= length:
+            break
+        if array is not None:
+            difference = np.bitwise_xor(array[length:], array[:-length]).tobytes()
+        else:
+            difference = xor_bytes(raw[length:], raw[:-length])
+        for prefix in prefixes:
+            if len(prefix) - length < 2:
+                continue
+            pattern = bytes(a ^ b for a, b in zip(prefix[length:], prefix[:-length]))
+            position = difference.find(pattern)
+            hits = 0
+            while position != -1 and hits < MAX_FLAG_HITS:
+                key = bytearray(length)
+                for i in range(length):
+                    key[(position + i) % length] = data[position + i] ^ prefix[i]
+                start = position - position % length
+                plain = xor_bytes(data[start:position + len(prefix) + MAX_FLAG_LENGTH + 1], bytes(key))
+                if pattern_of_flag.match(plain, position - start):
+                    found.append((bytes(key), position))
+                    hits += 1
+                position = difference.find(pattern, position + 1)
+    return found
+
+
+def find_encrypted_flag(data, key: bytes, prefixes: list) -> int:
+    """
+    鍵が分かっている場合に、prefixをその鍵で暗号化したものをデータから直接探す
+    find_flag_keysで探せない長さの鍵(prefixとの差が2文字未満)に使う
+
+    Returns:
+        int: 平文でprefixが始まる位置 無ければNone
+    """
+    length = len(key)
+    for phase in range(length):
+        rotated = key[phase:] + key[:phase]
+        for prefix in prefixes:
+            encrypted = xor_bytes(prefix, rotated)
+            position = data.find(encrypted)
+            for _ in range(MAX_FLAG_HITS):
+                if position == -1:
+                    break
+                if position % length == phase:
+                    return position
+                position = data.find(encrypted, position + 1)
+    return None
+
+
+def minimal_key(key: bytes) -> bytes:
+    """
+    keyがより短い鍵の繰り返しなら、その短い鍵を返す ("AA" -> "A", "abab" -> "ab")
+    """
+    for length in range(1, len(key)):
+        if len(key) % length == 0 and key[:length] * (len(key) // length) == key:
+            return key[:length]
+    return key
+
+
+def describe_candidate(data, key: bytes, score: float, printable: float, flag_position: int = None, flag_pattern=None) -> dict:
+    """
+    候補の鍵で復号した結果の先頭とフラグを調べる
+    フラグは見つかった位置の周辺と先頭のみを復号して探す
+    """
+    windows = [(0, min(len(data), PREVIEW_SIZE * 64))]
+    if flag_position is not None:
+        windows.append((flag_position, min(len(data), flag_position + 512)))
+    flags = []
+    preview = b""
+    for start, end in windows:
+        # 鍵の位相を合わせるため、鍵の長さの倍数の位置から復号する
+        start -= start % len(key)
+        plain = xor_bytes(data[start:end], key)
+        if start == 0:
+            preview = plain[:PREVIEW_SIZE]
+        for match in (flag_pattern or make_flag_pattern(FLAG_PREFIXES)).finditer(plain):
+            flag = match.group().decode()
+            if flag not in flags:
+                flags.append(flag)
+    return {
+        "key": key.decode("latin-1") if all(0x20 <= byte < 0x7f for byte in key) else None,
+        "key_hex": key.hex(),
+        "score": round(float(score), 4),
+        "printable": round(float(printable), 4),
+        "flags": flags,
+        "preview": preview.decode("ascii", "backslashreplace"),
+    }
+
+
+def brute_force(data, top: int = DEFAULT_TOP, max_key_length: int = DEFAULT_MAX_KEY_LENGTH, prefixes: list = FLAG_PREFIXES) -> list:
+    """
+    1バイトの鍵256通りと、max_key_lengthバイトまでの短い鍵を試して上位top件を返す
+    1バイトの鍵は出現回数から一度に点数を付け、複数バイトの鍵は列ごとに最も点数の高いバイトを選ぶ
+    平文にフラグの形式(flag{ など)が現れる鍵は点数に関わらず上位にする
+
+    Returns:
+        list: describe_candidateのdictのリスト (フラグが見つかったもの、点数の順)
+    """
+    if len(data) == 0:
+        return []
+    candidates = {}  # 鍵 -> (score, printable, フラグの位置)
+    # 全ての長さの公倍数の周期で一度だけ数え、各長さの列の出現回数はそれをまとめて作る
+    period = math.lcm(*range(1, max_key_length + 1))
+    columns = byte_histograms(data, period) if period <= MAX_HISTOGRAM_PERIOD else None
+    folded = {}
+    def get_histograms(length):
+        if length not in folded:
+            folded[length] = fold_histograms(columns, length) if columns is not None else byte_histograms(data, length)
+        return folded[length]
+
+    single = score_keys(get_histograms(1)[0])
+    for key in range(256):
+        candidates[bytes([key])] = (single[key][0], single[key][1], None)
+
+    for length in range(2, max_key_length + 1):
+        if len(data) < length * 8:
+            break
+        histograms = get_histograms(length)
+        key = bytearray()
+        score = printable = 0.0
+        for histogram in histograms:
+            column = score_keys(histogram)
+            best = max(range(256), key=lambda byte: column[byte][0])
+            key.append(best)
+            score += column[best][0] / length
+            printable += column[best][1] / length
+        key = bytes(key)
+        if minimal_key(key) == key:
+            candidates[key] = (score, printable, None)
+
+    for key, position in find_flag_keys(data, prefixes, max_key_length):
+        key = minimal_key(key)
+        if key not in candidates:
+            scores = [score_keys(histogram)[byte] for histogram, byte in zip(get_histograms(len(key)), key)]
+            candidates[key] = (sum(s[0] for s in scores) / len(key), sum(s[1] for s in scores) / len(key), position)
+        else:
+            score, printable, previous = candidates[key]
+            candidates[key] = (score, printable, previous if previous is not None else position)
+
+    for key, (score, printable, position) in list(candidates.items()):
+        if position is None and len(key) > 1 and any(len(prefix) - len(key) < 2 for prefix in prefixes):
+            candidates[key] = (score, printable, find_encrypted_flag(data, key, prefixes))
+
+    flagged = [key for key, (_, _, position) in candidates.items() if position is not None]
+    ranked = sorted(candidates, key=lambda key: candidates[key][0], reverse=True)
+    # 点数の上位はフラグを確認するため少し多めに復号する
+    chosen = flagged + [key for key in ranked[:top * 2] if key not in flagged]
+    flag_pattern = make_flag_pattern(prefixes)
+    results = [describe_candidate(data, key, *candidates[key], flag_pattern) for key in chosen]
+    results.sort(key=lambda result: (bool(result["flags"]), result["score"]), reverse=True)
+    return results[:top]
+
+
+def parse_key(key: str) -> bytes:
+    """
+    "hex:..."、"b64:..." または文字列の鍵をbytesにする
+    """
+    if key.startswith("hex:"):
+        return bytes.fromhex(key[4:])
+    if key.startswith("b64:"):
+        return base64.b64decode(key[4:])
+    return key.encode()
+
+
+def xor(data, key: str = "brute", top: str = None, max_key_length: str = None) -> object:
+    """
+    built-inモジュールのエントリポイント
+    dataはフレームワークが読み込んで渡す (xor.jsonのload-inputs)
+
+    Args:
+        data (bytes | mmap.mmap): 入力
+        key (str): 鍵 ("hex:...", "b64:..." または文字列) "brute"なら鍵を総当たりする
+        top (str): bruteで返す候補の数
+        max_key_length (str): bruteで試す鍵の最大の長さ
+
+    Returns:
+        dict | list: 鍵を指定した場合は結果、bruteなら候補のリスト
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    if key == "brute":
+        return brute_force(
+            data,
+            int(top) if top else DEFAULT_TOP,
+            int(max_key_length) if max_key_length else DEFAULT_MAX_KEY_LENGTH,
+        )
+    result = xor_bytes(data, parse_key(key))
+    if len(result) <= INLINE_RESULT_SIZE:
+        return {"size": len(result), "text": result.decode("utf-8", "backslashreplace"), "hex": result.hex()}
+    # 大きな結果はtext/hexにしない (フレームワークがblobにする)
+    return {"size": len(result), "data": result, "preview": result[:PREVIEW_SIZE].decode("ascii", "backslashreplace")}
+
 
 def xor_strings(str1, str2):
     return ''.join(chr(ord(a) ^ ord(b)) for a, b in zip(str1, str2))
 
+
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python xor.py <string1> <string2>")
+    if len(sys.argv) < 3:
+        print("Usage: python xor.py <file | string> <key | hex:... | b64:... | brute> [top] [max_key_length]")
         sys.exit(1)
 
-    string1 = sys.argv[1]
-    string2 = sys.argv[2]
-
-    # 文字列の長さが異なる場合は短い方に合わせる
-    if len(string1) != len(string2):
-        min_len = min(len(string1), len(string2))
-        string1 = string1[:min_len]
-        string2 = string2[:min_len]
-
-    result = xor_strings(string1, string2)
-    print(result)
+    data = sys.argv[1]
+    if os.path.isfile(data):
+        with open(data, "rb") as f:
+            data = f.read()
+    result = xor(data, *sys.argv[2:5])
+    if isinstance(result, list):
+        for candidate in result:
+            print(f"{candidate['key_hex']} score={candidate['score']} flags={candidate['flags']} {candidate['preview']}")
+    else:
+        if "text" in result:
+            print(result["text"])
+        else:
+            sys.stdout.buffer.write(result["data"])
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1 @@
+from .blob import *
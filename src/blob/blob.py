@@ -0,0 +1,224 @@
+import os
+import re
+import mmap
+import shutil
+import hashlib
+import tempfile
+import threading
+
+BLOB_DIR = "workspace/blobs"
+# これを超えるモジュールの出力はblobにする
+BLOB_THRESHOLD = 1024 * 1024
+PAGE_LINES = 100
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobView:
+    def __init__(self, path: str, digest: str, size: int) -> None:
+        """
+        blob(ディスク上の出力)をmmapで読むビュー
+        全体を読み込まずにスライス、検索、行単位のページングができる
+        str()したときだけ全体をデコードする
+
+        Args:
+            path (str): blobのファイルパス
+            digest (str): 中身のsha256
+            size (int): バイト数
+        """
+        self.path = path
+        self.digest = digest
+        self.size = size
+        self._mmap = None
+        self._line_starts = [0]  # ここまでに見つけた行頭のオフセット
+        self._lock = threading.Lock()
+
+    def _map(self):
+        if self._mmap is None:
+            with self._lock:
+                if self._mmap is None:
+                    if self.size == 0:
+                        # 空のファイルはmmapできない
+                        self._mmap = b""
+                    else:
+                        with open(self.path, 'rb') as f:
+                            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, key) -> bytes:
+        return self._map()[key]
+
+    def find(self, sub, start: int = 0, end: int = None) -> int:
+        """
+        Returns:
+            int: subが最初に現れるバイトオフセット 無ければ-1
+        """
+        if isinstance(sub, str):
+            sub = sub.encode()
+        return self._map().find(sub, start, self.size if end is None else end)
+
+    def search(self, pattern, flags: int = 0):
+        """
+        正規表現にマッチする箇所を順に返す(bytesのre.Match)
+        """
+        if isinstance(pattern, str):
+            pattern = pattern.encode()
+        return re.finditer(pattern, self._map(), flags)
+
+    def iter_chunks(self, size: int = CHUNK_SIZE):
+        """
+        中身をsizeバイトずつ返す (OutputBuffer.iter_chunksと同じ)
+        """
+        data = self._map()
+        for start in range(0, self.size, size):
+            yield data[start:start + size]
+
+    def line_at(self, offset: int) -> str:
+        """
+        バイトオフセットoffsetを含む行を(改行を除いて)返す
+        """
+        data = self._map()
+        start = data.rfind(b"\n", 0, offset) + 1
+        end = data.find(b"\n", offset)
+        if end == -1:
+            end = self.size
+        return data[start:end].decode(errors="replace")
+
+    def iter_lines(self, start: int = 0):
+        """
+        start行目から1行ずつ(改行を除いた)strで返す
+        """
+        offset = self._line_offset(start)
+        data = self._map()
+        while offset is not None and offset < self.size:
+            end = data.find(b"\n", offset)
+            if end == -1:
+                end = self.size
+            yield data[offset:end].decode(errors="replace")
+            offset = end + 1
+
+    def lines(self, start: int, count: int) -> list:
+        lines = []
+        for line in self.iter_lines(start):
+            if len(lines) >= count:
+                break
+            lines.append(line)
+        return lines
+
+    def page(self, number: int, size: int = PAGE_LINES) -> list:
+        return self.lines(number * size, size)
+
+    def _line_offset(self, line: int) -> int:
+        # 見つけた行頭を覚えておき、ページを進めるたびに先頭から探し直さないようにする
+        data = self._map()
+        with self._lock:
+            starts = self._line_starts
+            while len(starts) <= line:
+                end = data.find(b"\n", starts[-1])
+                if end == -1 or end + 1 >= self.size:
+                    return None
+                starts.append(end + 1)
+            return starts[line]
+
+    def text(self, errors: str = "replace") -> str:
+        return bytes(self._map()[:]).decode(errors=errors)
+
+    def close(self) -> None:
+        with self._lock:
+            if isinstance(self._mmap, mmap.mmap):
+                self._mmap.close()
+            self._mmap = None
+
+    def __str__(self) -> str:
+        return self.text()
+
+    def __repr__(self) -> str:
+        return f"<BlobView sha256:{self.digest[:16]} {self.size} bytes>"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, BlobView) and other.digest == self.digest
+
+    def __hash__(self) -> int:
+        return hash(self.digest)
+
+    def __getstate__(self) -> dict:
+        return {"path": self.path, "digest": self.digest, "size": self.size}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["path"], state["digest"], state["size"])
+
+
+class BlobStore:
+    def __init__(self, directory: str = BLOB_DIR, threshold: int = BLOB_THRESHOLD) -> None:
+        """
+        大きな出力をsha256をファイル名にして保存する場所
+        同じ中身の出力は同じファイルになる
+
+        Args:
+            directory (str): blobを置くディレクトリ
+            threshold (int): これを超える出力をblobにする
+        """
+        self.directory = directory
+        self.threshold = threshold
+
+    def get_path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, digest: str) -> BlobView:
+        path = self.get_path(digest)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            raise KeyError(f"Error: blob {digest} is not found.")
+        return BlobView(path, digest, size)
+
+    def put_bytes(self, data: bytes) -> BlobView:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.get_path(digest)
+        if not os.path.exists(path):
+            fd, temp_path = self._make_temp(digest)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        return BlobView(path, digest, len(data))
+
+    def put_file(self, source: str) -> BlobView:
+        """
+        ファイルをblobにする
+        既に同じ中身のblobがあればそれを使い、無ければハードリンク(できなければコピー)する
+        """
+        hash_obj = hashlib.sha256()
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                hash_obj.update(chunk)
+        digest = hash_obj.hexdigest()
+        path = self.get_path(digest)
+        if not os.path.exists(path):
+            fd, temp_path = self._make_temp(digest)
+            os.close(fd)
+            os.remove(temp_path)
+            try:
+                os.link(source, temp_path)
+            except OSError:
+                shutil.copyfile(source, temp_path)
+            os.replace(temp_path, path)
+        return BlobView(path, digest, os.path.getsize(path))
+
+    def put_output(self, output) -> BlobView:
+        """
+        Args:
+            output (OutputBuffer): モジュールの出力
+        """
+        output.close()
+        if output.spilled:
+            return self.put_file(output.path)
+        return self.put_bytes(output.getvalue())
+
+    def _make_temp(self, digest: str) -> tuple:
+        os.makedirs(os.path.dirname(self.get_path(digest)), exist_ok=True)
+        return tempfile.mkstemp(dir=os.path.dirname(self.get_path(digest)), prefix=".tmp-")
+
+
+blob_store = BlobStore()
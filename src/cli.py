@@ -2,20 +2,26 @@ import argparse
 import sys
 import os
 import glob
-from io import StringIO
-from prompt_toolkit import PromptSession
-from prompt_toolkit.history import InMemoryHistory
-from prompt_toolkit.completion import Completer, Completion, WordCompleter, NestedCompleter
-from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
-from prompt_toolkit.validation import Validator, ValidationError
-from prompt_toolkit.shortcuts import prompt
-from prompt_toolkit.styles import Style
-
-from workspace.manager import create_workspace, save_workspace, load_workspace_unsafe, save_workspace_unsafe
-from workspace.workspace import WorkSpace
+import re
+
+# prompt_toolkit、workspace(module, asyncio, sqlite3など)、blobは使うときにimportする
+# (list moduleのような1回だけのコマンドの起動を速くするため)
+from registry import module_registry, recipe_registry
 
 current_workspace = None
 
+def create_workspace(workspace_name):
+    from workspace.manager import create_workspace
+    return create_workspace(workspace_name)
+
+def save_workspace(workspace, workspace_path):
+    from workspace.manager import save_workspace
+    return save_workspace(workspace, workspace_path)
+
+def load_workspace(workspace_path):
+    from workspace.manager import load_workspace
+    return load_workspace(workspace_path)
+
 class CustomArgumentParser(argparse.ArgumentParser):
     def error(self, message):
         raise argparse.ArgumentError(None, message)
@@ -30,14 +36,30 @@ def set_workspace_name(name):
 def get_or_load_workspace(workspace_name):
     global current_workspace
     if current_workspace is None or current_workspace.workspace_name != workspace_name:
-        current_workspace = load_workspace_unsafe(workspace_name)
+        from workspace.manager import is_legacy_workspace, migrate_workspace
+        if is_legacy_workspace(workspace_name):
+            # 以前のCLIはpickleで保存していたので、SQLite形式に変換してから読み込む
+            backup = migrate_workspace(workspace_name)
+            print(f"Workspace '{workspace_name}' was converted from the old pickle format (original: {backup}).")
+        workspace = load_workspace(workspace_name)
+        if current_workspace is not None:
+            current_workspace.close()
+        current_workspace = workspace
     return current_workspace
 
 def create_workspace_cmd(args):
     global current_workspace
+    from workspace.manager import WORKSPACE_DIR
     set_workspace_name(args.name)
+    if current_workspace is not None:
+        current_workspace.close()
+    # 同じ名前のworkspaceは作り直す
+    for suffix in ("", "-wal", "-shm"):
+        path = os.path.join(WORKSPACE_DIR, args.name + suffix)
+        if os.path.isfile(path):
+            os.remove(path)
     current_workspace = create_workspace(args.name)
-    save_workspace_unsafe(current_workspace, args.name)
+    save_workspace(current_workspace, args.name)
     print(f"Workspace '{args.name}' created and saved.")
     workspace = get_files('./workspace')
     return workspace
@@ -52,45 +74,62 @@ def save_workspace_cmd(args):
     if current_workspace is None:
         print("No workspace loaded.")
         current_workspace = create_workspace("No workspace")
-    save_workspace_unsafe(current_workspace, current_workspace.workspace_name)
-    print(f"Workspace '{current_workspace.workspace_name}' saved.")
+    from workspace.manager import WORKSPACE_DIR, is_legacy_workspace
+    if is_legacy_workspace(current_workspace.workspace_name):
+        # 同じ名前のpickle形式のファイルには追記できないので、残しておいて新しく保存する
+        path = os.path.join(WORKSPACE_DIR, current_workspace.workspace_name)
+        os.replace(path, path + ".pickle")
+        print(f"Old pickle workspace moved to {path}.pickle.")
+    count = save_workspace(current_workspace, current_workspace.workspace_name)
+    print(f"Workspace '{current_workspace.workspace_name}' saved ({count} new results).")
 
 def list_modules(args):
-    global current_workspace
-    if current_workspace is None:
-        current_workspace = create_workspace("No workspace")
-    modules = current_workspace.get_module_list()
-    for module in modules:
+    # 一覧と説明はレジストリ(のスナップショット)だけで済むので、workspaceを作らない
+    for module in get_module_list():
         print(module)
 
 def list_recipes(args):
-    global current_workspace
-    if current_workspace is None:
-        current_workspace = create_workspace("No workspace")
-    recipes = current_workspace.get_recipe_list()
-    for recipe in recipes:
+    for recipe in get_recipe_list():
         print(recipe)
 
+def get_description(registry, name):
+    definition = registry.get(name)
+    if not "description" in definition:
+        raise KeyError(f"{name} has no description.")
+    return definition["description"]
+
 def module_info(args):
-    global current_workspace
-    if current_workspace is None:
-        current_workspace = create_workspace("No workspace")
-    info = current_workspace.get_module_info(args.module_name)
+    info = get_description(module_registry, args.module_name)
     if info:
         print(info)
     else:
         print(f"Module '{args.module_name}' not found.")
 
 def recipe_info(args):
-    global current_workspace
-    if current_workspace is None:
-        current_workspace = create_workspace("No workspace")
-    info = current_workspace.get_recipe_info(args.recipe_name)
+    info = get_description(recipe_registry, args.recipe_name)
     if info:
         print(info)
     else:
         print(f"Recipe '{args.recipe_name}' not found.")
 
+def cache_info(args):
+    global current_workspace
+    if current_workspace is None:
+        current_workspace = create_workspace("No workspace")
+    for key, value in current_workspace.get_cache_stats().items():
+        print(f"{key}: {value}")
+
+def warmup(args):
+    global current_workspace
+    if current_workspace is None:
+        current_workspace = create_workspace("No workspace")
+    results = current_workspace.warmup_environments()
+    for module_name, result in results.items():
+        if isinstance(result, Exception):
+            print(f"{module_name}: failed ({result})")
+        else:
+            print(f"{module_name}: ready ({result})")
+
 def run_module(args):
     global current_workspace
     if current_workspace is None:
@@ -111,10 +150,40 @@ def run_recipe(args):
     if not args.recipe_name:
         print("Error: recipe_name is required.")
         return
+    if "--batch" in args.args:
+        run_recipe_batch(args)
+        return
     recipe_id = current_workspace.run_recipe(args.recipe_name, args.args)
     result = current_workspace.get_recipe_result(recipe_id)
     print(f"Recipe '{args.recipe_name}' executed with result: {result}")
 
+def run_recipe_batch(args):
+    # run recipe <name> --batch <glob> [--jobs N] [args...] (argsはREMAINDERなのでここで取り出す)
+    batch_parser = CustomArgumentParser(prog=f"run recipe {args.recipe_name}")
+    batch_parser.add_argument('--batch', type=str, action='append', required=True, help='Glob pattern of input files (input.0)')
+    batch_parser.add_argument('--jobs', type=int, default=None, help='The number of worker processes')
+    batch_args, recipe_args = batch_parser.parse_known_args(args.args)
+    
+    def on_progress(progress, entry):
+        seconds = f"{entry['seconds']:.2f}s" if entry['seconds'] is not None else entry['error']
+        # 端末なら同じ行を書き換える
+        tty = sys.stdout.isatty()
+        clear = "\x1b[2K" if tty else ""
+        print(f"{clear}[{progress.completed}/{progress.total}] {progress.throughput:.2f} files/s  {entry['status']} {entry['file']} ({seconds})", end="\r" if tty else "\n", flush=True)
+    
+    progress = current_workspace.run_recipe_batch(args.recipe_name, batch_args.batch, recipe_args, max_workers=batch_args.jobs, on_progress=on_progress)
+    if sys.stdout.isatty():
+        print()
+    for entry in sorted(progress.files, key=lambda entry: entry['seconds'] or 0, reverse=True):
+        seconds = f"{entry['seconds']:8.2f}s" if entry['seconds'] is not None else " " * 9
+        print(f"{entry['status']:9} {seconds}  {entry['id']}  {entry['file']}" + (f"  {entry['error']}" if entry['error'] else ""))
+    summary = progress.summary()
+    print(
+        f"Recipe '{args.recipe_name}' executed on {summary['total']} files: "
+        f"{summary['done']} done, {summary['failed']} failed, {summary['cancelled']} cancelled "
+        f"in {summary['seconds']:.2f}s ({summary['throughput']:.2f} files/s)"
+    )
+
 def run_os_command(args):
     global current_workspace
     if current_workspace is None:
@@ -125,6 +194,71 @@ def run_os_command(args):
     result = current_workspace.get_cmd_result(cmd_id)
     print(f"Command executed with result: {result}")
 
+def show_result(args):
+    global current_workspace
+    if current_workspace is None:
+        print("No workspace loaded.")
+        return
+    from blob import BlobView
+    result = current_workspace.get_result(args.id)
+    items = result if isinstance(result, list) else [result]
+    for index, item in enumerate(items):
+        if args.index is not None and index != args.index:
+            continue
+        if isinstance(item, BlobView):
+            if args.find:
+                # 大きな出力は読み込まずにmmapのまま検索し、マッチした行だけを表示する
+                print(f"[{index}] {item!r}")
+                for count, match in enumerate(item.search(re.escape(args.find.encode()))):
+                    if count >= args.page_size:
+                        print("...")
+                        break
+                    print(f"{match.start()}: {item.line_at(match.start())}")
+                continue
+            print(f"[{index}] {item!r} page {args.page}")
+            for line in item.page(args.page, args.page_size):
+                print(line)
+        else:
+            text = item if isinstance(item, str) else str(item)
+            if args.find:
+                text = "\n".join(line for line in text.splitlines() if args.find in line)
+            print(f"[{index}] {text}")
+
+def search_results(args):
+    global current_workspace
+    if current_workspace is None:
+        print("No workspace loaded.")
+        return
+    pattern = " ".join(args.pattern)
+    results = current_workspace.search(pattern, re.IGNORECASE if args.ignore_case else 0, args.limit)
+    for result in results:
+        print(f"{result['id']} {result['path']} {result['offset']}: {result['line']}")
+    print(f"{len(results)} matches.")
+
+def show_profile(args):
+    global current_workspace
+    if current_workspace is None:
+        print("No workspace loaded.")
+        return
+    ids = args.ids or None
+    try:
+        rows = current_workspace.get_profile(ids)
+    except KeyError as e:
+        print(f"Error: {e}")
+        return
+    header = ["name", "count", "wall ms", "self ms", "cpu ms", "child user ms", "child sys ms", "max rss KB", "bytes"]
+    table = [[
+        row["name"], str(row["count"]), f"{row['wall_ms']:.1f}", f"{row['self_ms']:.1f}", f"{row['cpu_ms']:.1f}",
+        f"{row['child_user_ms']:.1f}", f"{row['child_system_ms']:.1f}",
+        "-" if row["max_rss_kb"] is None else str(row["max_rss_kb"]), str(row["bytes"]),
+    ] for row in rows]
+    widths = [max(len(line[i]) for line in [header, *table]) for i in range(len(header))]
+    for line in [header, *table]:
+        print("  ".join(value.ljust(width) if i == 0 else value.rjust(width) for i, (value, width) in enumerate(zip(line, widths))))
+    if args.export:
+        count = current_workspace.export_trace(args.export, ids)
+        print(f"{count} spans written to {args.export}")
+
 def parse_command(command):
     if command.startswith("!"):
         cmd_args = command[1:].split()
@@ -136,25 +270,21 @@ def parse_command(command):
     return [os.path.basename(f) for f in glob.glob(os.path.join(directory, '*.json'))] """
 
 def get_files(directory):
-    return [os.path.basename(f) for f in glob.glob(os.path.join(directory, '*'))]
+    # SQLiteのWALファイルなどは除く
+    return [os.path.basename(f) for f in glob.glob(os.path.join(directory, '*')) if os.path.isfile(f) and not f.endswith(('-wal', '-shm'))]
 
 def get_module_list():
-    old_stdout = sys.stdout
-    sys.stdout = StringIO()
-    list_modules(None)
-    output = sys.stdout.getvalue()
-    sys.stdout = old_stdout
-    return output.splitlines()
+    return module_registry.names()
 
 def get_recipe_list():
-    old_stdout = sys.stdout
-    sys.stdout = StringIO()
-    list_recipes(None)
-    output = sys.stdout.getvalue()
-    sys.stdout = old_stdout
-    return output.splitlines()
+    return recipe_registry.names()
 
 def start_interactive(parser):
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.history import InMemoryHistory
+    from prompt_toolkit.completion import NestedCompleter
+    from prompt_toolkit.styles import Style
+    
     modules = get_module_list()
     recipes = get_recipe_list()
     workspaces = get_files('./workspace')
@@ -176,8 +306,13 @@ def start_interactive(parser):
         'info': {
             'module': {module: None for module in modules},
             'recipe': {recipe: None for recipe in recipes},
+            'cache': None,
         },
         'save': None,
+        'show': None,
+        'search': None,
+        'profile': None,
+        'warmup': None,
         'exit': None,
         'quit': None,
     })
@@ -208,7 +343,7 @@ def start_interactive(parser):
         except Exception as e:
             print(f"An error occurred: {e}")
 
-def main():
+def build_parser():
     parser = CustomArgumentParser(description="CLI for workspace management and execution.")
     subparsers = parser.add_subparsers()
 
@@ -234,6 +369,9 @@ def main():
     parser_recipe_info.add_argument('recipe_name', type=str, help='The name of the recipe')
     parser_recipe_info.set_defaults(func=recipe_info)
 
+    parser_cache_info = info_subparsers.add_parser('cache', help='Get module result cache statistics')
+    parser_cache_info.set_defaults(func=cache_info)
+
     parser_run = subparsers.add_parser('run', help='Run a specific entity')
     run_subparsers = parser_run.add_subparsers(dest='run_type')
 
@@ -244,13 +382,35 @@ def main():
 
     parser_run_recipe = run_subparsers.add_parser('recipe', help='Run a specific recipe')
     parser_run_recipe.add_argument('recipe_name', type=str, help='The name of the recipe')
-    parser_run_recipe.add_argument('args', nargs=argparse.REMAINDER, help='Arguments for the recipe')
+    parser_run_recipe.add_argument('args', nargs=argparse.REMAINDER, help='Arguments for the recipe (--batch <glob> [--jobs N] runs it for each matching file)')
     parser_run_recipe.set_defaults(func=run_recipe)
 
     parser_run_os_command = run_subparsers.add_parser('cmd', help='Run an OS command')
     parser_run_os_command.add_argument('args', nargs=argparse.REMAINDER, help='Arguments for the command')
     parser_run_os_command.set_defaults(func=run_os_command)
 
+    parser_show = subparsers.add_parser('show', help='Show a result page by page')
+    parser_show.add_argument('id', type=str, help='The module/recipe/cmd id')
+    parser_show.add_argument('--index', type=int, default=None, help='Show only output.N')
+    parser_show.add_argument('--page', type=int, default=0, help='The page of large outputs to show')
+    parser_show.add_argument('--page-size', type=int, default=100, help='Lines per page')
+    parser_show.add_argument('--find', type=str, default=None, help='Show only lines containing this text')
+    parser_show.set_defaults(func=show_result)
+
+    parser_search = subparsers.add_parser('search', help='Search all results in the workspace with a regex')
+    parser_search.add_argument('pattern', nargs='+', help='The regex to search for')
+    parser_search.add_argument('-i', '--ignore-case', action='store_true', help='Ignore case')
+    parser_search.add_argument('--limit', type=int, default=100, help='The maximum number of matches')
+    parser_search.set_defaults(func=search_results)
+
+    parser_profile = subparsers.add_parser('profile', help='Show where time was spent in module/recipe runs')
+    parser_profile.add_argument('ids', nargs='*', help='The module/recipe ids (default: all)')
+    parser_profile.add_argument('--export', type=str, default=None, help='Write the spans as a Chrome trace (chrome://tracing, Perfetto) JSON file')
+    parser_profile.set_defaults(func=show_profile)
+
+    parser_warmup = subparsers.add_parser('warmup', help='Prepare the environments of all modules in advance')
+    parser_warmup.set_defaults(func=warmup)
+
     parser_list = subparsers.add_parser('list', help='List specific entities')
     list_subparsers = parser_list.add_subparsers(dest='list_type')
 
@@ -259,7 +419,10 @@ def main():
 
     parser_list_recipes = list_subparsers.add_parser('recipe', help='List all recipes')
     parser_list_recipes.set_defaults(func=list_recipes)
+    return parser
 
+def main():
+    parser = build_parser()
     if len(sys.argv) == 1:
         start_interactive(parser)
     else:
@@ -1 +1 @@
-from .cli import *
\ No newline at end of file
+from .webui import *
\ No newline at end of file
@@ -0,0 +1 @@
+from .server import *
\ No newline at end of file
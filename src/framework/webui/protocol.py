@@ -0,0 +1,307 @@
+import os
+import json
+import base64
+import struct
+import asyncio
+import hashlib
+from urllib.parse import urlsplit, parse_qs, quote, unquote
+
+MAX_HEADER_LINES = 100
+MAX_BODY_SIZE = 1024 * 1024
+MAX_MESSAGE_SIZE = 1024 * 1024
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+STATUS_TEXT = {
+    101: "Switching Protocols",
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    415: "Unsupported Media Type",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        """
+        クライアントにエラーのレスポンス({"error": message})を返す
+
+        Args:
+            status (int): ステータスコード
+            message (str): エラーメッセージ
+        """
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    def __init__(self, method: str, target: str, version: str, headers: dict, body: bytes) -> None:
+        """
+        HTTPのリクエスト
+        headersのキーは小文字、queryは同じキーが複数あれば最初の値
+        """
+        url = urlsplit(target)
+        self.method = method
+        self.path = unquote(url.path)
+        self.query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    @property
+    def is_websocket(self) -> bool:
+        return "websocket" in self.headers.get("upgrade", "").lower()
+
+    def json(self) -> object:
+        if not self.body:
+            return {}
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            raise HTTPError(400, "Error: request body is not valid JSON.")
+
+
+async def read_request(reader: asyncio.StreamReader) -> Request:
+    """
+    1つのリクエストを読む
+
+    Returns:
+        Request: 接続が閉じられていればNone
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Error: malformed request line.")
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise HTTPError(400, "Error: too many headers.")
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, "Error: Content-Length is not an integer.")
+    if length < 0:
+        raise HTTPError(400, "Error: Content-Length is negative.")
+    if length > MAX_BODY_SIZE:
+        raise HTTPError(413, f"Error: request body is larger than {MAX_BODY_SIZE} bytes.")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method, target, version, headers, body)
+
+
+def encode_response(status: int, body: bytes = b"", content_type: str = "application/json", keep_alive: bool = True, headers: dict = None) -> bytes:
+    lines = [
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'Unknown')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        "Connection: " + ("keep-alive" if keep_alive else "close"),
+        "Cache-Control: no-store",
+    ]
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def json_response(obj: object, status: int = 200, keep_alive: bool = True) -> bytes:
+    return encode_response(status, json.dumps(obj, default=str).encode(), keep_alive=keep_alive)
+
+
+def get_accept_key(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool = False) -> bytes:
+    """
+    WebSocketのフレーム(FIN付き)を作る
+    サーバから送るフレームはマスクしないので、同じメッセージを全てのクライアントに使い回せる
+    """
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length | (0x80 if mask else 0))
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126 | (0x80 if mask else 0), length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127 | (0x80 if mask else 0), length)
+    if not mask:
+        return header + payload
+    key = os.urandom(4)
+    return header + key + apply_mask(payload, key)
+
+
+def encode_message(message: object) -> bytes:
+    return encode_frame(OP_TEXT, json.dumps(message, default=str).encode())
+
+
+def apply_mask(payload: bytes, key: bytes) -> bytes:
+    # 1バイトずつXORすると遅いので、ペイロード全体を1つの整数としてXORする
+    length = len(payload)
+    if length == 0:
+        return b""
+    repeated = (key * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(length, "big")
+
+
+class WebSocketClosed(Exception):
+    pass
+
+
+class WebSocket:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, client: bool = False) -> None:
+        """
+        ハンドシェイク済みのWebSocketの接続 (RFC 6455)
+
+        Args:
+            client (bool): クライアント側ならTrue (送るフレームをマスクする)
+        """
+        self.reader = reader
+        self.writer = writer
+        self.client = client
+        self.closed = False
+        self._write_lock = asyncio.Lock()
+
+    async def _read_frame(self) -> tuple:
+        first, second = await self.reader.readexactly(2)
+        opcode = first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length, = struct.unpack("!H", await self.reader.readexactly(2))
+        elif length == 127:
+            length, = struct.unpack("!Q", await self.reader.readexactly(8))
+        if length > MAX_MESSAGE_SIZE:
+            raise WebSocketClosed(f"Error: WebSocket frame is larger than {MAX_MESSAGE_SIZE} bytes.")
+        key = await self.reader.readexactly(4) if second & 0x80 else None
+        payload = await self.reader.readexactly(length)
+        if key is not None:
+            payload = apply_mask(payload, key)
+        return bool(first & 0x80), opcode, payload
+
+    async def receive(self) -> object:
+        """
+        次のメッセージを受け取る ping/pong/closeはここで処理する
+
+        Returns:
+            str | bytes: テキストならstr 閉じられたらNone
+        """
+        message = bytearray()
+        message_opcode = None
+        while True:
+            try:
+                fin, opcode, payload = await self._read_frame()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                self.closed = True
+                return None
+            if opcode == OP_PING:
+                await self.send_frame(encode_frame(OP_PONG, payload, self.client))
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode == OP_CLOSE:
+                if not self.closed:
+                    await self.close()
+                return None
+            if opcode != OP_CONTINUATION:
+                message_opcode = opcode
+            message += payload
+            if len(message) > MAX_MESSAGE_SIZE:
+                raise WebSocketClosed(f"Error: WebSocket message is larger than {MAX_MESSAGE_SIZE} bytes.")
+            if fin:
+                return message.decode(errors="replace") if message_opcode == OP_TEXT else bytes(message)
+
+    async def send_frame(self, frame: bytes) -> None:
+        async with self._write_lock:
+            self.writer.write(frame)
+            await self.writer.drain()
+
+    async def send(self, message: object) -> None:
+        """
+        messageをJSONのテキストメッセージとして送る
+        """
+        await self.send_frame(encode_frame(OP_TEXT, json.dumps(message, default=str).encode(), self.client))
+
+    async def close(self, code: int = 1000) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self.send_frame(encode_frame(OP_CLOSE, struct.pack("!H", code), self.client))
+        except ConnectionError:
+            pass
+
+
+async def accept_websocket(request: Request, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> WebSocket:
+    """
+    WebSocketのハンドシェイクに応答する
+    """
+    key = request.headers.get("sec-websocket-key")
+    if key is None:
+        raise HTTPError(400, "Error: Sec-WebSocket-Key is missing.")
+    writer.write(
+        "HTTP/1.1 101 Switching Protocols\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Accept: {get_accept_key(key)}\r\n\r\n".encode("latin-1")
+    )
+    await writer.drain()
+    return WebSocket(reader, writer)
+
+
+async def connect_websocket(host: str, port: int, path: str = "/ws", token: str = None) -> WebSocket:
+    """
+    WebSocketのクライアント (負荷試験用)
+
+    Args:
+        token (str): サーバのトークン (クエリで送る)
+    """
+    if token is not None:
+        path = f"{path}?token={quote(token)}"
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write(
+        f"GET {path} HTTP/1.1\r\n"
+        f"Host: {host}:{port}\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {key}\r\n"
+        "Sec-WebSocket-Version: 13\r\n\r\n".encode("latin-1")
+    )
+    await writer.drain()
+    status = await reader.readline()
+    if b" 101 " not in status:
+        writer.close()
+        raise ConnectionError(f"Error: WebSocket handshake failed ({status.decode(errors='replace').strip()}).")
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if headers.get("sec-websocket-accept") != get_accept_key(key):
+        writer.close()
+        raise ConnectionError("Error: WebSocket handshake failed (invalid Sec-WebSocket-Accept).")
+    return WebSocket(reader, writer, client=True)
@@ -0,0 +1,532 @@
+import os
+import re
+import hmac
+import json
+import codecs
+import asyncio
+import secrets
+
+from registry import module_registry, recipe_registry
+from .protocol import (
+    HTTPError, WebSocketClosed, read_request, encode_response, json_response,
+    encode_message, accept_websocket,
+)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+BACKLOG_SIZE = 64 * 1024       # 途中から購読したクライアントに送る、実行中のエントリの出力の末尾
+CLIENT_QUEUE_SIZE = 256        # クライアントごとの未送信メッセージ数 超えた分は捨てる
+IDLE_TIMEOUT = 60              # keep-aliveの接続で次のリクエストを待つ秒数
+PAGE_LINES = 100
+ENTRY_PATTERN = re.compile(r'^/api/entries/([^/]+)(?:/(result|cancel|trace))?$')
+TOKEN_HEADER = "x-pyctf-token"
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+WILDCARD_HOSTS = ("", "0.0.0.0", "::")
+
+
+class OutputChannel:
+    def __init__(self, kind: str) -> None:
+        """
+        実行中の1つのエントリのstdoutを購読しているクライアントに配る
+
+        Args:
+            kind (str): module / recipe
+        """
+        self.kind = kind
+        self.id = None
+        self.subscribers = set()
+        self.backlog = bytearray()
+        self._decoders = {}
+
+    def publish(self, step: str, chunk: bytes) -> None:
+        """
+        Module/Recipeのon_outputから呼ばれる (イベントループのスレッド)
+
+        Args:
+            step (str): レシピのinrecipe-name モジュールならNone
+            chunk (bytes): stdoutの断片
+        """
+        # UTF-8の文字がチャンクの境目で切れることがあるので、ステップごとに続きから復号する
+        decoder = self._decoders.get(step)
+        if decoder is None:
+            decoder = self._decoders[step] = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        text = decoder.decode(chunk)
+        if not text:
+            return
+        self.backlog += text.encode()
+        if len(self.backlog) > BACKLOG_SIZE:
+            del self.backlog[:len(self.backlog) - BACKLOG_SIZE]
+        if self.subscribers:
+            # フレームは1回だけ作り、全ての購読者に同じbytesを送る
+            frame = encode_message({"type": "output", "id": self.id, "step": step, "data": text})
+            for client in self.subscribers:
+                client.push(frame)
+
+
+class Client:
+    def __init__(self, websocket) -> None:
+        """
+        WebSocketで接続しているブラウザ1つ
+        送信はキューを通して専用のタスクで行い、遅いクライアントがジョブやほかのクライアントを止めないようにする
+        """
+        self.websocket = websocket
+        self.queue = asyncio.Queue(CLIENT_QUEUE_SIZE)
+        self.dropped = 0
+        self.subscriptions = set()
+
+    def push(self, frame: bytes) -> None:
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def send_loop(self) -> None:
+        while True:
+            frame = await self.queue.get()
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                await self.websocket.send({"type": "lagged", "dropped": dropped})
+            await self.websocket.send_frame(frame)
+
+
+class WebUIServer:
+    def __init__(self, workspace, host: str = "127.0.0.1", port: int = 8080, save_path: str = None, max_connections: int = 1024, token: str = None) -> None:
+        """
+        WorkSpaceを操作するHTTP + WebSocketのサーバ
+        1つのイベントループで全ての接続を扱い、ブロックする処理(結果の読み込み、検索、保存)はスレッドで行う
+
+        Args:
+            workspace (WorkSpace): 操作するワークスペース 複数のクライアントで共有する
+            save_path (str): POST /api/saveでパスを省略したときの保存先
+            max_connections (int): 同時に受け付ける接続数 超えたら503を返す
+            token (str): /api/と/wsに必要なトークン Noneなら起動ごとに生成する
+        """
+        self.workspace = workspace
+        self.host = host
+        self.port = port
+        self.token = token or secrets.token_urlsafe(32)
+        self.allowed_hosts = set()
+        self.save_path = save_path
+        self.max_connections = max_connections
+        self.connections = 0
+        self.channels = {}  # ID -> OutputChannel (実行中のもののみ)
+        self.clients = set()
+        self.tasks = set()  # 接続ごとのタスク (closeで止める)
+        self.server = None
+        self.routes = {
+            ("GET", "/"): self.index,
+            ("GET", "/api/modules"): self.list_modules,
+            ("GET", "/api/recipes"): self.list_recipes,
+            ("GET", "/api/entries"): self.list_entries,
+            ("POST", "/api/modules/run"): self.run_module,
+            ("POST", "/api/recipes/run"): self.run_recipe,
+            ("GET", "/api/search"): self.search,
+            ("GET", "/api/profile"): self.profile,
+            ("POST", "/api/save"): self.save,
+        }
+        with open(os.path.join(STATIC_DIR, "index.html"), "rb") as f:
+            self.index_html = f.read()
+        workspace.listeners.append(self.on_status)
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port, backlog=self.max_connections)
+        # port=0のときは実際に割り当てられたポートにする
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.allowed_hosts = get_allowed_hosts(self.host, self.port)
+
+    @property
+    def url(self) -> str:
+        """
+        ブラウザで開くURL (トークン付き)
+        """
+        host = f"[{self.host}]" if ":" in self.host else self.host
+        return f"http://{host}:{self.port}/?token={self.token}"
+
+    def authorize(self, request) -> None:
+        """
+        他のサイトのページからのリクエスト(CSRF、DNS rebinding)を拒否する
+        - Hostはこのサーバのもの、Originがあれば http://<Host> でなければならない
+        - /以外はトークンが必要 (ヘッダ、WebSocketはブラウザがヘッダを付けられないのでクエリ)
+        - POSTはContent-Type: application/jsonのみ (フォームなどCORSのプリフライトが無いリクエストを通さない)
+        """
+        host = request.headers.get("host", "").lower()
+        if self.allowed_hosts and host not in self.allowed_hosts:
+            raise HTTPError(403, f"Error: Host {host} is not allowed.")
+        origin = request.headers.get("origin")
+        if origin is not None and origin.lower() != f"http://{host}":
+            raise HTTPError(403, f"Error: Origin {origin} is not allowed.")
+        if request.path == "/":
+            return
+        token = request.headers.get(TOKEN_HEADER)
+        if token is None and request.is_websocket:
+            token = request.query.get("token")
+        if token is None or not hmac.compare_digest(token.encode(), self.token.encode()):
+            raise HTTPError(403, "Error: token is invalid.")
+        content_type = request.headers.get("content-type", "").partition(";")[0].strip().lower()
+        if request.method == "POST" and content_type != "application/json":
+            raise HTTPError(415, "Error: Content-Type must be application/json.")
+
+    async def serve_forever(self) -> None:
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self) -> None:
+        if self.workspace is not None and self.on_status in self.workspace.listeners:
+            self.workspace.listeners.remove(self.on_status)
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for client in list(self.clients):
+            await client.websocket.close(1001)
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            if self.connections > self.max_connections:
+                writer.write(json_response({"error": "Error: too many connections."}, 503, keep_alive=False))
+                await writer.drain()
+                return
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), IDLE_TIMEOUT)
+                    if request is None:
+                        return
+                    self.authorize(request)
+                    websocket = None
+                    if request.is_websocket and request.path == "/ws":
+                        websocket = await accept_websocket(request, reader, writer)
+                except HTTPError as e:
+                    writer.write(json_response({"error": e.message}, e.status, keep_alive=False))
+                    await writer.drain()
+                    return
+                if websocket is not None:
+                    await self.handle_websocket(websocket)
+                    return
+                writer.write(await self.dispatch(request))
+                await writer.drain()
+                if not request.keep_alive:
+                    return
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.connections -= 1
+            self.tasks.discard(task)
+            writer.close()
+
+    async def dispatch(self, request) -> bytes:
+        try:
+            handler = self.routes.get((request.method, request.path))
+            if handler is not None:
+                return await handler(request)
+            match = ENTRY_PATTERN.match(request.path)
+            if match is None:
+                raise HTTPError(404, f"Error: {request.path} is not found.")
+            id, action = match.groups()
+            handler = {
+                ("GET", None): self.get_entry,
+                ("GET", "result"): self.get_result,
+                ("GET", "trace"): self.get_trace,
+                ("POST", "cancel"): self.cancel,
+            }.get((request.method, action))
+            if handler is None:
+                raise HTTPError(405, f"Error: {request.method} is not allowed for {request.path}.")
+            return await handler(request, id)
+        except HTTPError as e:
+            return json_response({"error": e.message}, e.status, request.keep_alive)
+        except Exception as e:
+            return json_response({"error": f"Error: {e}"}, 500, request.keep_alive)
+
+    async def index(self, request) -> bytes:
+        return encode_response(200, self.index_html, "text/html; charset=utf-8", request.keep_alive)
+
+    async def list_modules(self, request) -> bytes:
+        return json_response({"modules": module_registry.names()}, keep_alive=request.keep_alive)
+
+    async def list_recipes(self, request) -> bytes:
+        return json_response({"recipes": recipe_registry.names()}, keep_alive=request.keep_alive)
+
+    async def list_entries(self, request) -> bytes:
+        return json_response({"entries": self.workspace.get_entries()}, keep_alive=request.keep_alive)
+
+    async def run_module(self, request) -> bytes:
+        return await self._run(request, "module", module_registry, self.workspace.run_module_async)
+
+    async def run_recipe(self, request) -> bytes:
+        return await self._run(request, "recipe", recipe_registry, self.workspace.run_recipe_async)
+
+    async def _run(self, request, kind: str, registry, run) -> bytes:
+        """
+        モジュール/レシピを非同期で開始し、終わるのを待たずにIDを返す
+        """
+        body = request.json()
+        name = body.get("name")
+        args = body.get("args", [])
+        if not isinstance(name, str) or name not in registry.names():
+            raise HTTPError(404, f"Error: {kind} {name} is not found.")
+        if not isinstance(args, list) or not all(isinstance(arg, str) for arg in args):
+            raise HTTPError(400, "Error: args must be a list of strings.")
+        channel = OutputChannel(kind)
+        if kind == "module":
+            on_output = lambda chunk: channel.publish(None, chunk)
+        else:
+            on_output = channel.publish
+        try:
+            # 引数はシェルのコマンドに埋め込まれるので、1つずつクォートする
+            id = await run(name, args, timeout=body.get("timeout"), on_output=on_output, quote_input=True)
+        except (KeyError, ValueError) as e:
+            raise HTTPError(400, str(e).strip("'\""))
+        # ジョブのタスクはまだ動いていないので、出力が来る前に登録できる
+        channel.id = id
+        self.channels[id] = channel
+        self.broadcast({"type": "status", "id": id, "kind": kind, "name": name, "status": "pending"})
+        return json_response({"id": id}, 202, request.keep_alive)
+
+    def on_status(self, kind: str, id: str, state: dict) -> None:
+        """
+        WorkSpaceのエントリの状態が変わったときに呼ばれる
+        """
+        message = {"type": "status", "id": id, "kind": kind, "name": state.get("name"), "status": state.get("status")}
+        if state.get("error") is not None:
+            message["error"] = state["error"]
+        self.broadcast(message)
+        if not state.get("running"):
+            channel = self.channels.pop(id, None)
+            if channel is not None:
+                for client in channel.subscribers:
+                    client.subscriptions.discard(id)
+
+    def broadcast(self, message: dict) -> None:
+        frame = encode_message(message)
+        for client in self.clients:
+            client.push(frame)
+
+    def _get_state(self, id: str) -> tuple:
+        with self.workspace.lock:
+            for kind, states in (("module", self.workspace.module_state), ("recipe", self.workspace.recipe_state), ("cmd", self.workspace.cmd_state)):
+                if id in states:
+                    return kind, states[id]
+        raise HTTPError(404, f"Error: {id} is not found.")
+
+    async def get_entry(self, request, id: str) -> bytes:
+        kind, state = self._get_state(id)
+        entry = {
+            "id": id,
+            "kind": kind,
+            "name": state.get("name"),
+            "args": state.get("args") if kind != "cmd" else state.get("cmd"),
+            "status": state.get("status", "done"),
+            "error": state.get("error"),
+        }
+        if not state.get("running") and entry["status"] == "done":
+            result = await asyncio.to_thread(self.workspace.get_result, id)
+            items = result if isinstance(result, list) else [result]
+            entry["items"] = [describe_item(item) for item in items]
+        return json_response(entry, keep_alive=request.keep_alive)
+
+    async def get_result(self, request, id: str) -> bytes:
+        """
+        結果の1つの要素(output.N)を行単位のページで返す
+        大きな結果はBlobViewのままページの部分だけを読む
+        """
+        kind, state = self._get_state(id)
+        if state.get("running"):
+            raise HTTPError(409, f"Error: {id} is running.")
+        try:
+            index = int(request.query.get("index", 0))
+            page = int(request.query.get("page", 0))
+            page_size = min(int(request.query.get("page_size", PAGE_LINES)), 10000)
+        except ValueError:
+            raise HTTPError(400, "Error: index, page and page_size must be integers.")
+        find = request.query.get("find")
+        page_json = await asyncio.to_thread(self._read_page, id, index, page, page_size, find)
+        return json_response(page_json, keep_alive=request.keep_alive)
+
+    def _read_page(self, id: str, index: int, page: int, page_size: int, find: str) -> dict:
+        from blob import BlobView
+        try:
+            result = self.workspace.get_result(id)
+        except RuntimeError as e:
+            raise HTTPError(409, str(e))
+        items = result if isinstance(result, list) else [result]
+        if not 0 <= index < len(items):
+            raise HTTPError(404, f"Error: output.{index} of {id} is not found.")
+        item = items[index]
+        if isinstance(item, BlobView):
+            if find:
+                lines = []
+                for match in item.search(re.escape(find.encode())):
+                    if len(lines) >= page_size:
+                        break
+                    lines.append(item.line_at(match.start()))
+            else:
+                lines = item.page(page, page_size)
+        else:
+            text = item if isinstance(item, str) else json.dumps(item, ensure_ascii=False, indent=1, default=str)
+            lines = text.splitlines()
+            if find:
+                lines = [line for line in lines if find in line]
+            lines = lines[page * page_size:(page + 1) * page_size]
+        return {"id": id, "index": index, "page": page, "page_size": page_size, "lines": lines, "more": len(lines) == page_size}
+
+    async def get_trace(self, request, id: str) -> bytes:
+        try:
+            spans = await asyncio.to_thread(self.workspace.get_trace, id)
+        except KeyError:
+            raise HTTPError(404, f"Error: {id} is not found.")
+        return json_response({"id": id, "spans": spans}, keep_alive=request.keep_alive)
+
+    async def cancel(self, request, id: str) -> bytes:
+        try:
+            cancelled = self.workspace.cancel_job(id)
+        except KeyError:
+            raise HTTPError(404, f"Error: {id} is not a running job.")
+        return json_response({"id": id, "cancelled": cancelled}, keep_alive=request.keep_alive)
+
+    async def search(self, request) -> bytes:
+        pattern = request.query.get("q")
+        if not pattern:
+            raise HTTPError(400, "Error: q is required.")
+        flags = re.IGNORECASE if request.query.get("i") else 0
+        try:
+            limit = int(request.query.get("limit", 100))
+            results = await asyncio.to_thread(self.workspace.search, pattern, flags, limit)
+        except (re.error, ValueError) as e:
+            raise HTTPError(400, f"Error: {e}")
+        return json_response({"results": results}, keep_alive=request.keep_alive)
+
+    async def profile(self, request) -> bytes:
+        ids = request.query.get("ids")
+        try:
+            rows = await asyncio.to_thread(self.workspace.get_profile, ids.split(",") if ids else None)
+        except KeyError as e:
+            raise HTTPError(404, str(e).strip("'\""))
+        return json_response({"profile": rows}, keep_alive=request.keep_alive)
+
+    async def save(self, request) -> bytes:
+        from workspace.manager import WORKSPACE_DIR, save_workspace
+        path = request.json().get("path") or self.save_path
+        if not isinstance(path, str) or not path:
+            raise HTTPError(400, "Error: path is required.")
+        # WORKSPACE_DIRの外(../や絶対パス、シンボリックリンクの先)には書かせない
+        root = os.path.realpath(WORKSPACE_DIR)
+        target = os.path.realpath(os.path.join(root, path))
+        if target == root or os.path.commonpath([root, target]) != root:
+            raise HTTPError(400, f"Error: {path} is outside the workspace directory.")
+        # 他のクライアントの書き込みとはWorkSpace.lockで排他される
+        count = await asyncio.to_thread(save_workspace, self.workspace, path)
+        return json_response({"path": path, "entries": count}, keep_alive=request.keep_alive)
+
+    async def handle_websocket(self, websocket) -> None:
+        """
+        購読したエントリの出力と、全てのエントリの状態の変化を送る
+        クライアントからは {"subscribe": id} / {"unsubscribe": id} を受け取る
+        """
+        client = Client(websocket)
+        self.clients.add(client)
+        sender = asyncio.ensure_future(client.send_loop())
+        try:
+            while (message := await websocket.receive()) is not None:
+                try:
+                    message = json.loads(message)
+                except ValueError:
+                    await websocket.send({"type": "error", "error": "Error: message is not valid JSON."})
+                    continue
+                if not isinstance(message, dict):
+                    continue
+                if "subscribe" in message:
+                    self.subscribe(client, message["subscribe"])
+                elif "unsubscribe" in message:
+                    self.unsubscribe(client, message["unsubscribe"])
+                elif "ping" in message:
+                    client.push(encode_message({"type": "pong", "ping": message["ping"]}))
+        except (WebSocketClosed, ConnectionError):
+            pass
+        finally:
+            self.clients.discard(client)
+            for id in list(client.subscriptions):
+                self.unsubscribe(client, id)
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
+            await websocket.close()
+
+    def subscribe(self, client: Client, id: str) -> None:
+        channel = self.channels.get(id)
+        if channel is None:
+            # 既に終わっていれば状態だけ返す (結果は/api/entries/<id>/resultで読む)
+            try:
+                status = self.workspace.get_job_status(id)
+            except KeyError:
+                status = "unknown"
+            client.push(encode_message({"type": "status", "id": id, "status": status}))
+            return
+        if channel.backlog:
+            client.push(encode_message({"type": "output", "id": id, "step": None, "data": channel.backlog.decode(errors="replace"), "backlog": True}))
+        channel.subscribers.add(client)
+        client.subscriptions.add(id)
+
+    def unsubscribe(self, client: Client, id: str) -> None:
+        channel = self.channels.get(id)
+        if channel is not None:
+            channel.subscribers.discard(client)
+        client.subscriptions.discard(id)
+
+
+def describe_item(item) -> dict:
+    """
+    結果の要素の種類と大きさ (中身はページ単位で取得する)
+    """
+    from blob import BlobView
+    if isinstance(item, BlobView):
+        return {"type": "blob", "size": len(item)}
+    if isinstance(item, str):
+        return {"type": "text", "size": len(item)}
+    return {"type": type(item).__name__}
+
+
+def get_allowed_hosts(host: str, port: int) -> set:
+    """
+    Hostヘッダとして受け付ける値 (小文字)
+    全てのアドレスで待ち受ける場合は名前が分からないので空(確認しない)にする
+    """
+    if host in WILDCARD_HOSTS:
+        return set()
+    hosts = set(LOOPBACK_HOSTS) if host in LOOPBACK_HOSTS else {host}
+    return {(f"[{name}]" if ":" in name else name).lower() + f":{port}" for name in hosts}
+
+
+def start_web_ui(workspace=None, host: str = "127.0.0.1", port: int = 8080, save_path: str = None) -> None:
+    """
+    Web UIを起動してCtrl+Cまで動かす
+
+    Args:
+        workspace (WorkSpace): 操作するワークスペース Noneならsave_pathから読み込む(無ければ新しく作る)
+        save_path (str): ワークスペースのパス
+    """
+    from workspace.manager import WORKSPACE_DIR, create_workspace, load_workspace
+    if workspace is None:
+        if save_path and os.path.exists(os.path.join(WORKSPACE_DIR, save_path)):
+            workspace = load_workspace(save_path)
+        else:
+            workspace = create_workspace(save_path or "web")
+
+    async def main():
+        server = WebUIServer(workspace, host, port, save_path)
+        await server.start()
+        print(f"Web UI: {server.url}")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        workspace.close()
@@ -1,15 +1,16 @@
-import utils
-import framework
-
 import argparse
-import pygments.lexers.asm
-from rich.console import Console
-from rich.panel import Panel
-from rich.table import Table
-from rich.syntax import Syntax
 
-if __name__ == "__main__":
+def print_help(parser):
+    # richとpygmentsはヘルプを表示するときだけ読み込む
+    import pygments.lexers.asm
+    from rich.console import Console
+    from rich.panel import Panel
+    from rich.syntax import Syntax
+    
     console = Console()
+    console.print(Panel(Syntax(parser.format_help(), lexer=pygments.lexers.asm.CObjdumpLexer()), title="help", expand=False))
+
+if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     # どのくらい起動時の引数指定できたらいいと思う？
     parser.add_argument(
@@ -23,15 +24,39 @@ if __name__ == "__main__":
         action="store_true",
         help="use web ui instead of command line"
     )
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="web ui listen address"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8080,
+        help="web ui listen port"
+    )
+    parser.add_argument(
+        "--workspace",
+        type=str,
+        default=None,
+        help="workspace to open in the web ui (loaded if it exists, saved there)"
+    )
     parser.add_argument(
         "--debug", "-d",
         action="store_true",
         help="debug mode"
     )
     args = parser.parse_args()
+    
+    if args.web_ui:
+        import framework
+        framework.start_web_ui(host=args.host, port=args.port, save_path=args.workspace)
+        exit(0)
     print(parser.format_help())
 
-    console.print(Panel(Syntax(parser.format_help(), lexer=pygments.lexers.asm.CObjdumpLexer()), title="help", expand=False))
+    print_help(parser)
     exit(0)
     
-    framework.cli.start_interactive()
\ No newline at end of file
+    import cli
+    cli.start_interactive(cli.build_parser())
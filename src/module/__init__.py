@@ -1 +1,5 @@
 from .module import *
+from .cache import *
+from .output import *
+from .environment import *
+from .limits import *
@@ -0,0 +1,152 @@
+import os
+import json
+import mmap
+import base64
+import threading
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from blob import BlobView, blob_store
+
+_loaded = {}  # .pyの絶対パス -> (mtime_ns, 読み込んだpythonモジュール)
+_lock = threading.Lock()
+_executors = {}
+
+
+def load_entrypoint(entrypoint: str):
+    """
+    "path/to/file.py:name" 形式のentrypointが指すクラス/関数を取得する
+    読み込んだファイルはプロセス内でキャッシュし、更新されたときだけ読み直す
+
+    Args:
+        entrypoint (str): cwdからの相対パスと属性名を:で区切ったもの
+
+    Returns:
+        object: クラスまたは関数
+    """
+    path, _, name = entrypoint.rpartition(":")
+    if not path or not name:
+        raise ValueError(f"invalid entrypoint: {entrypoint}")
+    path = os.path.abspath(path)
+    mtime_ns = os.stat(path).st_mtime_ns
+
+    with _lock:
+        cached = _loaded.get(path)
+        if cached is None or cached[0] != mtime_ns:
+            module_name = "builtin_" + os.path.splitext(os.path.basename(path))[0]
+            spec = importlib.util.spec_from_file_location(module_name, path)
+            python_module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(python_module)
+            cached = (mtime_ns, python_module)
+            _loaded[path] = cached
+    return getattr(cached[1], name)
+
+
+def call_entrypoint(entrypoint: str, method: str, args: list, load_inputs: list = None) -> object:
+    """
+    built-inモジュールを実行する
+    method = class ならインスタンスを作ってrunメソッドを、function ならその関数を入力を引数にして呼ぶ
+
+    Args:
+        load_inputs (list): [start, stop] この範囲の入力をload_dataで読み込んでbytesで渡す (stopがNoneなら最後まで)
+
+    Returns:
+        object: 結果 blob_store.thresholdを超えるbytesはBlobViewにしてある
+    """
+    target = load_entrypoint(entrypoint)
+    if load_inputs is not None:
+        args = load_arguments(args, *load_inputs)
+    if method == "class":
+        return store_large_bytes(target().run(*args))
+    elif method == "function":
+        return store_large_bytes(target(*args))
+    raise ValueError(f"unknown method: {method}")
+
+
+def get_executor(kind: str):
+    """
+    Args:
+        kind (str): thread / process
+
+    Returns:
+        Executor: プロセス内で共有するプール
+    """
+    with _lock:
+        if kind not in _executors:
+            if kind == "thread":
+                _executors[kind] = ThreadPoolExecutor()
+            elif kind == "process":
+                _executors[kind] = ProcessPoolExecutor()
+            else:
+                raise ValueError(f"unknown executor: {kind}")
+        return _executors[kind]
+
+
+def run_builtin(entrypoint: str, method: str, args: list, load_inputs: list = None, executor: str = "inline") -> object:
+    """
+    built-inモジュールをexecutorで指定された場所で実行して結果を返す
+
+    Args:
+        executor (str): inline(呼び出したスレッドで実行) / thread / process
+    """
+    if executor == "inline":
+        return call_entrypoint(entrypoint, method, args, load_inputs)
+    return get_executor(executor).submit(call_entrypoint, entrypoint, method, args, load_inputs).result()
+
+
+def load_arguments(args: list, start: int, stop: int = None) -> list:
+    """
+    args[start:stop]をload_dataで読み込む 引数がリスト(前のステップの結果など)ならその要素を1つずつ読み込む
+    """
+    args = list(args)
+    for index in range(start, len(args) if stop is None else min(stop, len(args))):
+        arg = args[index]
+        args[index] = [load_data(item) for item in arg] if isinstance(arg, list) else load_data(arg)
+    return args
+
+
+def store_large_bytes(result):
+    """
+    結果に含まれるblob_store.thresholdを超えるbytesをblobにする
+    モジュールは一時ファイルを作らずにbytesを返せばよく、大きな結果はワークスペースのblobとして残る
+    """
+    if isinstance(result, (bytes, bytearray)):
+        return blob_store.put_bytes(bytes(result)) if len(result) > blob_store.threshold else result
+    if isinstance(result, dict):
+        return {key: store_large_bytes(value) for key, value in result.items()}
+    if isinstance(result, list):
+        return [store_large_bytes(value) for value in result]
+    return result
+
+
+def load_data(spec):
+    """
+    built-inモジュールの入力を読み込む (モジュールのjsonのexecution.load-inputsで指定した引数)
+    既存のファイルのパスならmmapし、"hex:", "b64:" で始まればデコードし、それ以外は文字列そのもの(UTF-8)にする
+
+    Args:
+        spec (str | bytes): 入力
+
+    Returns:
+        bytes | mmap.mmap: 読み込んだデータ
+    """
+    if isinstance(spec, (bytes, bytearray, memoryview, mmap.mmap)):
+        return spec
+    if isinstance(spec, BlobView):
+        # 前のステップの大きな結果はblobのファイルをmmapする
+        spec = spec.path
+    elif isinstance(spec, (dict, list)):
+        return json.dumps(spec, default=str).encode()
+    elif not isinstance(spec, str):
+        spec = str(spec)
+    if spec.startswith("hex:"):
+        return bytes.fromhex(spec[4:])
+    if spec.startswith("b64:"):
+        return base64.b64decode(spec[4:])
+    if os.path.isfile(spec):
+        with open(spec, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            # mmapはファイルを閉じても使える
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return spec.encode()
@@ -0,0 +1,170 @@
+import os
+import json
+import shlex
+import shutil
+import hashlib
+import tempfile
+import threading
+
+from .output import OutputBuffer, SPILL_THRESHOLD
+
+CACHE_DIR = ".cache/results"
+
+# コマンドがファイルへ書き込むかどうかの判定に使う
+SIDE_EFFECT_TOKENS = ("tee",)
+# シェルが展開するので、どのファイルを読むかがキーから分からない
+GLOB_CHARACTERS = set("*?[")
+
+
+class ResultCache:
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = 1 << 30) -> None:
+        """
+        モジュールの実行結果(stdout)のキャッシュ
+        キーはモジュール定義のハッシュ、展開済みのコマンド、引数に含まれるファイルの中身のハッシュから作る
+        max_bytesを超えたら最後に使われたのが古いものから消す
+
+        Args:
+            directory (str): キャッシュを置くディレクトリ
+            max_bytes (int): キャッシュ全体の最大サイズ
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._size = None
+        self._file_digests = {}  # (path, inode, mtime_ns, size) -> sha256
+
+    def make_key(self, module_digest: str, command: str) -> str:
+        """
+        キャッシュキーを作る
+        以下のコマンドはキャッシュできないのでNoneを返す
+        - ファイルに書き込む (リダイレクトやtee)
+        - ディレクトリやglobを引数に取る (中のファイルが変わってもキーが変わらない)
+        それ以外の副作用(ファイルの抽出やGUIなど)があるモジュールはjsonで"cache": falseにする
+
+        Args:
+            module_digest (str): モジュール定義のハッシュ
+            command (str): テンプレートを展開したコマンド
+
+        Returns:
+            str: キャッシュキー
+        """
+        try:
+            lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+            lexer.whitespace_split = True
+            tokens = list(lexer)
+        except ValueError:
+            return None
+
+        files = {}
+        for token in tokens:
+            if ">" in token or token in SIDE_EFFECT_TOKENS:
+                return None
+            if GLOB_CHARACTERS.intersection(token) or os.path.isdir(token):
+                return None
+            if token not in files and os.path.isfile(token):
+                files[token] = self._file_digest(token)
+
+        key = json.dumps([module_digest, command, os.getcwd(), files])
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key: str, threshold: int = SPILL_THRESHOLD) -> OutputBuffer:
+        path = os.path.join(self.directory, key)
+        try:
+            output = OutputBuffer.from_file(path, threshold)
+            # LRUのためにmtimeを最終利用時刻として使う
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return output
+
+    def put(self, key: str, output: OutputBuffer) -> None:
+        if output.size > self.max_bytes:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, 'wb') as f:
+            if output.spilled:
+                # 一時ファイルに書き出された出力はハードリンクで済ませる
+                try:
+                    os.remove(temp_path)
+                    os.link(output.path, temp_path)
+                except OSError:
+                    shutil.copyfile(output.path, temp_path)
+            else:
+                f.write(output.getvalue())
+        path = os.path.join(self.directory, key)
+        with self._lock:
+            self._ensure_size()
+            if os.path.exists(path):
+                self._size -= os.path.getsize(path)
+            os.replace(temp_path, path)
+            self._size += output.size
+            self.stores += 1
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._ensure_size()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            for entry in self._entries():
+                os.remove(entry.path)
+            self._size = 0
+
+    def _entries(self) -> list:
+        if not os.path.isdir(self.directory):
+            return []
+        with os.scandir(self.directory) as it:
+            return [entry for entry in it if entry.is_file() and not entry.name.startswith(".tmp-")]
+
+    def _ensure_size(self) -> None:
+        if self._size is None:
+            self._size = sum(entry.stat().st_size for entry in self._entries())
+
+    def _evict(self) -> None:
+        # 最大サイズの9割まで古いものから消す
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime_ns)
+        for entry in entries:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            self._size -= size
+            self.evictions += 1
+
+    def _file_digest(self, path: str) -> str:
+        st = os.stat(path)
+        stat_key = (os.path.abspath(path), st.st_ino, st.st_mtime_ns, st.st_size)
+        if stat_key in self._file_digests:
+            return self._file_digests[stat_key]
+
+        hash_obj = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                hash_obj.update(chunk)
+        self._file_digests[stat_key] = hash_obj.hexdigest()
+        return self._file_digests[stat_key]
+
+
+result_cache = ResultCache()
@@ -0,0 +1,127 @@
+import os
+import sys
+import fcntl
+import shutil
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+ENV_DIR = ".cache/venvs"
+READY_FILE = ".ready"
+
+
+class VenvManager:
+    def __init__(self, directory: str = ENV_DIR) -> None:
+        """
+        environment.type = venv のモジュールが使うvenvの管理
+        venvはrequirements.txtの中身とPythonのバージョンのハッシュごとに一度だけ作り、以降は使い回す
+
+        Args:
+            directory (str): venvを置くディレクトリ
+        """
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._ready = {}  # requirements.txtのパス -> (mtime_ns, size, venvのパス)
+
+    @staticmethod
+    def get_requirements_path(module_name: str) -> str:
+        return os.path.join("modules", module_name, "requirements.txt")
+
+    def get_key(self, requirements_path: str) -> str:
+        with open(requirements_path, 'rb') as f:
+            requirements = f.read()
+        hash_obj = hashlib.sha256()
+        hash_obj.update(sys.version.encode())
+        hash_obj.update(b"\0")
+        hash_obj.update(requirements)
+        return hash_obj.hexdigest()[:32]
+
+    def ensure(self, module_name: str) -> str:
+        """
+        モジュールのvenvを用意する(既にあれば何もしない)
+
+        Args:
+            module_name (str): モジュール名
+
+        Returns:
+            str: venvのパス
+        """
+        requirements_path = self.get_requirements_path(module_name)
+        try:
+            st = os.stat(requirements_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"requirements.txt is not found: {requirements_path}")
+
+        cached = self._ready.get(requirements_path)
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size) and os.path.isfile(os.path.join(cached[2], READY_FILE)):
+            return cached[2]
+
+        venv_path = os.path.join(self.directory, self.get_key(requirements_path))
+        with self._get_key_lock(venv_path):
+            if not os.path.isfile(os.path.join(venv_path, READY_FILE)):
+                os.makedirs(self.directory, exist_ok=True)
+                # 別プロセスのジョブと同時に作らないようにファイルロックを取る
+                with open(venv_path + ".lock", 'w') as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    if not os.path.isfile(os.path.join(venv_path, READY_FILE)):
+                        self._build(venv_path, requirements_path)
+
+        self._ready[requirements_path] = (st.st_mtime_ns, st.st_size, venv_path)
+        return venv_path
+
+    def get_environment(self, venv_path: str) -> dict:
+        """
+        activateの代わりに、venvのbinをPATHの先頭に置いた環境変数を返す
+        """
+        env = os.environ.copy()
+        env.pop("PYTHONHOME", None)
+        env["VIRTUAL_ENV"] = os.path.abspath(venv_path)
+        env["PATH"] = os.path.join(env["VIRTUAL_ENV"], "bin") + os.pathsep + env.get("PATH", "")
+        return env
+
+    def get_python(self, venv_path: str) -> str:
+        return os.path.join(os.path.abspath(venv_path), "bin", "python")
+
+    def warmup(self, module_names: list, max_workers: int = None) -> dict:
+        """
+        複数のモジュールのvenvを並列に用意する
+
+        Returns:
+            dict: モジュール名 -> venvのパス または 発生した例外
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {name: executor.submit(self.ensure, name) for name in module_names}
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    results[name] = e
+        return results
+
+    def _get_key_lock(self, venv_path: str) -> threading.Lock:
+        with self._lock:
+            if venv_path not in self._key_locks:
+                self._key_locks[venv_path] = threading.Lock()
+            return self._key_locks[venv_path]
+
+    def _build(self, venv_path: str, requirements_path: str) -> None:
+        # 途中で失敗したvenvが残っていれば作り直す
+        if os.path.isdir(venv_path):
+            shutil.rmtree(venv_path)
+        subprocess.run([sys.executable, "-m", "venv", venv_path], check=True, stdout=subprocess.DEVNULL)
+        install = subprocess.run(
+            [self.get_python(venv_path), "-m", "pip", "install", "-q", "-r", requirements_path],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        if install.returncode != 0:
+            shutil.rmtree(venv_path, ignore_errors=True)
+            raise RuntimeError(f"pip install -r {requirements_path} failed: {install.stderr.decode(errors='replace')[-1000:]}")
+        with open(os.path.join(venv_path, READY_FILE), 'w') as f:
+            f.write(requirements_path)
+
+
+venv_manager = VenvManager()
@@ -0,0 +1,307 @@
+"""
+Pythonスクリプトのモジュールを、重い依存を読み込み済みのプロセスからforkして実行するためのサーバ
+
+サーバはモジュールが使うPython(venvならvenvのpython)で
+    python forkserver.py <ソケットのパス> <事前にimportするモジュール>...
+として起動される。サーバ側は標準ライブラリしか使わないこと。
+"""
+import io
+import os
+import sys
+import json
+import runpy
+import shutil
+import signal
+import resource
+import socket
+import struct
+import atexit
+import tempfile
+import selectors
+import threading
+import subprocess
+import traceback
+
+HEADER = struct.Struct("!I")
+
+
+# ---- サーバ側 ----
+
+def serve(socket_path: str, preload: list) -> None:
+    # このファイルのディレクトリ(src/module)がimportの対象にならないようにする
+    del sys.path[0]
+    for name in preload:
+        try:
+            __import__(name)
+        except ImportError as e:
+            print(f"forkserver: failed to preload {name}: {e}", file=sys.stderr)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(128)
+
+    # SIGCHLDをselectで待てるようにする
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    selector.register(wakeup_r, selectors.EVENT_READ)
+    children = {}  # pid -> クライアントとの接続
+
+    sys.stdout.write("ready\n")
+    sys.stdout.flush()
+
+    while True:
+        for key, _ in selector.select():
+            if key.fileobj is listener:
+                conn, _ = listener.accept()
+                try:
+                    request, fds = _recv_request(conn)
+                except (OSError, ValueError):
+                    conn.close()
+                    continue
+                pid = _fork_worker(request, fds, listener, conn)
+                for fd in fds:
+                    os.close(fd)
+                children[pid] = conn
+                _send_line(conn, {"pid": pid})
+            else:
+                os.read(wakeup_r, 4096)
+                _reap(children)
+
+
+def _recv_request(conn: socket.socket) -> tuple:
+    header, fds, _, _ = socket.recv_fds(conn, HEADER.size, 2)
+    header += _recv_exact(conn, HEADER.size - len(header))
+    (length,) = HEADER.unpack(header)
+    return json.loads(_recv_exact(conn, length)), fds
+
+
+def _recv_exact(conn: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ValueError("connection closed")
+        data += chunk
+    return data
+
+
+def _fork_worker(request: dict, fds: list, listener: socket.socket, conn: socket.socket) -> int:
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid != 0:
+        return pid
+
+    # ---- ここから子プロセス ----
+    code = 1
+    try:
+        listener.close()
+        conn.close()
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        os.setsid()
+        _set_rlimits(request.get("rlimits", {}))
+
+        stdin_fd, stdout_fd = fds
+        os.dup2(stdin_fd, 0)
+        os.dup2(stdout_fd, 1)
+        os.close(stdin_fd)
+        os.close(stdout_fd)
+        sys.stdin = io.TextIOWrapper(io.FileIO(0, "r", closefd=False))
+        sys.stdout = io.TextIOWrapper(io.FileIO(1, "w", closefd=False), line_buffering=False)
+
+        os.chdir(request["cwd"])
+        script = request["argv"][0]
+        sys.argv = list(request["argv"])
+        # serveでsys.path[0]は消してあるので、上書きせずに先頭に追加する (python script.pyと同じになる)
+        sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+        try:
+            runpy.run_path(script, run_name="__main__")
+            code = 0
+        except SystemExit as e:
+            if e.code is None:
+                code = 0
+            elif isinstance(e.code, int):
+                code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def _set_rlimits(rlimits: dict) -> None:
+    # limits.clamp_rlimitsと同じく今のhardより緩くはしない (サーバは標準ライブラリしか使えないので複製している)
+    for name, (soft, hard) in rlimits.items():
+        kind = getattr(resource, name)
+        current = resource.getrlimit(kind)[1]
+        if current != resource.RLIM_INFINITY:
+            hard = min(hard, current)
+        resource.setrlimit(kind, (min(soft, hard), hard))
+
+
+def _reap(children: dict) -> None:
+    while True:
+        try:
+            pid, status, rusage = os.wait4(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        conn = children.pop(pid, None)
+        if conn is not None:
+            try:
+                _send_line(conn, {
+                    "exit": os.waitstatus_to_exitcode(status),
+                    "rusage": {"max_rss_kb": rusage.ru_maxrss, "user_seconds": rusage.ru_utime, "system_seconds": rusage.ru_stime},
+                })
+            except OSError:
+                pass
+            conn.close()
+
+
+def _send_line(conn: socket.socket, message: dict) -> None:
+    conn.sendall(json.dumps(message).encode() + b"\n")
+
+
+# ---- クライアント側 ----
+
+class ForkedProcess:
+    def __init__(self, conn: socket.socket) -> None:
+        """
+        ForkServerがforkしたプロセス
+        Popenと同じくpid, returncode, wait, killを持つ
+        rusageは終了後のワーカのリソース使用量(tracing.rusage_to_jsonと同じ形) 分からなければNone
+        """
+        self._conn = conn
+        self._reader = conn.makefile("rb")
+        self.pid = json.loads(self._reader.readline())["pid"]
+        self.returncode = None
+        self.rusage = None
+
+    def wait(self) -> int:
+        if self.returncode is None:
+            line = self._reader.readline()
+            message = json.loads(line) if line else {"exit": -signal.SIGKILL}
+            self.returncode = message["exit"]
+            self.rusage = message.get("rusage")
+            self._reader.close()
+            self._conn.close()
+        return self.returncode
+
+    def kill(self) -> None:
+        try:
+            os.killpg(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+class ForkServer:
+    def __init__(self, python: str, preload: list, env: dict = None) -> None:
+        """
+        Args:
+            python (str): サーバを動かすPythonのパス(venvならvenvのpython)
+            preload (list): 事前にimportしておくモジュール名
+            env (dict): サーバ(とforkされるワーカ)の環境変数
+        """
+        self.python = python
+        self.preload = list(preload)
+        self.env = env
+        self._directory = tempfile.mkdtemp(prefix="pyctf-forkserver-")
+        self.socket_path = os.path.join(self._directory, "socket")
+        self._process = subprocess.Popen(
+            [python, os.path.abspath(__file__), self.socket_path, *self.preload],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            env=env,
+            start_new_session=True,
+        )
+        if self._process.stdout.readline() != b"ready\n":
+            self.close()
+            raise RuntimeError(f"forkserver for {python} failed to start")
+
+    def alive(self) -> bool:
+        return self._process.poll() is None
+
+    def spawn(self, argv: list, cwd: str, stdout_fd: int, stdin_fd: int = None, rlimits: dict = None) -> ForkedProcess:
+        """
+        argv[0]のスクリプトをforkしたワーカで実行する
+
+        Args:
+            argv (list): sys.argvにするリスト(argv[0]がスクリプトのパス)
+            cwd (str): ワーカのカレントディレクトリ
+            stdout_fd (int): ワーカのstdoutにするfd
+            stdin_fd (int): ワーカのstdinにするfd Noneなら/dev/null
+            rlimits (dict): ワーカでsetrlimitする resourceの定数名 -> (soft, hard)
+
+        Returns:
+            ForkedProcess: 起動したワーカ
+        """
+        devnull = None
+        if stdin_fd is None:
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            stdin_fd = devnull
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(self.socket_path)
+            body = json.dumps({"argv": argv, "cwd": cwd, "rlimits": rlimits or {}}).encode()
+            socket.send_fds(conn, [HEADER.pack(len(body))], [stdin_fd, stdout_fd])
+            conn.sendall(body)
+            return ForkedProcess(conn)
+        except BaseException:
+            conn.close()
+            raise
+        finally:
+            if devnull is not None:
+                os.close(devnull)
+
+    def close(self) -> None:
+        if self._process.poll() is None:
+            try:
+                os.killpg(self._process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+            self._process.wait()
+        self._process.stdout.close()
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+
+_servers = {}
+_lock = threading.Lock()
+
+
+def get_server(python: str, preload: list, env: dict = None) -> ForkServer:
+    """
+    (python, preload, venv)ごとに一つだけForkServerを起動して使い回す
+    """
+    key = (python, tuple(preload), (env or {}).get("VIRTUAL_ENV"))
+    with _lock:
+        server = _servers.get(key)
+        if server is None or not server.alive():
+            server = ForkServer(python, preload, env)
+            _servers[key] = server
+        return server
+
+
+@atexit.register
+def shutdown() -> None:
+    with _lock:
+        for server in _servers.values():
+            server.close()
+        _servers.clear()
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1], sys.argv[2:])
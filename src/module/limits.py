@@ -0,0 +1,137 @@
+import re
+import resource
+from dataclasses import dataclass, fields, replace
+
+SIZE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$', re.IGNORECASE)
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(value) -> int:
+    """
+    バイト数を表す値(4096, "512M", "2GiB" など)をintにする
+
+    Args:
+        value (int | str): バイト数 または単位付きの文字列
+
+    Returns:
+        int: バイト数 valueがNoneならNone
+    """
+    if value is None or isinstance(value, int):
+        return value
+    match = SIZE_PATTERN.match(str(value))
+    if match is None:
+        raise ValueError(f"Error: {value} is not a valid size.")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+class ResourceLimitExceeded(RuntimeError):
+    def __init__(self, module_name: str, limit: str, value) -> None:
+        """
+        モジュールがlimitsの上限を超えたためkillされた
+
+        Args:
+            module_name (str): モジュール名
+            limit (str): 超えた上限の名前(timeout/cpu/output)
+            value: その上限の値
+        """
+        super().__init__(f"Error: {module_name} exceeded its {limit} limit ({value}).")
+        self.module_name = module_name
+        self.limit = limit
+        self.value = value
+
+
+@dataclass(frozen=True)
+class ResourceLimits:
+    """
+    モジュールのjsonの"limits"
+    timeout: 実時間の秒数 超えたらプロセスグループごとkillする
+    cpu: CPU時間の秒数 (RLIMIT_CPU)
+    memory: アドレス空間のバイト数 (RLIMIT_AS) 超えた分の確保はツール側で失敗する
+    output: stdoutのバイト数 超えたらkillする (stdoutを直接パイプでつないだ場合は数えられない)
+    Noneは無制限
+    """
+    timeout: float = None
+    cpu: int = None
+    memory: int = None
+    output: int = None
+
+    @classmethod
+    def from_json(cls, limits: dict) -> "ResourceLimits":
+        if not limits:
+            return cls()
+        return cls(
+            timeout=limits.get("timeout"),
+            cpu=limits.get("cpu"),
+            memory=parse_size(limits.get("memory")),
+            output=parse_size(limits.get("output")),
+        )
+
+    def to_json(self) -> dict:
+        return {field.name: getattr(self, field.name) for field in fields(self) if getattr(self, field.name) is not None}
+
+    def cap(self, other: "ResourceLimits") -> "ResourceLimits":
+        """
+        otherの上限より緩いものを切り詰める (WorkSpace全体の上限をモジュールに適用する)
+        """
+        if other is None:
+            return self
+        values = {}
+        for field in fields(self):
+            mine, theirs = getattr(self, field.name), getattr(other, field.name)
+            values[field.name] = theirs if mine is None else mine if theirs is None else min(mine, theirs)
+        return replace(self, **values)
+
+    def get_rlimits(self) -> dict:
+        """
+        Returns:
+            dict: resourceの定数名 -> (soft, hard) 子プロセスでsetrlimitする
+        """
+        rlimits = {}
+        if self.cpu is not None:
+            # softを超えるとSIGXCPU、hardを超えるとSIGKILLが届く
+            cpu = max(1, int(self.cpu))
+            rlimits["RLIMIT_CPU"] = (cpu, cpu + 1)
+        if self.memory is not None:
+            rlimits["RLIMIT_AS"] = (self.memory, self.memory)
+        return rlimits
+
+    def get_ulimit_command(self) -> str:
+        """
+        /bin/bash -c で実行するコマンドの前に付けるulimit
+        preexec_fnはスレッドから呼ばれるとforkした子がexecの前にデッドロックし得るので、シェル自身に上限を設定させる
+
+        Returns:
+            str: "ulimit -S -t 10 && ulimit -H -t 11 || exit 1; " のような文字列 rlimitが無ければ""
+        """
+        commands = []
+        for name, (soft, hard) in clamp_rlimits(self.get_rlimits()).items():
+            option, unit = ULIMIT_OPTIONS[name]
+            # softを先に下げれば、hardを下げるときに soft <= hard が保たれる
+            commands.append(f"ulimit -S {option} {soft // unit}")
+            commands.append(f"ulimit -H {option} {hard // unit}")
+        if not commands:
+            return ""
+        return " && ".join(commands) + " || exit 1; "
+
+
+# resourceの定数名 -> (ulimitのオプション, ulimitの単位)
+ULIMIT_OPTIONS = {
+    "RLIMIT_CPU": ("-t", 1),
+    "RLIMIT_AS": ("-v", 1024),
+}
+
+
+def clamp_rlimits(rlimits: dict) -> dict:
+    """
+    今のhardより緩くはできないので、既に厳しい上限があればそちらに合わせる
+
+    Returns:
+        dict: resourceの定数名 -> (soft, hard)
+    """
+    clamped = {}
+    for name, (soft, hard) in rlimits.items():
+        current = resource.getrlimit(getattr(resource, name))[1]
+        if current != resource.RLIM_INFINITY:
+            hard = min(hard, current)
+        clamped[name] = (min(soft, hard), hard)
+    return clamped
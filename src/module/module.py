@@ -4,124 +4,480 @@ import sys
 import re
 import subprocess
 import json
-import jsonschema
+import shlex
+import shutil
+import signal
+import asyncio
+import threading
 import utils
+import tracing
+from registry import module_registry
+from blob import blob_store
+from .cache import result_cache
+from .output import OutputBuffer, SPILL_THRESHOLD, CHUNK_SIZE
+from .environment import venv_manager
+from .limits import ResourceLimits, ResourceLimitExceeded
+from . import builtin
+from . import forkserver
+
+# これらを含むコマンドはbashで実行する必要がある
+SHELL_CHARACTERS = set("|&;<>()$`*?[]{}~")
+
+def kill_process_group(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
 
 class Module:
-    def __init__(self, module_name, states) -> None:
+    # stdoutのうちメモリに持つ最大バイト数 超えた分は一時ファイルへ書き出す
+    output_threshold = SPILL_THRESHOLD
+    
+    def __init__(self, module_name, states, limits: ResourceLimits = None, quote_input: bool = False) -> None:
         """
         Args:
             module_name (_type_): 起動するモジュール名(NOTファイル名)
+            limits (ResourceLimits): モジュールのjsonのlimitsより緩い場合に切り詰める上限(WorkSpace全体の上限)
+            quote_input (bool): Trueなら引数を1つずつクォートしてコマンドに埋め込む (Web UIから実行する場合)
         """
         
-        self.module_json = None
-        self.module_list = self.get_module_list()
         self.module_name = module_name
-        if self.module_name in self.module_list:
-            self.module_path = self.module_list[module_name]
-        else:
-            raise KeyError(f"Error: {module_name} is not found.")
+        with tracing.span("module.init", module=module_name):
+            entry = module_registry.get_entry(module_name)
+        self.module_path = entry.file
+        self.module_digest = entry.digest
+        # レジストリと共有しているので書き換えないこと
+        self.module_json = entry.definition
+        self.command_templates = entry.templates['execution']['command']
         
         self.states = states
         self.variables = {}
+        self.process = None
+        # 実行した子プロセスのリソース使用量(tracing.rusage_to_jsonの形) 分からなければNone
+        self.rusage = None
+        self.cached = False
+        self.limits = ResourceLimits.from_json(self.module_json.get("limits")).cap(limits)
+        self.quote_input = quote_input
+        # 上限を超えてkillした場合、その上限の名前
+        self.exceeded = None
         
-        with open(os.path.join("modules/json", self.module_path), 'r') as f:
-            self.module_json = json.load(f)
         if self.module_json['prepare-module-directory']:
             self.variables["module_dir"] = utils.get_temp_folder()
             
         self.variables["cwd"] = os.getcwd()
         
-    def run(self, args: list) -> None:
-        # モジュール内変数の準備
-        self.variables["input"] = []
-        for arg_count, arg  in enumerate(args):
-            template_arg = utils.replace_template_nostr(self.states, arg)
-            if not template_arg is None:
-                arg = template_arg
-            self.variables["input"].append(arg)
+    def run(self, args: list, on_output=None, stdin: int = None, stdout: int = None, capture: bool = True) -> None:
+        """
+        Args:
+            args (list): モジュールの引数
+            on_output (callable): stdoutを読むたびにそのチャンク(bytes)を引数に呼ばれる
+            stdin (int): プロセスのstdinにするfd Noneなら/dev/null (externalのみ)
+            stdout (int): プロセスのstdoutにするfd 指定した場合はstdoutを読まない (externalのみ)
+            capture (bool): Falseならstdoutを読んでもOutputBufferに溜めない (on_outputには渡す)
+        """
+        with tracing.span("module.run", module=self.module_name, type=self.module_json["type"]) as span:
+            try:
+                self._run(args, on_output, stdin, stdout, capture)
+            finally:
+                span.set(**self.get_run_info())
+    
+    def _run(self, args: list, on_output, stdin: int, stdout: int, capture: bool) -> None:
+        self.prepare_input(args)
         
         if self.module_json["type"] == "built-in":
-            if self.module_json["method"] == "class":
-                #todo 何かしらの.pyを読み込んでインスタンスを作成しrunメソッドを実行する
-                pass
-                
-                
-            elif self.module_json["method"] == "function":
-                #todo 何かしらの.pyを読み込んで指定された関数を実行する
-                pass
+            # entrypointの.pyをこのプロセスに読み込み、クラスのrunメソッドまたは関数を直接呼ぶ
+            self.result = builtin.run_builtin(*self.get_builtin_call(), executor=self.module_json['execution'].get("executor", "inline"))
             
         elif self.module_json["type"] == "external":
+            # 他のステップとパイプでつながっている場合は、同じ引数でも結果が同じとは限らない
+            cache_key = self.get_cache_key() if stdin is None and stdout is None else None
+            if self.load_cache(cache_key):
+                return
             execution_command = self.get_execution_command()
-            
-            if "environment" in self.module_json['execution'] and self.module_json['execution']["environment"]["type"] == "venv":
-                venv_path = os.path.join("modules", self.module_name, "venv")
-                requirements_path = os.path.join("modules", self.module_name, "requirements.txt")
-                if not os.path.isdir(venv_path) and os.path.isfile(requirements_path):
-                    subprocess.run(["python3", "-m", "venv", venv_path])
-                elif not os.path.isfile(requirements_path):
-                    raise("requirements.txt is not found")
-                activate_script = os.path.join(venv_path, 'bin', 'activate')
-                subprocess.run(f"source {activate_script} && pip install -r {requirements_path} > /dev/null 2>&1", shell=True, executable="/bin/bash")
-                execution_command = f"source {activate_script} && {execution_command}"
-            self.shell = subprocess.run(execution_command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, shell=True, executable="/bin/bash")
+            env = self.get_environment()
+            argv = self.get_forkserver_argv()
+            output = OutputBuffer(self.output_threshold)
+            with tracing.span("module.spawn", forkserver=argv is not None):
+                if argv is not None:
+                    self.process, reader = self.spawn_forked(argv, env, stdin, stdout)
+                else:
+                    self.process = subprocess.Popen(
+                        self.limits.get_ulimit_command() + execution_command,
+                        stdin=stdin if stdin is not None else subprocess.DEVNULL,
+                        stdout=stdout if stdout is not None else subprocess.PIPE,
+                        shell=True,
+                        executable="/bin/bash",
+                        env=env,
+                        start_new_session=True,
+                    )
+                    reader = self.process.stdout
+            watchdog = None
+            if self.limits.timeout is not None:
+                watchdog = threading.Timer(self.limits.timeout, self.kill_for, ("timeout",))
+                watchdog.daemon = True
+                watchdog.start()
+            try:
+                # プロセスが終わるまでの時間(ツール自体の実行時間)
+                with tracing.span("module.process", pid=self.process.pid) as span:
+                    if reader is not None:
+                        with reader:
+                            received = 0
+                            for chunk in iter(lambda: reader.read1(CHUNK_SIZE), b""):
+                                chunk, received = self.limit_output(chunk, received)
+                                if capture:
+                                    output.write(chunk)
+                                if on_output is not None:
+                                    on_output(chunk)
+                                if self.exceeded is not None:
+                                    break
+                    self.wait_process()
+                    span.set(bytes=output.size, returncode=self.process.returncode, rusage=self.rusage)
+            finally:
+                if watchdog is not None:
+                    watchdog.cancel()
+                output.close()
+            self.shell = subprocess.CompletedProcess(execution_command, self.process.returncode, output, None)
+            self.check_limits()
+            self.store_cache(cache_key)
 
         return
+    
+    def wait_process(self) -> int:
+        """
+        runで起動したプロセスの終了を待ち、そのリソース使用量をself.rusageに入れる
         
-    async def run_async(self, args) -> None:
-        pass
+        Returns:
+            int: 終了コード
+        """
+        if isinstance(self.process, subprocess.Popen) and self.process.returncode is None:
+            # Popen.waitはrusageを返さないので自分でwait4する
+            try:
+                _, status, rusage = os.wait4(self.process.pid, 0)
+            except ChildProcessError:
+                return self.process.wait()
+            self.process.returncode = os.waitstatus_to_exitcode(status)
+            self.rusage = tracing.rusage_to_json(rusage)
+            return self.process.returncode
+        self.process.wait()
+        self.rusage = getattr(self.process, "rusage", None)
+        return self.process.returncode
     
-    def get_result(self):
-        stdout, stderr = self.shell.stdout, self.shell.stderr
-        # print(stdout, stderr)
-        self.variables["output"] = []
-        try:
-            json_output = json.loads(stdout.decode())
-            self.variables["output"] = json_output
-        except json.JSONDecodeError:
-            # print("stdout is not in valid JSON format")
-            self.variables["output"].append(stdout.decode())
-            # print(stdout.decode())
+    def get_run_info(self) -> dict:
+        """
+        Returns:
+            dict: module.runのスパンに付ける情報(終了コード、出力のバイト数、子プロセスのrusage、キャッシュを使ったか)
+        """
+        if self.module_json["type"] != "external" or not hasattr(self, "shell"):
+            return {}
+        return {
+            "returncode": self.shell.returncode,
+            "bytes": self.shell.stdout.size,
+            "rusage": self.rusage,
+            "cached": self.cached,
+        }
+    
+    def kill(self) -> None:
+        """
+        runで起動したプロセスをプロセスグループごとkillする
+        """
+        if self.process is not None:
+            kill_process_group(self.process.pid)
+    
+    def kill_for(self, limit: str) -> None:
+        """
+        上限を超えたプロセスをkillする 終わった後にcheck_limitsがResourceLimitExceededを投げる
+        """
+        if self.exceeded is None:
+            self.exceeded = limit
+        self.kill()
+    
+    def limit_output(self, chunk: bytes, received: int) -> tuple:
+        """
+        stdoutのチャンクをlimits.outputまでに切り詰め、超えた場合はプロセスをkillする
+        
+        Returns:
+            tuple: (切り詰めたチャンク, これまでに受け取ったバイト数)
+        """
+        limit = self.limits.output
+        if limit is not None and received + len(chunk) > limit:
+            chunk = chunk[:max(0, limit - received)]
+            self.kill_for("output")
+        return chunk, received + len(chunk)
+    
+    def check_limits(self) -> None:
+        """
+        上限を超えてkillされた場合はResourceLimitExceededを投げる
+        """
+        limit = self.exceeded
+        # RLIMIT_CPUを超えたプロセスにはSIGXCPUが届く (bashを経由した場合は128+シグナル番号で終わる)
+        if limit is None and self.limits.cpu is not None and self.shell.returncode in (-signal.SIGXCPU, 128 + signal.SIGXCPU):
+            limit = "cpu"
+        if limit is not None:
+            raise ResourceLimitExceeded(self.module_name, limit, getattr(self.limits, limit))
+        
+    async def run_async(self, args, on_output=None) -> None:
+        """
+        runの非同期版
+        キャンセルされた場合は起動したプロセスグループごとkillする
+        """
+        with tracing.span("module.run", module=self.module_name, type=self.module_json["type"]) as span:
+            try:
+                await self._run_async(args, on_output)
+            finally:
+                span.set(**self.get_run_info())
+    
+    async def _run_async(self, args, on_output) -> None:
+        self.prepare_input(args)
+        
+        if self.module_json["type"] == "built-in":
+            executor = self.module_json['execution'].get("executor", "inline")
+            # inlineでもイベントループを止めないようにスレッドで実行する
+            self.result = await asyncio.get_running_loop().run_in_executor(
+                builtin.get_executor("process" if executor == "process" else "thread"),
+                builtin.call_entrypoint, *self.get_builtin_call(),
+            )
+        
+        elif self.module_json["type"] == "external":
+            cache_key = await asyncio.to_thread(self.get_cache_key)
+            if self.load_cache(cache_key):
+                return
+            execution_command = self.get_execution_command()
+            # venvの準備はブロックするのでスレッドで行う
+            env = await asyncio.to_thread(self.get_environment)
+            argv = self.get_forkserver_argv()
+            transport = None
+            with tracing.span("module.spawn", forkserver=argv is not None):
+                if argv is not None:
+                    process, stdout = await asyncio.to_thread(self.spawn_forked, argv, env)
+                    reader = asyncio.StreamReader()
+                    transport, _ = await asyncio.get_running_loop().connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), stdout)
+                    wait = lambda: asyncio.to_thread(process.wait)
+                else:
+                    process = await asyncio.create_subprocess_exec(
+                        "/bin/bash", "-c", self.limits.get_ulimit_command() + execution_command,
+                        stdin=subprocess.DEVNULL,
+                        stdout=subprocess.PIPE,
+                        start_new_session=True,
+                        env=env,
+                    )
+                    reader = process.stdout
+                    wait = process.wait
+            self.process = process
+            output = OutputBuffer(self.output_threshold)
             
+            async def communicate():
+                try:
+                    received = 0
+                    while chunk := await reader.read(CHUNK_SIZE):
+                        chunk, received = self.limit_output(chunk, received)
+                        output.write(chunk)
+                        if on_output is not None:
+                            on_output(chunk)
+                        if self.exceeded is not None:
+                            break
+                    await wait()
+                except asyncio.CancelledError:
+                    self.kill()
+                    await wait()
+                    raise
+            
+            try:
+                with tracing.span("module.process", pid=process.pid) as span:
+                    try:
+                        await asyncio.wait_for(communicate(), self.limits.timeout)
+                    except asyncio.TimeoutError:
+                        # communicateはキャンセルされたときにプロセスをkillして終了を待っている
+                        self.exceeded = self.exceeded or "timeout"
+                    # asyncioのサブプロセスはイベントループが回収するのでrusageは分からない (forkserverのワーカのみ)
+                    self.rusage = getattr(process, "rusage", None)
+                    span.set(bytes=output.size, returncode=process.returncode, rusage=self.rusage)
+            finally:
+                output.close()
+                if transport is not None:
+                    transport.close()
+            self.shell = subprocess.CompletedProcess(execution_command, process.returncode, output, None)
+            self.check_limits()
+            self.store_cache(cache_key)
+        
+        return
+    
+    def prepare_input(self, args: list) -> None:
+        # モジュール内変数の準備
+        self.variables["input"] = []
+        for arg_count, arg  in enumerate(args):
+            # レシピの前のステップの結果がそのまま渡される場合もある
+            template_arg = utils.replace_template_nostr(self.states, arg) if isinstance(arg, str) else None
+            if not template_arg is None:
+                arg = template_arg
+            self.variables["input"].append(arg)
+    
+    def get_cache_key(self) -> str:
+        """
+        Returns:
+            str: 結果キャッシュのキー キャッシュしない場合はNone
+        """
+        # ネットワークを使うモジュールなどはjsonで"cache": falseにしておく
+        if not self.module_json.get("cache", True) or self.module_json['prepare-module-directory']:
+            return None
+        # 引数のファイルのハッシュを計算するので、大きなファイルでは時間がかかる
+        with tracing.span("module.cache_key"):
+            return result_cache.make_key(self.module_digest, self.get_execution_command())
+    
+    def load_cache(self, cache_key: str) -> bool:
+        if cache_key is None:
+            return False
+        output = result_cache.get(cache_key, self.output_threshold)
+        if output is None:
+            return False
+        self.shell = subprocess.CompletedProcess(self.get_execution_command(), 0, output, None)
+        self.cached = True
+        return True
+    
+    def store_cache(self, cache_key: str) -> None:
+        # 失敗した実行はキャッシュしない
+        if cache_key is not None and self.shell.returncode == 0:
+            result_cache.put(cache_key, self.shell.stdout)
+    
+    def get_environment(self) -> dict:
+        """
+        venvを使うモジュールの場合はvenvを用意し、そのvenvを使う環境変数を返す
+        それ以外はNone(そのままの環境変数)
+        """
+        if not self.uses_venv():
+            return None
+        with tracing.span("module.environment", module=self.module_name):
+            venv_path = venv_manager.ensure(self.module_name)
+            return venv_manager.get_environment(venv_path)
+    
+    def get_forkserver_argv(self) -> list:
+        """
+        execution.preloadが指定されたPythonスクリプトのモジュールで、
+        コマンドがシェルの機能を使っていなければ、forkserverで実行するためのargvを返す
+        そうでなければNone
+        """
+        if "preload" not in self.module_json['execution']:
+            return None
+        command = " ".join(template.render(self.variables, self.quote_input) for template in self.command_templates)
+        try:
+            lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+            lexer.whitespace_split = True
+            argv = list(lexer)
+        except ValueError:
+            return None
+        if any(SHELL_CHARACTERS.intersection(token) for token in argv):
+            return None
+        if len(argv) < 2 or os.path.basename(argv[0]) not in ("python", "python3") or not argv[1].endswith(".py"):
+            return None
+        return argv
+    
+    def spawn_forked(self, argv: list, env: dict, stdin: int = None, stdout: int = None) -> tuple:
+        """
+        重い依存をimport済みのforkserverからforkしたプロセスでスクリプトを実行する
+        
+        Args:
+            stdin (int): ワーカのstdinにするfd Noneなら/dev/null
+            stdout (int): ワーカのstdoutにするfd Noneならパイプを作る
+        
+        Returns:
+            tuple: (ForkedProcess, stdoutを読むファイル stdoutを指定した場合はNone)
+        """
+        python = shutil.which(argv[0], path=(env or os.environ).get("PATH"))
+        if python is None:
+            raise FileNotFoundError(f"{argv[0]} is not found")
+        server = forkserver.get_server(python, self.module_json['execution']['preload'], env)
+        rlimits = self.limits.get_rlimits()
+        if stdout is not None:
+            return server.spawn(argv[1:], os.getcwd(), stdout, stdin, rlimits), None
+        read_fd, write_fd = os.pipe()
+        try:
+            process = server.spawn(argv[1:], os.getcwd(), write_fd, stdin, rlimits)
+        except BaseException:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        return process, open(read_fd, 'rb')
+    
+    def uses_venv(self) -> bool:
+        return "environment" in self.module_json['execution'] and self.module_json['execution']["environment"]["type"] == "venv"
+    
+    def get_builtin_call(self) -> tuple:
+        if "entrypoint" not in self.module_json['execution']:
+            raise KeyError(f"{self.module_name} has no entrypoint.")
+        execution = self.module_json['execution']
+        return execution['entrypoint'], self.module_json["method"], self.variables["input"], execution.get("load-inputs")
+    
+    def get_result(self):
+        with tracing.span("module.get_result", module=self.module_name) as span:
+            output = self._get_result()
+            if self.module_json["type"] == "external":
+                span.set(bytes=self.shell.stdout.size)
+            return output
+    
+    def _get_result(self):
+        if self.module_json["type"] == "built-in":
+            # built-inはjsonを経由せずPythonのオブジェクトをそのまま返す
+            if isinstance(self.result, (list, dict)):
+                self.variables["output"] = self.result
+            else:
+                self.variables["output"] = [self.result]
+            return self.variables["output"]
+        
+        stdout = self.shell.stdout
+        if stdout.discarded:
+            # 一時ファイルは下でJSONかblobにした後に消してある
+            return self.variables["output"]
+        if stdout.size <= blob_store.threshold:
+            self.variables["output"] = stdout.parse()
+            return self.variables["output"]
+        
+        # JSONでない大きな出力はblobにして、読み込まずにBlobViewとして返す
+        parsed = False
+        if stdout.looks_like_json():
+            try:
+                self.variables["output"] = stdout.load_json()
+                parsed = True
+            except ValueError:
+                pass
+        if not parsed:
+            self.variables["output"] = [blob_store.put_output(stdout)]
+        # 結果はもう一時ファイルを参照しない (blobとキャッシュはハードリンクを持つ)
+        stdout.discard()
         return self.variables["output"]
     
         
     def get_execution_command(self):
-        execution_command = "stdbuf -i0 -o0 -e0 "
-        for command in self.module_json['execution']['command']:
-            command = utils.replace_template(self.variables, command)
-            execution_command = execution_command + " " + command
-        return execution_command
+        with tracing.span("module.render"):
+            execution_command = "stdbuf -i0 -o0 -e0 "
+            for template in self.command_templates:
+                command = template.render(self.variables, self.quote_input)
+                execution_command = execution_command + " " + command
+            return execution_command
         
     @staticmethod
-    def get_module_list() -> list:
-        module_list = {}
-        for file in os.listdir('modules/json'):
-            if file.endswith('.json'):
-                if file == 'schema.json':
-                    continue
-                with open(os.path.join('modules/json', file), 'r') as f:
-                    try:
-                        module_json = json.load(f)
-                        jsonschema.validate(module_json, json.load(open('modules/json/schema.json')))
-                        module_list[module_json["name"]] = file
-                    except json.JSONDecodeError:
-                        print(f'{file} is invalid json')
-                    except jsonschema.exceptions.ValidationError as e:
-                        print(f'{file} is invalid json schema')
-        return module_list
+    def get_module_list() -> dict:
+        return module_registry.files()
     
     @staticmethod
-    def get_module_info(module_name: str) -> str:
-        module_list = Module.get_module_list()
-        if not module_name in module_list:
-            raise KeyError(f"{module_name} is not found.")
+    def warmup_environments(max_workers: int = None) -> dict:
+        """
+        venvを使う全てのモジュールの環境を並列に用意しておく
         
-        with open(os.path.join("modules/json", module_list[module_name]), 'r') as f:
-            module_json = json.load(f)
+        Returns:
+            dict: モジュール名 -> venvのパス または 発生した例外
+        """
+        module_names = []
+        for module_name in module_registry.names():
+            execution = module_registry.get(module_name)['execution']
+            if "environment" in execution and execution["environment"]["type"] == "venv":
+                module_names.append(module_name)
+        return venv_manager.warmup(module_names, max_workers=max_workers)
+    
+    @staticmethod
+    def get_module_info(module_name: str) -> str:
+        module_json = module_registry.get(module_name)
         
         if not "description" in module_json:
             raise KeyError(f"{module_name} has no description.")
         
         return module_json["description"]
-        
@@ -0,0 +1,247 @@
+import os
+import json
+import codecs
+import shutil
+import weakref
+import tempfile
+
+# これを超えた出力は一時ファイルへ書き出す
+SPILL_THRESHOLD = 8 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# JSONの先頭になり得る文字
+JSON_START_BYTES = b'{["-0123456789tfn'
+
+
+class OutputBuffer:
+    def __init__(self, threshold: int = SPILL_THRESHOLD) -> None:
+        """
+        モジュールのstdoutを受け取るバッファ
+        thresholdまではメモリに持ち、超えたら一時ファイルへ書き出す
+
+        Args:
+            threshold (int): メモリに持つ最大バイト数
+        """
+        self.threshold = threshold
+        self.size = 0
+        self.path = None
+        self._memory = bytearray()
+        self._file = None
+        self._first_byte = None
+        # 一時ファイルを持つバッファが破棄されたら(またはdiscardで)そのファイルを消す
+        self._finalizer = None
+
+    @classmethod
+    def from_bytes(cls, data: bytes, threshold: int = SPILL_THRESHOLD) -> "OutputBuffer":
+        buffer = cls(threshold)
+        buffer.write(data)
+        buffer.close()
+        return buffer
+
+    @classmethod
+    def from_file(cls, path: str, threshold: int = SPILL_THRESHOLD) -> "OutputBuffer":
+        """
+        既存のファイルの中身を持つバッファを作る
+        大きいファイルはハードリンク(できなければコピー)して元のファイルが消えても読めるようにする
+        """
+        buffer = cls(threshold)
+        if os.path.getsize(path) <= threshold:
+            with open(path, 'rb') as f:
+                buffer.write(f.read())
+        else:
+            buffer._spill()
+            os.remove(buffer.path)
+            try:
+                os.link(path, buffer.path)
+            except OSError:
+                shutil.copyfile(path, buffer.path)
+            buffer.size = os.path.getsize(buffer.path)
+            with open(buffer.path, 'rb') as f:
+                buffer._update_first_byte(f.read(CHUNK_SIZE))
+        buffer.close()
+        return buffer
+
+    @property
+    def spilled(self) -> bool:
+        return self.path is not None
+
+    @property
+    def discarded(self) -> bool:
+        return self._finalizer is not None and not self._finalizer.alive
+
+    def write(self, chunk: bytes) -> None:
+        self._update_first_byte(chunk)
+        self.size += len(chunk)
+        if self._file is None and self.path is None and self.size > self.threshold:
+            self._spill()
+            self._file = open(self.path, 'wb')
+            self._file.write(self._memory)
+            self._memory = bytearray()
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._memory += chunk
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self) -> None:
+        """
+        一時ファイルを消す (キャッシュやblobはハードリンクなので残る) これ以降は中身を読めない
+        """
+        self.close()
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def getvalue(self) -> bytes:
+        if not self.spilled:
+            return bytes(self._memory)
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def iter_chunks(self, size: int = CHUNK_SIZE):
+        if not self.spilled:
+            view = memoryview(self._memory)
+            for start in range(0, len(view), size):
+                yield bytes(view[start:start + size])
+            return
+        with open(self.path, 'rb') as f:
+            for chunk in iter(lambda: f.read(size), b""):
+                yield chunk
+
+    def iter_lines(self):
+        if not self.spilled:
+            yield from bytes(self._memory).splitlines(keepends=True)
+            return
+        with open(self.path, 'rb') as f:
+            yield from f
+
+    def text(self) -> str:
+        return self.getvalue().decode()
+
+    def looks_like_json(self) -> bool:
+        return self._first_byte is not None and self._first_byte in JSON_START_BYTES
+
+    def parse(self) -> object:
+        """
+        出力をモジュールのoutputに変換する
+        JSONとして読めればその値、読めなければ[出力]を返す
+        一時ファイルに書き出された出力はJSONでなければ読み込まずにバッファのまま返す
+        """
+        if self.looks_like_json():
+            try:
+                return self.load_json()
+            except ValueError:
+                pass
+        if not self.spilled:
+            return [self.text()]
+        return [self]
+
+    def load_json(self) -> object:
+        """
+        出力をJSONとして読み込む 改行で区切られた複数のオブジェクトか配列(JSON Lines)ならそのリストにする
+        読めなければValueError(JSONDecodeError, UnicodeDecodeError)を投げる
+        """
+        values = list(self.iter_json())
+        if not values:
+            raise ValueError("Error: output is empty.")
+        if len(values) == 1:
+            return values[0]
+        # 数値や文字列が1行ずつ並んだだけの出力はテキストのままにする
+        if not all(isinstance(value, (dict, list)) for value in values):
+            raise ValueError("Error: output is not JSON Lines.")
+        return values
+
+    def iter_json(self):
+        """
+        出力のJSONの値を先頭から1つずつデコードして返す
+        チャンクごとに読みながらデコードするので、メモリに持つ文字列はまだデコードしていない部分(最大で値1つ分)だけになる
+        """
+        decoder = json.JSONDecoder()
+        text_decoder = codecs.getincrementaldecoder("utf-8")()
+        chunks = self.iter_chunks()
+        pending = ""
+        eof = False
+        separated = True  # 前の値との間に改行があったか (最初の値はいらない)
+
+        def read(size: int) -> str:
+            nonlocal eof
+            data = bytearray()
+            for chunk in chunks:
+                data += chunk
+                if len(data) >= size:
+                    break
+            eof = not data
+            return text_decoder.decode(bytes(data), final=eof)
+
+        while True:
+            stripped = pending.lstrip()
+            if len(stripped) != len(pending):
+                separated = separated or "\n" in pending[:len(pending) - len(stripped)]
+                pending = stripped
+            if not pending:
+                if eof:
+                    return
+                pending = read(CHUNK_SIZE)
+                continue
+            if not separated:
+                raise ValueError("Error: JSON values must be separated by newlines.")
+            try:
+                value, end = decoder.raw_decode(pending)
+                # 数値は途中で切れていても("12|3", "1e|5")読めてしまうので、後ろに空白が読めるまで確定しない
+                truncated = isinstance(value, (int, float)) and not eof and not pending[end:end + 1].isspace()
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                truncated = True
+            if truncated:
+                # 読んだ分の数倍を読み足すので、大きな値でもやり直しにかかる時間は合計で値の大きさに比例する
+                pending += read(max(CHUNK_SIZE, 4 * len(pending)))
+                continue
+            yield value
+            pending = pending[end:]
+            separated = False
+
+    def _spill(self) -> None:
+        self.path = _make_spill_path()
+        self._finalizer = weakref.finalize(self, _remove_spill_file, self.path)
+
+    def _update_first_byte(self, chunk: bytes) -> None:
+        if self._first_byte is None:
+            stripped = chunk.lstrip()
+            if stripped:
+                self._first_byte = stripped[0]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __str__(self) -> str:
+        return self.text()
+
+    def __repr__(self) -> str:
+        if self.spilled:
+            return f"<OutputBuffer {self.size} bytes at {self.path}>"
+        return repr(self.text())
+
+    def __getstate__(self) -> dict:
+        self.close()
+        state = self.__dict__.copy()
+        state["_file"] = None
+        # 一時ファイルを消すのは元のバッファだけにする
+        state["_finalizer"] = None
+        return state
+
+
+def _make_spill_path() -> str:
+    fd, path = tempfile.mkstemp(prefix="pyctf-output-")
+    os.close(fd)
+    return path
+
+
+def _remove_spill_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,38 +1,311 @@
 import os
+import re
 import json
-import jsonschema
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 import module.module as md
+from registry import recipe_registry
+from blob import BlobView
+from .scanner import get_scanner, ENCODINGS
 
 import utils
+import tracing
+
+TEMPLATE_PATTERN = re.compile(r'\{(.+?)\}')
+RECIPE_DIR_PATTERN = re.compile(r'\{recipe_dir\}(/[^\s|;&<>()\'"`]*)?')
+
+def build_dependency_graph(execution_chain: list) -> list:
+    """
+    execution-chainの各ステップが依存するステップを求める
+    
+    以下のいずれかに当てはまる場合、後のステップは前のステップに依存する
+    - 引数が前のステップの結果を参照している ({strings_result.output.0})
+    - scannerのsourcesに前のステップのinrecipe-nameがある
+    - stdinで前のステップの出力を読む
+    - 同じ{recipe_dir}/ファイル を参照している (teeで書いたファイルをgrepで読むなど)
+    - どちらかが{recipe_dir}そのものを参照している (ディレクトリ内に何を書くかわからない)
+    - depends-onで明示されている
+    - inrecipe-nameが前のステップと重複している
+    
+    Args:
+        execution_chain (list): レシピのexecution-chain
+
+    Returns:
+        list: ステップごとの依存先インデックスのset
+    """
+    dependencies = []
+    names = {}          # inrecipe-name -> 最後にその名前を使ったステップ
+    recipe_files = {}   # {recipe_dir}/以下のパス -> 参照したステップ
+    recipe_dir_users = set()
+    recipe_dir_whole = set()
+    
+    for index, step in enumerate(execution_chain):
+        depends = set()
+        sources = step.get('sources', [])
+        arguments = " ".join(step['arguments'] + sources)
+        
+        for match in TEMPLATE_PATTERN.finditer(arguments):
+            root = match.group(1).split('.')[0]
+            if root in names:
+                depends.add(names[root])
+                
+        for source in sources:
+            if source in names:
+                depends.add(names[source])
+        
+        if 'stdin' in step:
+            if step['stdin'] not in names:
+                raise KeyError(f"Error: stdin {step['stdin']} of {step['inrecipe-name']} is not found in previous steps.")
+            depends.add(names[step['stdin']])
+                
+        for name in step.get('depends-on', []):
+            if name not in names:
+                raise KeyError(f"Error: depends-on {name} of {step['inrecipe-name']} is not found in previous steps.")
+            depends.add(names[name])
+        
+        for match in RECIPE_DIR_PATTERN.finditer(arguments):
+            path = match.group(1)
+            if path:
+                depends.update(recipe_files.get(path, ()))
+                depends.update(recipe_dir_whole)
+                recipe_files.setdefault(path, set()).add(index)
+            else:
+                depends.update(recipe_dir_users)
+                recipe_dir_whole.add(index)
+            recipe_dir_users.add(index)
+        
+        if step['inrecipe-name'] in names:
+            depends.update(range(index))
+        names[step['inrecipe-name']] = index
+        
+        dependencies.append(depends)
+    return dependencies
+
+def build_stream_groups(execution_chain: list, dependencies: list, is_streamable) -> tuple:
+    """
+    stdinでつながったステップを、同時に起動するグループにまとめる
+    グループ内では前のステップのstdoutがパイプで後のステップのstdinに流れるので、終わるのを待たない
+    
+    Args:
+        execution_chain (list): レシピのexecution-chain
+        dependencies (list): build_dependency_graphの結果
+        is_streamable (callable): ステップ(dict)がプロセスのstdout/stdinを持つならTrue
+    
+    Returns:
+        tuple: (ステップのインデックスのリストのリスト, グループごとの依存先グループのインデックスのset)
+               グループは依存先が必ず前に来る順に並ぶ
+    """
+    names = {}
+    group_of = []
+    groups = []
+    for index, step in enumerate(execution_chain):
+        if 'stdin' in step and step['type'] != "module":
+            raise ValueError(f"Error: stdin of {step['inrecipe-name']} can be used only for modules.")
+        producer = names.get(step.get('stdin'))
+        if producer is not None and is_streamable(execution_chain[producer]) and is_streamable(step):
+            group = group_of[producer]
+            # パイプの先のステップは、流れている途中の結果を参照できない
+            referenced = {match.group(1).split('.')[0] for match in TEMPLATE_PATTERN.finditer(" ".join(step['arguments']))}
+            referenced.update(step.get('depends-on', []))
+            for member in groups[group]:
+                if execution_chain[member]['inrecipe-name'] in referenced:
+                    raise ValueError(f"Error: {step['inrecipe-name']} reads the stdout of {step['stdin']} and cannot refer to the result of {execution_chain[member]['inrecipe-name']}.")
+        else:
+            group = len(groups)
+            groups.append([])
+        groups[group].append(index)
+        group_of.append(group)
+        names[step['inrecipe-name']] = index
+    
+    group_dependencies = []
+    for group, members in enumerate(groups):
+        group_dependencies.append({group_of[depend] for member in members for depend in dependencies[member]} - {group})
+    
+    # グループの外のステップを経由して互いに依存していないか確かめつつ、依存先が前に来るように並べる
+    order = []
+    remaining = set(range(len(groups)))
+    while remaining:
+        ready = sorted(group for group in remaining if not group_dependencies[group] & remaining)
+        if not ready:
+            raise ValueError("Error: steps connected by stdin depend on each other through other steps.")
+        order.extend(ready)
+        remaining.difference_update(ready)
+    position = {group: new for new, group in enumerate(order)}
+    return [groups[group] for group in order], [{position[depend] for depend in group_dependencies[group]} for group in order]
+
+def iter_stream(output):
+    """
+    ステップの結果を、stdinとして流すbytesのチャンクにする
+    文字列/bytes/出力そのもの(OutputBuffer, BlobView)はそのまま、文字列のリストは1行ずつ、それ以外はjsonにする
+    """
+    if isinstance(output, list) and len(output) == 1:
+        output = output[0]
+    if isinstance(output, bytes):
+        yield output
+    elif isinstance(output, str):
+        yield output.encode()
+    elif isinstance(output, (md.OutputBuffer, BlobView)):
+        yield from output.iter_chunks()
+    elif isinstance(output, list) and all(isinstance(item, str) for item in output):
+        for item in output:
+            yield item.encode() + b"\n"
+    else:
+        yield json.dumps(output, default=str).encode()
+
+def write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
 
 class Recipe:
-    def __init__(self, recipe_name, states) -> None:
-        self.recipe_json = None
-        self.recipe_list = self.get_recipe_list()
+    # 同時に実行するステップ数の上限
+    max_workers = os.cpu_count() or 1
+    
+    def __init__(self, recipe_name, states, limits=None, quote_input: bool = False) -> None:
+        """
+        Args:
+            limits (ResourceLimits): 各ステップのモジュールのlimitsを切り詰める上限(WorkSpace全体の上限)
+            quote_input (bool): 各ステップのモジュールに渡す (Module.__init__を参照)
+        """
         self.recipe_name = recipe_name
-        if self.recipe_name in self.recipe_list:
-            self.recipe_path = self.recipe_list[recipe_name]
-        else:
-            raise KeyError(f"Error: {recipe_name} is not found.")
+        self.limits = limits
+        self.quote_input = quote_input
+        entry = recipe_registry.get_entry(recipe_name)
+        self.recipe_path = entry.file
+        # レジストリと共有しているので書き換えないこと
+        self.recipe_json = entry.definition
+        self.recipe_templates = entry.templates
+        self.max_input = entry.max_input
             
         self.states = states
         self.variables = {}
-        with open(os.path.join("recipes", self.recipe_path), 'r') as f:
-            self.recipe_json = json.load(f)
         if self.recipe_json['prepare-recipe-directory']:
             self.recipe_dir = utils.get_temp_folder()
             self.variables["recipe_dir"] = self.recipe_dir
 
         self.modules = []
+        # run_asyncで、各ステップのstdoutを受け取った順に(inrecipe-name, chunk)で呼ばれる
+        self.on_output = None
         
         
     def run(self, args: list) -> None:
+        with tracing.span("recipe.run", recipe=self.recipe_name):
+            self._run(args)
+    
+    def _run(self, args: list) -> None:
+        self.prepare_input(args)
+        chain = self.recipe_json['execution-chain']
+        groups, dependencies = self.get_stream_groups(chain)
+        dependents = [[] for _ in groups]
+        waiting = []
+        for index, depends in enumerate(dependencies):
+            waiting.append(len(depends))
+            for depend in depends:
+                dependents[depend].append(index)
+        
+        # 依存先が全て終わったステップ(stdinでつながったものはまとめて)から順に並列実行する
+        lock = threading.Lock()
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running = {}
+            ready = [index for index in range(len(groups)) if waiting[index] == 0]
+            while ready or running:
+                if not errors:
+                    for index in ready:
+                        # スレッドでもこのレシピのスパンの子として記録する
+                        running[executor.submit(tracing.bind_context(self._run_group), groups[index], lock)] = index
+                ready = []
+                if not running:
+                    break
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    if future.exception() is not None:
+                        errors[groups[index][0]] = future.exception()
+                        continue
+                    for dependent in dependents[index]:
+                        waiting[dependent] -= 1
+                        if waiting[dependent] == 0:
+                            ready.append(dependent)
+                ready.sort()
         
+        self._finish_steps(chain, errors)
+    
+    async def run_async(self, args, on_output=None) -> None:
+        """
+        runの非同期版
+        キャンセルされた場合は実行中のステップも全てキャンセルする
+        
+        Args:
+            on_output (callable): ステップのstdoutを受け取るたびに(inrecipe-name, chunk)を引数に呼ばれる
+                                  パイプでつないだステップ(stdin)の出力は流れない
+        """
+        self.on_output = on_output
+        with tracing.span("recipe.run", recipe=self.recipe_name):
+            await self._run_async(args)
+    
+    async def _run_async(self, args) -> None:
+        self.prepare_input(args)
+        chain = self.recipe_json['execution-chain']
+        groups, dependencies = self.get_stream_groups(chain)
+        semaphore = asyncio.Semaphore(self.max_workers)
+        
+        async def run_group(index):
+            # 依存先は必ず前の方にあるので、既にタスクが作られている
+            await asyncio.gather(*(tasks[depend] for depend in dependencies[index]))
+            async with semaphore:
+                await self._run_group_async(groups[index])
+        
+        tasks = []
+        for index in range(len(groups)):
+            tasks.append(asyncio.ensure_future(run_group(index)))
+        
+        errors = {}
+        try:
+            if tasks:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        for index, task in enumerate(tasks):
+            if not task.cancelled() and task.exception() is not None:
+                errors[groups[index][0]] = task.exception()
+        self._finish_steps(chain, errors)
+    
+    def get_stream_groups(self, chain: list) -> tuple:
+        """
+        Returns:
+            tuple: build_stream_groupsの結果
+        """
+        return build_stream_groups(chain, build_dependency_graph(chain), self._is_streamable)
+    
+    @staticmethod
+    def _is_streamable(step: dict) -> bool:
+        return step["type"] == "module" and md.module_registry.get(step["name"])["type"] == "external"
+    
+    def get_memory_limit(self) -> int:
+        """
+        ステップのモジュールのlimits.memoryのうち最大のもの (WorkSpaceのbudgetから予約する量)
+        
+        Returns:
+            int: バイト数 どのモジュールも指定していなければNone
+        """
+        memory = [
+            md.ResourceLimits.from_json(md.module_registry.get(step["name"]).get("limits")).cap(self.limits).memory
+            for step in self.recipe_json['execution-chain'] if step["type"] == "module"
+        ]
+        return max((value for value in memory if value is not None), default=None)
+    
+    def prepare_input(self, args: list) -> None:
         # レシピ内変数の準備
-        max_arg_num = utils.find_max_arg_num(json.dumps(self.recipe_json))
+        max_arg_num = self.max_input
         if max_arg_num is not None and max_arg_num > len(args):
-            raise Exception(f"Error: {module['name']} module/recipe requires {max_arg_num} arguments, but {len(args)} arguments are given.")
+            raise Exception(f"Error: {self.recipe_name} module/recipe requires {max_arg_num} arguments, but {len(args)} arguments are given.")
 
         self.variables["input"] = []
         
@@ -41,62 +314,247 @@ class Recipe:
             if not template_arg is None:
                 arg = template_arg
             self.variables["input"].append(arg)
-            
-        self.variables["inrecipe-names"] = []
-        for module in self.recipe_json['execution-chain']:
-            for arg_count, arg in enumerate(module['arguments']):
-                module['arguments'][arg_count] = utils.replace_template(self.variables, arg)
-                    
-            if module["type"] == "module":
-                this_execution = md.Module(module["name"], self.states)
-            elif module["type"] == "recipe":
-                this_execution = Recipe(module["name"], self.states)
+    
+    def _finish_steps(self, chain: list, errors: dict) -> None:
+        if errors:
+            # 直列実行の場合と同じく、chainで最初に失敗したステップの例外を投げる
+            raise errors[min(errors)]
+        
+        # 変数の並びを直列実行の場合と揃える
+        self.variables["inrecipe-names"] = [module["inrecipe-name"] for module in chain]
+        for name in dict.fromkeys(self.variables["inrecipe-names"]):
+            self.variables[name] = self.variables.pop(name)
+    
+    def _create_step(self, index: int):
+        module = self.recipe_json['execution-chain'][index]
+        templates = self.recipe_templates['execution-chain'][index]['arguments']
+        with tracing.span("recipe.render"):
+            arguments = [template.render(self.variables) for template in templates]
                 
-            this_execution.run(module['arguments'])
-            self.variables[module["inrecipe-name"]] = {"output": []}
-            self.variables[module["inrecipe-name"]]["output"] = this_execution.get_result()
-            self.variables["inrecipe-names"].append(module["inrecipe-name"])
+        if module["type"] == "module":
+            this_execution = md.Module(module["name"], self.states, self.limits, self.quote_input)
+        elif module["type"] == "recipe":
+            this_execution = Recipe(module["name"], self.states, self.limits, self.quote_input)
+        return module, this_execution, arguments
+    
+    def _run_group(self, group: list, lock: threading.Lock, modules: dict = None) -> None:
+        """
+        Args:
+            group (list): build_stream_groupsでまとめたステップのインデックス
+            modules (dict): 起動したModuleをインデックスごとに入れる(外からkillするため)
+        """
+        if modules is None:
+            modules = {}
+        if len(group) == 1:
+            self._run_step(group[0], lock, modules)
+        else:
+            self._run_stream(group, lock, modules)
+    
+    async def _run_group_async(self, group: list) -> None:
+        chain = self.recipe_json['execution-chain']
+        if len(group) == 1 and 'stdin' not in chain[group[0]]:
+            await self._run_step_async(group[0])
+            return
+        # パイプを使うステップはスレッドで実行し、キャンセルされたら起動したプロセスをkillする
+        modules = {}
+        task = asyncio.ensure_future(asyncio.to_thread(self._run_group, group, threading.Lock(), modules))
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            for module in modules.values():
+                module.kill()
+            await asyncio.gather(task, return_exceptions=True)
+            raise
+    
+    def _run_step(self, index: int, lock: threading.Lock, modules: dict = None) -> None:
+        module = self.recipe_json['execution-chain'][index]
+        with tracing.span("recipe.step", step=module["inrecipe-name"], module=module["name"]):
+            self._run_step_traced(index, lock, modules)
+    
+    def _run_step_traced(self, index: int, lock: threading.Lock, modules: dict) -> None:
+        module = self.recipe_json['execution-chain'][index]
+        if module["type"] == "scanner":
+            output = self._run_scanner(index)
+        else:
+            module, this_execution, arguments = self._create_step(index)
+            if modules is not None:
+                modules[index] = this_execution
+            if "stdin" not in module:
+                this_execution.run(arguments)
+            elif this_execution.module_json["type"] == "built-in":
+                # built-inは同じプロセスなので、前のステップの結果をそのまま最後の引数として渡す
+                this_execution.run(arguments + [self.variables[module["stdin"]]["output"]])
+            else:
+                read_fd, feeder = self._start_feeder(self.variables[module["stdin"]]["output"])
+                try:
+                    this_execution.run(arguments, stdin=read_fd)
+                finally:
+                    os.close(read_fd)
+                    feeder.join()
+            output = this_execution.get_result()
+        with lock:
+            self.variables[module["inrecipe-name"]] = {"output": output}
+    
+    def _run_stream(self, group: list, lock: threading.Lock, modules: dict) -> None:
+        """
+        stdinでつながったステップを同時に起動し、前のステップのstdoutを後のステップのstdinへパイプで流す
+        読むステップが1つだけで結果を残さない(capture: false)場合はプロセス同士をパイプで直接つなぎ、このプロセスを経由しない
+        それ以外はstdoutを読みながら、読む全てのステップのパイプへ書き込む
+        """
+        chain = self.recipe_json['execution-chain']
+        names = {}
+        consumers = {index: [] for index in group}
+        for index in group:
+            if index != group[0]:
+                consumers[names[chain[index]['stdin']]].append(index)
+            names[chain[index]['inrecipe-name']] = index
+        
+        stdin_fds = {}   # ステップ -> stdinにするfd
+        stdout_fds = {}  # ステップ -> stdoutにするfd (プロセス同士を直接つなぐ場合)
+        pipes = {}       # ステップ -> stdoutを読んで書き込むfdのリスト
+        feeder = None
+        if 'stdin' in chain[group[0]]:
+            # 先頭のステップのstdinは、終わっている(built-inなどの)ステップの結果から流す
+            stdin_fds[group[0]], feeder = self._start_feeder(self.variables[chain[group[0]]['stdin']]['output'])
+        for producer, readers in consumers.items():
+            if len(readers) == 1 and not chain[producer].get('capture', True):
+                stdin_fds[readers[0]], stdout_fds[producer] = os.pipe()
+            else:
+                for reader in readers:
+                    stdin_fds[reader], write_fd = os.pipe()
+                    pipes.setdefault(producer, []).append(write_fd)
+        
+        def run_member(index):
+            targets = list(pipes.get(index, ()))
+            
+            def on_output(chunk):
+                for fd in list(targets):
+                    try:
+                        write_all(fd, chunk)
+                    except BrokenPipeError:
+                        # 読む側が最後まで読まずに終わった
+                        targets.remove(fd)
+            
+            try:
+                module, this_execution, arguments = self._create_step(index)
+                modules[index] = this_execution
+                capture = module.get('capture', True)
+                with tracing.span("recipe.step", step=module["inrecipe-name"], module=module["name"], stream=True):
+                    this_execution.run(
+                        arguments,
+                        on_output=on_output if targets else None,
+                        stdin=stdin_fds.get(index),
+                        stdout=stdout_fds.get(index),
+                        capture=capture,
+                    )
+                    output = this_execution.get_result() if capture else []
+            finally:
+                # 書き込む側を閉じると読む側にEOFが、読む側を閉じると書き込む側にEPIPEが届く
+                for fd in [stdin_fds.get(index), stdout_fds.get(index), *pipes.get(index, ())]:
+                    if fd is not None:
+                        os.close(fd)
+            with lock:
+                self.variables[module["inrecipe-name"]] = {"output": output}
+        
+        try:
+            with ThreadPoolExecutor(max_workers=len(group)) as executor:
+                futures = [executor.submit(tracing.bind_context(run_member), index) for index in group]
+        finally:
+            if feeder is not None:
+                feeder.join()
+        for future in futures:
+            # chainで最初に失敗したステップの例外を投げる
+            if future.exception() is not None:
+                raise future.exception()
+    
+    @staticmethod
+    def _start_feeder(output) -> tuple:
+        """
+        終わったステップの結果をパイプに書き込むスレッドを起動する
+        
+        Returns:
+            tuple: (パイプの読む側のfd, スレッド)
+        """
+        read_fd, write_fd = os.pipe()
+        
+        def feed():
+            try:
+                for chunk in iter_stream(output):
+                    write_all(write_fd, chunk)
+            except BrokenPipeError:
+                pass
+            finally:
+                os.close(write_fd)
+        
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        return read_fd, feeder
+    
+    async def _run_step_async(self, index: int) -> None:
+        module = self.recipe_json['execution-chain'][index]
+        with tracing.span("recipe.step", step=module["inrecipe-name"], module=module["name"]):
+            if module["type"] == "scanner":
+                self.variables[module["inrecipe-name"]] = {"output": await asyncio.to_thread(self._run_scanner, index)}
+                return
+            module, this_execution, arguments = self._create_step(index)
+            on_output = None
+            if self.on_output is not None:
+                on_output = lambda chunk, name=module["inrecipe-name"]: self.on_output(name, chunk)
+            await this_execution.run_async(arguments, on_output)
+            self.variables[module["inrecipe-name"]] = {"output": this_execution.get_result()}
+    
+    def _run_scanner(self, index: int) -> list:
+        """
+        scannerステップを実行する
+        patternsと引数(を展開したもの)の全てのフラグの形式を、sourcesの全てのデータから1回の走査で探す
+        
+        Returns:
+            list: {"source", "encoding", "offset", "match"} のリスト
+        """
+        step = self.recipe_json['execution-chain'][index]
+        templates = self.recipe_templates['execution-chain'][index]
+        # patternsは正規表現なのでテンプレートとして展開しない
+        patterns = step.get('patterns', []) + [template.render(self.variables) for template in templates['arguments']]
+        scanner = get_scanner(tuple(pattern for pattern in patterns if pattern), tuple(step.get('encodings', ENCODINGS)))
+        
+        matches = []
+        with tracing.span("recipe.scanner", patterns=len(patterns)) as span:
+            for source, template in zip(step.get('sources', []), templates.get('sources', [])):
+                matches.extend(self._scan_source(scanner, source, template))
+            span.set(matches=len(matches))
+        return matches
+    
+    def _scan_source(self, scanner, source: str, template) -> list:
+        # {strings_result.output} のような参照 または inrecipe-name ならその結果を、そうでなければファイルを走査する
+        value = template.resolve(self.variables)
+        if value is None and source in self.variables:
+            value = self.variables[source]
+        if value is not None:
+            return scanner.scan_value(value, source.strip("{}"))
+        path = template.render(self.variables)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Error: {path} is not found.")
+        return scanner.scan_file(path)
 
             
     def get_result(self):
-        self.variables["output"] = []
-        for arg_count, arg in enumerate(self.recipe_json['output']):
-            self.variables["output"].append(utils.replace_template_nostr(self.variables, arg))
+        with tracing.span("recipe.get_result", recipe=self.recipe_name):
+            self.variables["output"] = []
+            for template in self.recipe_templates['output']:
+                self.variables["output"].append(template.resolve(self.variables))
             
         return self.variables["output"]
     
     def get_variables(self):
         return self.variables
     
-    async def run_async(self, args) -> None:
-        pass
-    
     @staticmethod
     def get_recipe_list() -> dict:
-        recipe_list = {}
-        for file in os.listdir('recipes'):
-            if file.endswith('.json'):
-                if file == 'schema.json':
-                    continue
-                with open(os.path.join('recipes', file), 'r') as f:
-                    try:
-                        recipe_json = json.load(f)
-                        jsonschema.validate(recipe_json, json.load(open('recipes/schema.json')))
-                        recipe_list[recipe_json['name']] = file
-                    except json.JSONDecodeError:
-                        print(f'{file} is invalid json')
-                    except jsonschema.exceptions.ValidationError as e:
-                        print(f'{file} is invalid json schema')
-        return recipe_list
+        return recipe_registry.files()
     
     @staticmethod
     def get_recipe_info(recipe_name: str) -> str:
-        recipe_list = Recipe.get_recipe_list()
-        if not recipe_name in recipe_list:
-            raise KeyError(f"{recipe_name} is not found.")
-        
-        with open(os.path.join("recipes", recipe_list[recipe_name]), 'r') as f:
-            recipe_json = json.load(f)
+        recipe_json = recipe_registry.get(recipe_name)
         
         if not "description" in recipe_json:
             raise KeyError(f"{recipe_name} has no description.")
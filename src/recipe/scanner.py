@@ -0,0 +1,265 @@
+import re
+import base64
+import binascii
+import functools
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+CHUNK_SIZE = 1024 * 1024
+# フラグ1つの最大の長さ(文字数) チャンクの境界をまたぐマッチのためにこれの数倍を重ねて読む
+MAX_MATCH = 512
+ENCODINGS = ("utf-8", "utf-16le", "utf-16be", "base64")
+# 走査の起点にしないバイト (これらだけのリテラルは正規表現で探す)
+COMMON_BYTES = frozenset(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 \t\r\n\0\xff")
+BASE64_BYTES = frozenset(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=")
+
+
+def get_prefix(pattern: str, flags: int = 0) -> str:
+    """
+    正規表現のマッチが必ずその文字列で始まる、先頭の固定部分を返す (flag\\{.*\\} なら flag{)
+    """
+    prefix = []
+    for op, av in sre_parse.parse(pattern, flags):
+        if op is sre_parse.LITERAL:
+            prefix.append(chr(av))
+        elif op is sre_parse.AT and not prefix:
+            continue
+        else:
+            break
+    return "".join(prefix)
+
+
+def get_base64_prefixes(prefix: bytes) -> list:
+    """
+    base64で符号化されたデータの中でprefixが現れた場合に、必ず現れる文字列を返す
+    prefixの前に何バイトあるか(3で割った余り)で符号化結果が変わるので3通り作る
+    """
+    prefixes = []
+    for offset in range(3):
+        encoded = base64.b64encode(b"\0" * offset + prefix)
+        # 前のデータの影響を受ける先頭と、後ろのデータの影響を受ける末尾を除く
+        start = (offset * 4 + 2) // 3
+        end = (offset + len(prefix)) // 3 * 4
+        if end - start >= 4:
+            prefixes.append(encoded[start:end])
+    return prefixes
+
+
+def get_anchor(literal: bytes) -> int:
+    """
+    リテラルの中で、テキストやバイナリにあまり現れないバイト(英数字・空白・NUL以外)の位置を返す
+    無ければNone
+    """
+    for position in range(len(literal) - 1, -1, -1):
+        if literal[position] not in COMMON_BYTES:
+            return position
+    return None
+
+
+def build_trie_regex(literals) -> bytes:
+    """
+    bytesのリテラルの集合を、共通の先頭部分をまとめた1つの正規表現にする
+    (単純に|でつなぐよりreのバックトラックが減り、リテラルが多くても速い)
+    """
+    trie = {}
+    for literal in literals:
+        node = trie
+        for byte in literal:
+            node = node.setdefault(byte, {})
+        node[None] = {}
+
+    def build(node) -> bytes:
+        # 位置が分かればよいので、あるリテラルの終わりに着いたらそれより長いものは見ない
+        if None in node:
+            return b""
+        alternatives = [re.escape(bytes([byte])) + build(child) for byte, child in sorted(node.items())]
+        return alternatives[0] if len(alternatives) == 1 else b"(?:" + b"|".join(alternatives) + b")"
+
+    return build(trie)
+
+
+class FlagScanner:
+    def __init__(self, patterns: list, encodings: list = ENCODINGS, max_match: int = MAX_MATCH) -> None:
+        """
+        複数のフラグの形式を1回の走査で探すスキャナ
+        各パターンの先頭の固定部分(をエンコードごとに変換したもの)を1つの正規表現にまとめ、
+        小文字にしたデータを走査して、見つかった位置でだけ元の正規表現で確認する
+
+        Args:
+            patterns (list): フラグの正規表現のリスト (例: flag\\{[^}]*\\})
+            encodings (list): utf-8 / utf-16le / utf-16be / base64 のうち探すもの
+            max_match (int): マッチの最大の長さ
+        """
+        self.max_match = max_match
+        self.overlap = max_match * 4
+        self.patterns = [re.compile(pattern) for pattern in dict.fromkeys(patterns)]
+        # 小文字にした先頭の固定部分 -> [(元の先頭の固定部分, 大文字小文字を区別しないか, パターン, エンコード)]
+        groups = {}
+        # 先頭が決まらないパターンはbytesの正規表現にしてそのまま走査する (utf-8のみ)
+        self._fallbacks = []
+        for pattern in self.patterns:
+            ignorecase = bool(pattern.flags & re.IGNORECASE)
+            prefix = get_prefix(pattern.pattern, pattern.flags)
+            if len(prefix) < 2:
+                self._fallbacks.append((re.compile(pattern.pattern.encode(), pattern.flags & re.IGNORECASE), pattern))
+                continue
+            for encoding in encodings:
+                if encoding == "base64":
+                    # base64の符号化結果は大文字小文字を区別する
+                    keys = [(key, False) for key in get_base64_prefixes(prefix.encode())]
+                else:
+                    keys = [(prefix.encode(encoding), ignorecase)]
+                for key, key_ignorecase in keys:
+                    groups.setdefault(key.lower(), []).append((key, key_ignorecase, pattern, encoding))
+
+        # 珍しいバイト('{'など)を含む固定部分は、そのバイトだけを探して前後を確かめる
+        # そのバイト -> [(固定部分の中での位置, 小文字にした固定部分, エントリ)]
+        self._anchors = {}
+        # 英数字だけの固定部分(base64など)は、共通の先頭をまとめた正規表現で探す
+        # 先頭2バイト -> [(小文字にした固定部分, エントリ)]
+        self._groups = {}
+        for key, entries in groups.items():
+            position = get_anchor(key)
+            if position is None:
+                self._groups.setdefault(key[:2], []).append((key, entries))
+            else:
+                self._anchors.setdefault(key[position], []).append((position, key, entries))
+        self._anchor_scanner = re.compile(b"[" + b"".join(re.escape(bytes([byte])) for byte in self._anchors) + b"]") if self._anchors else None
+        self._scanner = re.compile(build_trie_regex(key for keys in self._groups.values() for key, _ in keys)) if self._groups else None
+
+    def scan(self, chunks, source: str = None) -> list:
+        """
+        bytesのチャンクの列を走査する チャンクの境界をまたぐフラグも見つける
+
+        Returns:
+            list: {"source", "encoding", "offset", "match"} のリスト
+        """
+        results = []
+        if self._anchor_scanner is None and self._scanner is None and not self._fallbacks:
+            return results
+        seen = set()
+        buffer = b""
+        base = 0  # bufferの先頭の、データ全体でのオフセット
+        chunks = iter(chunks)
+        while True:
+            chunk = next(chunks, None)
+            final = chunk is None
+            if not final:
+                buffer += chunk
+                if len(buffer) < self.overlap * 2:
+                    continue
+            # 次のバッファと重なる部分で始まるものは次で探す
+            limit = len(buffer) if final else len(buffer) - self.overlap
+            for encoding, offset, match in self._scan_buffer(buffer, limit):
+                key = (encoding, base + offset, match)
+                if key not in seen:
+                    seen.add(key)
+                    results.append({"source": source, "encoding": encoding, "offset": base + offset, "match": match})
+            if final:
+                return results
+            base += limit
+            buffer = buffer[limit:]
+
+    def _scan_buffer(self, buffer: bytes, limit: int):
+        # ASCIIの大文字小文字を区別しない走査は、小文字にしたデータに対して行う方がreの(?i)より速い
+        lowered = buffer.lower()
+        if self._anchor_scanner is not None:
+            for hit in self._anchor_scanner.finditer(lowered):
+                anchor = hit.start()
+                if anchor - self.max_match >= limit:
+                    break
+                for offset, key, entries in self._anchors[lowered[anchor]]:
+                    position = anchor - offset
+                    if 0 <= position < limit and lowered.startswith(key, position):
+                        yield from self._confirm(buffer, position, entries)
+        if self._scanner is not None:
+            search = self._scanner.search
+            position = 0
+            while (hit := search(lowered, position)) is not None and hit.start() < limit:
+                # 重なって現れる別のパターンの先頭も見つけるため、1バイトずつ進める
+                position = hit.start()
+                for key, entries in self._groups.get(lowered[position:position + 2], ()):
+                    if lowered.startswith(key, position):
+                        yield from self._confirm(buffer, position, entries)
+                position += 1
+        for regex, pattern in self._fallbacks:
+            for hit in regex.finditer(buffer):
+                if hit.start() >= limit:
+                    break
+                match = pattern.match(buffer[hit.start():hit.start() + self.max_match].decode("utf-8", errors="ignore"))
+                if match:
+                    yield "utf-8", hit.start(), match.group()
+
+    def _confirm(self, buffer: bytes, position: int, entries: list):
+        for original, ignorecase, pattern, encoding in entries:
+            if not ignorecase and not buffer.startswith(original, position):
+                continue
+            if encoding == "base64":
+                yield from self._confirm_base64(buffer, position, pattern)
+                continue
+            window = buffer[position:position + self.max_match * (1 if encoding == "utf-8" else 2)]
+            match = pattern.match(window.decode(encoding, errors="ignore"))
+            if match:
+                yield encoding, position, match.group()
+
+    def _confirm_base64(self, buffer: bytes, position: int, pattern: re.Pattern):
+        # base64の文字が続く範囲を前後に広げて、その範囲全体を復号してから探す
+        limit = self.max_match * 2
+        start = position
+        while start > 0 and position - start < limit and buffer[start - 1] in BASE64_BYTES:
+            start -= 1
+        end = position
+        while end < len(buffer) and end - position < limit and buffer[end] in BASE64_BYTES:
+            end += 1
+        encoded = buffer[start:end].rstrip(b"=")
+        for skip in range(4):
+            # 範囲の先頭が符号化の区切りと一致しているとは限らないので4通り試す
+            data = encoded[skip:]
+            data = data[:len(data) // 4 * 4 + (len(data) % 4 if len(data) % 4 > 1 else 0)]
+            try:
+                decoded = base64.b64decode(data + b"=" * (-len(data) % 4))
+            except (binascii.Error, ValueError):
+                continue
+            for match in pattern.finditer(decoded.decode("utf-8", errors="ignore")):
+                yield "base64", start + skip, match.group()
+
+    def scan_value(self, value, source: str = None, chunk_size: int = CHUNK_SIZE) -> list:
+        """
+        str / bytes / BlobView / list / dict (ステップの結果) を走査する
+        """
+        results = []
+        for path, item in iter_values(value, source):
+            if isinstance(item, str):
+                item = item.encode("utf-8", errors="surrogateescape")
+            results.extend(self.scan((item[start:start + chunk_size] for start in range(0, len(item), chunk_size)), path))
+        return results
+
+    def scan_file(self, path: str, chunk_size: int = CHUNK_SIZE) -> list:
+        with open(path, 'rb') as f:
+            return self.scan(iter(lambda: f.read(chunk_size), b""), path)
+
+
+@functools.lru_cache(maxsize=64)
+def get_scanner(patterns: tuple, encodings: tuple = ENCODINGS) -> FlagScanner:
+    """
+    同じパターンの組み合わせのスキャナを使い回す (レシピを実行するたびに正規表現を作り直さない)
+    """
+    return FlagScanner(list(patterns), list(encodings))
+
+
+def iter_values(value, path: str):
+    """
+    結果の中の文字列/bytes/blobを、その場所を表すパス(strings_result.output.0など)と一緒に列挙する
+    """
+    if isinstance(value, list):
+        for index, item in enumerate(value):
+            yield from iter_values(item, f"{path}.{index}")
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            yield from iter_values(item, f"{path}.{key}")
+    elif isinstance(value, (str, bytes)) or hasattr(value, "search"):
+        # BlobViewはスライスでbytesを返す
+        yield path, value
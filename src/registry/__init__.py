@@ -0,0 +1 @@
+from .registry import *
\ No newline at end of file
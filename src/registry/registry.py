@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import pickle
+import tempfile
+import threading
+from dataclasses import dataclass
+
+import utils
+import tracing
+
+SNAPSHOT_DIR = ".cache/registry"
+# スナップショットの形式(RegistryEntryやutils.Templateの中身)を変えたら上げる
+SNAPSHOT_VERSION = 1
+
+
+@dataclass
+class RegistryEntry:
+    file: str
+    name: str
+    definition: dict
+    mtime_ns: int
+    size: int
+    digest: str
+    templates: dict  # definitionの文字列を全てutils.Templateにしたもの
+    max_input: int   # 必要な入力の最大の番号({input.N}のN)
+
+
+class Registry:
+    def __init__(self, directory: str, schema_file: str = "schema.json", snapshot: str = None) -> None:
+        """
+        定義ファイル(モジュール/レシピのjson)のインデックス
+        一度読み込んだ定義はプロセス内で共有し、mtimeかサイズが変わったファイルだけを再検証する
+        snapshotを指定すると、読み込んだ定義をそのファイルに保存し、次に起動したときはそこから読み込む
+        (変わっていないファイルはjsonのパースもjsonschemaの検証もしない)
+
+        Args:
+            directory (str): 定義ファイルのディレクトリ
+            schema_file (str): directory内のスキーマファイル名
+            snapshot (str): スナップショットのパス Noneなら保存しない
+        """
+        self.directory = directory
+        self.schema_file = schema_file
+        self.snapshot = snapshot
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._dirty = False
+        self._validator = None
+        self._schema_stat = None
+        self._directory_stat = None
+        self._files = {}  # ファイル名 -> (mtime_ns, size, RegistryEntry or None(不正なファイル))
+        self._index = {}  # 定義名 -> RegistryEntry
+
+    def get(self, name: str) -> dict:
+        """
+        定義(パース済みのjson)を取得する
+        返り値はプロセス内で共有されるので書き換えないこと
+
+        Args:
+            name (str): 定義名(NOTファイル名)
+
+        Returns:
+            dict: 定義
+        """
+        return self.get_entry(name).definition
+
+    def get_entry(self, name: str) -> RegistryEntry:
+        with self._lock:
+            if not self._is_directory_fresh():
+                self.refresh()
+            elif name in self._index:
+                # ディレクトリが変わっていなければ対象のファイルだけstatする
+                self._refresh_file(self._index[name].file)
+
+            if name not in self._index:
+                raise KeyError(f"Error: {name} is not found.")
+            return self._index[name]
+
+    def files(self) -> dict:
+        """
+        Returns:
+            dict: 定義名 -> ファイル名
+        """
+        with self._lock:
+            self.refresh()
+            return {name: entry.file for name, entry in self._index.items()}
+
+    def names(self) -> list:
+        return list(self.files())
+
+    def refresh(self) -> None:
+        """
+        ディレクトリ全体を走査し、変更されたファイルだけを読み直す
+        """
+        with self._lock, tracing.span("registry.scan", directory=self.directory):
+            if not self._loaded:
+                self._loaded = True
+                self._load_snapshot()
+            schema_stat = self._stat(self.schema_file)
+            if schema_stat != self._schema_stat:
+                # スキーマが変わったら全ファイルを検証し直す
+                self._validator = None
+                self._schema_stat = schema_stat
+                self._files = {}
+                self._index = {}
+                self._dirty = True
+
+            self._directory_stat = self._stat("")
+            current = set()
+            with os.scandir(self.directory) as it:
+                for dir_entry in it:
+                    if not dir_entry.name.endswith('.json') or dir_entry.name == self.schema_file:
+                        continue
+                    current.add(dir_entry.name)
+                    st = dir_entry.stat()
+                    self._refresh_file(dir_entry.name, (st.st_mtime_ns, st.st_size))
+
+            for file in set(self._files) - current:
+                self._forget(file)
+                self._dirty = True
+            if self._dirty:
+                self._save_snapshot()
+
+    def _refresh_file(self, file: str, stat=None) -> None:
+        if stat is None:
+            stat = self._stat(file)
+        if stat is None:
+            self._forget(file)
+            return
+
+        cached = self._files.get(file)
+        if cached is not None and cached[:2] == stat:
+            return
+
+        self._forget(file)
+        entry = self._load(file, stat)
+        self._files[file] = (stat[0], stat[1], entry)
+        if entry is not None:
+            self._index[entry.name] = entry
+        self._dirty = True
+
+    def _get_validator(self):
+        # jsonschemaのimportとスキーマの読み込みは、検証が必要になったときだけ行う
+        if self._validator is None:
+            import jsonschema
+            with open(os.path.join(self.directory, self.schema_file), 'r') as f:
+                schema = json.load(f)
+            validator_class = jsonschema.validators.validator_for(schema)
+            self._validator = validator_class(schema)
+        return self._validator
+
+    def _load(self, file: str, stat) -> RegistryEntry:
+        with tracing.span("registry.load", file=file):
+            return self._load_file(file, stat)
+
+    def _load_file(self, file: str, stat) -> RegistryEntry:
+        import hashlib
+        import jsonschema
+        with open(os.path.join(self.directory, file), 'rb') as f:
+            raw = f.read()
+        try:
+            definition = json.loads(raw)
+            self._get_validator().validate(definition)
+        except json.JSONDecodeError:
+            print(f'{file} is invalid json')
+            return None
+        except jsonschema.exceptions.ValidationError:
+            print(f'{file} is invalid json schema')
+            return None
+
+        templates = utils.compile_templates(definition)
+        return RegistryEntry(
+            file=file,
+            name=definition["name"],
+            definition=definition,
+            mtime_ns=stat[0],
+            size=stat[1],
+            digest=hashlib.sha256(raw).hexdigest(),
+            templates=templates,
+            max_input=utils.find_max_input(templates),
+        )
+
+    def _forget(self, file: str) -> None:
+        cached = self._files.pop(file, None)
+        if cached is not None and cached[2] is not None:
+            entry = cached[2]
+            if self._index.get(entry.name) is entry:
+                del self._index[entry.name]
+
+    def _load_snapshot(self) -> None:
+        """
+        スナップショットの定義を読み込む 形式かスキーマが違う場合は読み込まない
+        各ファイルのmtimeとサイズはこの後のrefreshで確かめられる
+        """
+        if self.snapshot is None:
+            return
+        try:
+            with open(self.snapshot, 'rb') as f:
+                snapshot = pickle.load(f)
+        except Exception:
+            # 壊れたスナップショットは無視してjsonから読み直す
+            return
+        if (
+            not isinstance(snapshot, dict)
+            or snapshot.get("version") != (SNAPSHOT_VERSION, sys.version_info[:2])
+            or snapshot.get("directory") != os.path.abspath(self.directory)
+            or snapshot.get("schema_stat") != self._stat(self.schema_file)
+        ):
+            return
+        self._schema_stat = snapshot["schema_stat"]
+        self._files = snapshot["files"]
+        self._index = {entry.name: entry for _, _, entry in self._files.values() if entry is not None}
+
+    def _save_snapshot(self) -> None:
+        self._dirty = False
+        if self.snapshot is None:
+            return
+        snapshot = {
+            "version": (SNAPSHOT_VERSION, sys.version_info[:2]),
+            "directory": os.path.abspath(self.directory),
+            "schema_stat": self._schema_stat,
+            "files": self._files,
+        }
+        try:
+            os.makedirs(os.path.dirname(self.snapshot) or ".", exist_ok=True)
+            # 同時に起動した他のプロセスが書きかけのファイルを読まないように、一時ファイルから置き換える
+            fd, path = tempfile.mkstemp(dir=os.path.dirname(self.snapshot) or ".", prefix=".snapshot-")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(path, self.snapshot)
+            except BaseException:
+                os.remove(path)
+                raise
+        except OSError:
+            # 書き込めない場所でも動くようにする (次の起動でまた検証するだけ)
+            pass
+
+    def _is_directory_fresh(self) -> bool:
+        # ファイルの追加/削除/リネームはディレクトリのmtimeに現れる
+        return (
+            self._loaded
+            and self._stat("") == self._directory_stat
+            and self._stat(self.schema_file) == self._schema_stat
+        )
+
+    def _stat(self, file: str):
+        try:
+            st = os.stat(os.path.join(self.directory, file))
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+
+module_registry = Registry("modules/json", snapshot=os.path.join(SNAPSHOT_DIR, "modules.pickle"))
+recipe_registry = Registry("recipes", snapshot=os.path.join(SNAPSHOT_DIR, "recipes.pickle"))
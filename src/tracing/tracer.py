@@ -0,0 +1,254 @@
+import os
+import time
+import json
+import itertools
+import threading
+import contextlib
+import contextvars
+
+# 今のスレッド/タスクのスパンを記録する先 (Trace, 親のスパンのID)
+_current = contextvars.ContextVar("tracing_current", default=(None, None))
+_ids = itertools.count(1)
+
+
+class Span:
+    __slots__ = ("id", "parent", "name", "category", "start_ns", "wall_ns", "cpu_ns", "pid", "tid", "args", "_perf_ns", "_cpu_start_ns")
+
+    def __init__(self, name: str, category: str, parent: int, args: dict) -> None:
+        """
+        1つの処理の区間
+        cpu_nsはそのスレッドのCPU時間 (awaitをまたぐスパンでは同じスレッドの他のタスクの分も含む)
+        子プロセスのCPU時間とメモリはargsのrusageに入る
+        """
+        self.id = next(_ids)
+        self.parent = parent
+        self.name = name
+        self.category = category
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+        self.args = args
+        self.start_ns = time.time_ns()
+        self.wall_ns = None
+        self.cpu_ns = None
+        self._perf_ns = time.perf_counter_ns()
+        self._cpu_start_ns = time.thread_time_ns()
+
+    def set(self, **args) -> None:
+        """
+        スパンに情報(出力のバイト数、終了コードなど)を追加する
+        """
+        self.args.update(args)
+
+    def finish(self) -> None:
+        self.wall_ns = time.perf_counter_ns() - self._perf_ns
+        self.cpu_ns = time.thread_time_ns() - self._cpu_start_ns
+
+    def to_json(self) -> dict:
+        return {
+            "id": self.id,
+            "parent": self.parent,
+            "name": self.name,
+            "category": self.category,
+            "start_ns": self.start_ns,
+            "wall_ns": self.wall_ns,
+            "cpu_ns": self.cpu_ns,
+            "pid": self.pid,
+            "tid": self.tid,
+            "args": self.args,
+        }
+
+
+class _NullSpan:
+    # 記録していないときにspan()が返す 何もしない
+    def set(self, **args) -> None:
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    def __init__(self) -> None:
+        """
+        1つのエントリ(モジュール/レシピの実行)で記録したスパンの集まり
+        """
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def to_json(self) -> list:
+        """
+        Returns:
+            list: 終わった順のスパン(dict)のリスト 状態エントリの"trace"に入れる
+        """
+        with self._lock:
+            return [span.to_json() for span in self.spans]
+
+
+@contextlib.contextmanager
+def collect(trace: Trace = None):
+    """
+    このブロックの中(とそこから起動したタスク/copy_contextしたスレッド)のスパンをtraceに記録する
+
+    Args:
+        trace (Trace): 記録先 Noneなら新しく作る
+
+    Returns:
+        Trace: 記録先
+    """
+    if trace is None:
+        trace = Trace()
+    elif _current.get()[0] is trace:
+        # 既に同じ先に記録している場合は、今のスパンの子として続けて記録する
+        yield trace
+        return
+    token = _current.set((trace, None))
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def span(name: str, category: str = "framework", **args):
+    """
+    ブロックの実行時間をスパンとして記録する
+    collectの外では何も記録しない
+
+    Args:
+        name (str): スパン名 (module.run, recipe.step など)
+        category (str): Chrome traceのcat
+        args: スパンに付ける情報
+
+    Returns:
+        Span: setで情報を追加できる
+    """
+    trace, parent = _current.get()
+    if trace is None:
+        yield NULL_SPAN
+        return
+    current = Span(name, category, parent, args)
+    token = _current.set((trace, current.id))
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        _current.reset(token)
+        current.finish()
+        trace.add(current)
+
+
+def get_trace() -> Trace:
+    """
+    Returns:
+        Trace: 今記録している先 記録していなければNone
+    """
+    return _current.get()[0]
+
+
+def bind_context(func):
+    """
+    今のコンテキスト(記録先と親のスパン)でfuncを呼ぶ関数を返す
+    ThreadPoolExecutor.submitはコンテキストを引き継がないので、スレッドで実行するものはこれで包む
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+
+def rusage_to_json(rusage) -> dict:
+    """
+    os.wait4などのrusageを、スパンのargsに入れる形にする
+    """
+    return {
+        "max_rss_kb": rusage.ru_maxrss,
+        "user_seconds": rusage.ru_utime,
+        "system_seconds": rusage.ru_stime,
+    }
+
+
+def to_chrome_trace(traces: dict) -> dict:
+    """
+    Chrome trace(chrome://tracing, Perfetto)のJSONを作る
+
+    Args:
+        traces (dict): エントリのID -> スパン(dict)のリスト
+
+    Returns:
+        dict: {"traceEvents": [...]} json.dumpすればそのまま読み込める
+    """
+    events = []
+    processes = set()
+    for entry_id, spans in traces.items():
+        for span in spans or ():
+            if span.get("wall_ns") is None:
+                continue
+            args = dict(span.get("args") or {})
+            args["entry"] = entry_id
+            args["cpu_ms"] = span["cpu_ns"] / 1e6
+            events.append({
+                "name": span["name"],
+                "cat": span["category"],
+                "ph": "X",
+                "ts": span["start_ns"] / 1000,
+                "dur": span["wall_ns"] / 1000,
+                "pid": span["pid"],
+                "tid": span["tid"],
+                "args": args,
+            })
+            processes.add(span["pid"])
+    for pid in sorted(processes):
+        name = "pyctf" if pid == os.getpid() else f"pyctf worker {pid}"
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": name}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def write_chrome_trace(traces: dict, path: str) -> int:
+    """
+    Returns:
+        int: 書き込んだスパンの数
+    """
+    trace = to_chrome_trace(traces)
+    with open(path, 'w') as f:
+        json.dump(trace, f, default=str)
+    return sum(1 for event in trace["traceEvents"] if event["ph"] == "X")
+
+
+def summarize(spans: list) -> list:
+    """
+    スパンを名前ごとに集計する (profileコマンドの表)
+    wallはそのスパンの合計、selfはそこから直接の子スパンの時間を引いたもの
+
+    Returns:
+        list: {"name", "count", "wall_ms", "self_ms", "cpu_ms", "child_user_ms", "child_system_ms", "max_rss_kb", "bytes"} のリスト(self_msの降順)
+    """
+    spans = [span for span in spans or () if span.get("wall_ns") is not None]
+    children = {}
+    for span in spans:
+        if span["parent"] is not None:
+            # スパンのIDはプロセスごとの連番なので、バッチのワーカのものと区別する
+            parent = (span["pid"], span["parent"])
+            children[parent] = children.get(parent, 0) + span["wall_ns"]
+    rows = {}
+    for span in spans:
+        row = rows.setdefault(span["name"], {
+            "name": span["name"], "count": 0, "wall_ms": 0.0, "self_ms": 0.0, "cpu_ms": 0.0,
+            "child_user_ms": 0.0, "child_system_ms": 0.0, "max_rss_kb": None, "bytes": 0,
+        })
+        args = span.get("args") or {}
+        row["count"] += 1
+        row["wall_ms"] += span["wall_ns"] / 1e6
+        # 並列に動いた子スパンの合計は親より長くなりうる
+        row["self_ms"] += max(0, span["wall_ns"] - children.get((span["pid"], span["id"]), 0)) / 1e6
+        row["cpu_ms"] += span["cpu_ns"] / 1e6
+        rusage = args.get("rusage")
+        if rusage:
+            row["child_user_ms"] += rusage["user_seconds"] * 1000
+            row["child_system_ms"] += rusage["system_seconds"] * 1000
+            row["max_rss_kb"] = max(row["max_rss_kb"] or 0, rusage["max_rss_kb"])
+        row["bytes"] += args.get("bytes") or 0
+    return sorted(rows.values(), key=lambda row: row["self_ms"], reverse=True)
@@ -1,50 +1,140 @@
 import re
 import json
+import shlex
+import functools
 import tempfile
 
 def get_temp_folder():
     return tempfile.mkdtemp()
 
-def find_max_arg_num(input_string):
-    pattern = r'\{input\.(\d+)\}'
-    matches = re.findall(pattern, input_string)
-    numbers = map(int, matches)
-    return max(numbers, default=None)
+TEMPLATE_PATTERN = re.compile(r'\{(.+?)\}')
+INPUT_PATTERN = re.compile(r'\{input\.(\d+)\}')
 
-def replace_template(variables, template):
-    pattern = re.compile(r'\{(.+?)\}')
+class Template:
+    def __init__(self, template: str) -> None:
+        """
+        {var.path}形式のテンプレートをパース済みの形で持つ
+        レンダリング時に正規表現やdictのコピーを使わないようにするため、定義の読み込み時に一度だけ作る
+
+        Args:
+            template (str): テンプレート文字列
+        """
+        self.source = template
+        self.segments = []  # str(そのまま) または パス(tuple)
+        position = 0
+        for match in TEMPLATE_PATTERN.finditer(template):
+            if match.start() > position:
+                self.segments.append(template[position:match.start()])
+            self.segments.append(self._split_path(match.group(1)))
+            position = match.end()
+        if position < len(template):
+            self.segments.append(template[position:])
+        
+        # replace_template_nostrと同じく、全体が{}で囲まれているときだけ値そのものを参照できる
+        if template.startswith("{") and template.endswith("}"):
+            self.reference = self._split_path(template.strip("{}"))
+        else:
+            self.reference = None
+        
+        self.max_input = max(map(int, INPUT_PATTERN.findall(template)), default=None)
+    
+    @staticmethod
+    def _split_path(path: str) -> tuple:
+        # リストの添字に使う場合に備えて数値に変換できるものは先に変換しておく
+        keys = []
+        for key in path.split('.'):
+            try:
+                keys.append((key, int(key)))
+            except ValueError:
+                keys.append((key, None))
+        return tuple(keys)
     
-    def replacer(match):
-        path = match.group(1).split('.')
+    @staticmethod
+    def _lookup(variables, path: tuple):
         value = variables
-        for key in path:
+        for key, index in path:
             if isinstance(value, list):
-                key = int(key)
-                
-            value = value[key]
-        
-        if type(value) == dict or type(value) == list:
-            value = json.dumps(value)
+                value = value[index if index is not None else int(key)]
+            else:
+                value = value[key]
         return value
     
-    return pattern.sub(replacer, template)
-
-def replace_template_nostr(variables: dict, template: str):
-    if not (template.startswith("{") and template.endswith("}")):
-        return None
+    def render(self, variables, quote_input: bool = False) -> str:
+        """
+        テンプレートを展開した文字列を返す
+        dict/listはjsonに変換される
+        
+        Args:
+            quote_input (bool): Trueならinput以下の値をshlex.quoteする (Web UIなど外から来た引数をシェルに渡す場合)
+        """
+        if len(self.segments) == 1 and type(self.segments[0]) is str:
+            return self.segments[0]
         
-    keys = template.strip("{}").split(".")
-    obj = variables.copy()
-    for key in keys:
+        parts = []
+        for segment in self.segments:
+            if type(segment) is str:
+                parts.append(segment)
+                continue
+            value = self._lookup(variables, segment)
+            if type(value) == dict or type(value) == list:
+                value = json.dumps(value, default=str)
+            elif not isinstance(value, str):
+                # 一時ファイルに書き出された出力などはここで読み込まれる
+                value = str(value)
+            if quote_input and segment[0][0] == "input":
+                value = shlex.quote(value)
+            parts.append(value)
+        return "".join(parts)
+    
+    def resolve(self, variables):
+        """
+        テンプレート全体が{var.path}の場合にその値を(文字列に変換せずに)返す
+        そうでない場合や値が存在しない場合はNone
+        """
+        if self.reference is None:
+            return None
         try:
-            if isinstance(obj, list):  # json_objがリストの場合
-                key = int(key) 
-            obj = obj[key]
+            return self._lookup(variables, self.reference)
         except (KeyError, IndexError, TypeError):
-            return None  # キーが存在しない場合はNoneを返す
+            return None
+
+@functools.lru_cache(maxsize=4096)
+def compile_template(template: str) -> Template:
+    return Template(template)
 
+def compile_templates(obj):
+    """
+    jsonの中の文字列を全てTemplateにしたものを返す(構造はそのまま)
+    """
+    if isinstance(obj, dict):
+        return {k: compile_templates(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [compile_templates(x) for x in obj]
+    elif isinstance(obj, str):
+        return compile_template(obj)
     return obj
 
+def find_max_input(templates) -> int:
+    """
+    compile_templatesの結果から、必要な入力の最大の番号({input.N}のN)を求める
+    """
+    if isinstance(templates, dict):
+        templates = templates.values()
+    elif isinstance(templates, Template):
+        return templates.max_input
+    elif not isinstance(templates, list):
+        return None
+    return max((n for n in map(find_max_input, templates) if n is not None), default=None)
+
+def find_max_arg_num(input_string):
+    return compile_template(input_string).max_input
+
+def replace_template(variables, template):
+    return compile_template(template).render(variables)
+
+def replace_template_nostr(variables: dict, template: str):
+    return compile_template(template).resolve(variables)
+
 def filter_object(obj, allowed_types=(str, int, float, bool, list, dict, type(None))):
     """
     任意のオブジェクトからjsonに変換可能なオブジェクトのみを取り出す
@@ -1,5 +1,8 @@
 from .workspace import *
 from .manager import *
+from .store import *
+from .index import *
+from .batch import *
 
 import os
 
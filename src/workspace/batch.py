@@ -0,0 +1,185 @@
+import os
+import glob
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import utils
+import tracing
+from recipe import Recipe
+
+
+def expand_batch_inputs(patterns) -> list:
+    """
+    globのパターン(dir/*, dir/**/*.pcap など)に一致するファイルを重複なく返す
+    ディレクトリは除く
+
+    Args:
+        patterns (str | list): パターン またはそのリスト
+
+    Returns:
+        list: ファイルのパスのリスト(パターンごとにソート済み)
+    """
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    files = {}
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            if os.path.isfile(path):
+                files.setdefault(path, None)
+    return list(files)
+
+
+def run_recipe_in_worker(recipe_name: str, args: list, limits=None) -> dict:
+    """
+    プロセスプールのワーカで1つの入力に対してレシピを実行する
+    引数のテンプレートは親プロセスで展開済みのものを渡す(ワークスペースの状態は送らない)
+    limitsはワークスペースのbudget.limits
+
+    Returns:
+        dict: {"output", "variables", "seconds", "trace"}
+    """
+    start = time.perf_counter()
+    with tracing.collect() as trace:
+        recipe = Recipe(recipe_name, {}, limits)
+        recipe.run(args)
+        output = recipe.get_result()
+    return {
+        "output": output,
+        "variables": recipe.get_variables(),
+        "seconds": time.perf_counter() - start,
+        "trace": trace.to_json(),
+    }
+
+
+class BatchProgress:
+    def __init__(self, total: int) -> None:
+        """
+        バッチ実行の進み具合
+        on_progressに渡され、最後にrun_recipe_batchの戻り値になる
+
+        Args:
+            total (int): 入力ファイル数
+        """
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.started = time.perf_counter()
+        self.finished = None
+        self.files = []  # {"file", "id", "status", "seconds", "error"} のリスト(終わった順)
+
+    @property
+    def completed(self) -> int:
+        return self.done + self.failed + self.cancelled
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished if self.finished is not None else time.perf_counter()) - self.started
+
+    @property
+    def throughput(self) -> float:
+        """
+        Returns:
+            float: 1秒あたりに終わったファイル数
+        """
+        elapsed = self.elapsed
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    def add(self, file: str, id: str, status: str, seconds: float = None, error: str = None) -> dict:
+        entry = {"file": file, "id": id, "status": status, "seconds": seconds, "error": error}
+        self.files.append(entry)
+        if status == "done":
+            self.done += 1
+        elif status == "failed":
+            self.failed += 1
+        else:
+            self.cancelled += 1
+        return entry
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: 件数、全体の時間、スループット、1ファイルあたりの時間(平均/最大)
+        """
+        seconds = [entry["seconds"] for entry in self.files if entry["seconds"] is not None]
+        return {
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "seconds": self.elapsed,
+            "throughput": self.throughput,
+            "mean_seconds": sum(seconds) / len(seconds) if seconds else None,
+            "max_seconds": max(seconds, default=None),
+        }
+
+
+def run_batch(workspace, recipe_name: str, files: list, args: list, max_workers: int = None, on_progress=None) -> BatchProgress:
+    """
+    WorkSpace.run_recipe_batchの本体
+    ファイルごとにレシピのエントリを作り、プロセスプールで実行し、終わった順に結果をワークスペースへ書き込む
+    """
+    states = workspace.get_states()
+    # ワークスペースの結果を参照する引数は、ここで展開してからワーカに送る
+    resolved = []
+    for arg in args:
+        template_arg = utils.replace_template_nostr(states, arg)
+        resolved.append(arg if template_arg is None else template_arg)
+
+    progress = BatchProgress(len(files))
+    ids = {}
+    for file in files:
+        recipe_id = workspace.get_next_recipe_id()
+        with workspace.lock:
+            workspace.recipe_state[recipe_id] = {
+                    "name"   : recipe_name,
+                    "args"   : [file, *args],
+                    "running": True,
+                    "status" : "pending",
+                    "output" : []
+                }
+        ids[file] = recipe_id
+
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+    futures = {}
+    try:
+        for file in files:
+            futures[executor.submit(run_recipe_in_worker, recipe_name, [file, *resolved], workspace.budget.limits)] = file
+        for future in as_completed(futures):
+            file = futures[future]
+            recipe_id = ids[file]
+            state = workspace.recipe_state[recipe_id]
+            try:
+                result = future.result()
+            except Exception as e:
+                with workspace.lock:
+                    state["status"] = "failed"
+                    state["error"] = str(e)
+                    state["running"] = False
+                    workspace._finish("recipe", recipe_id)
+                entry = progress.add(file, recipe_id, "failed", error=str(e))
+            else:
+                with workspace.lock:
+                    state["status"] = "done"
+                    state["output"] = result["output"]
+                    state["variables"] = result["variables"]
+                    state["trace"] = result["trace"]
+                    state["running"] = False
+                    workspace._finish("recipe", recipe_id)
+                entry = progress.add(file, recipe_id, "done", result["seconds"])
+            if on_progress is not None:
+                on_progress(progress, entry)
+    finally:
+        # Ctrl+Cなどで中断された場合は、まだ始まっていないファイルを実行しない
+        executor.shutdown(wait=True, cancel_futures=True)
+        for file, recipe_id in ids.items():
+            state = workspace.recipe_state[recipe_id]
+            if state["running"]:
+                with workspace.lock:
+                    state["status"] = "cancelled"
+                    state["running"] = False
+                    workspace._finish("recipe", recipe_id)
+                progress.add(file, recipe_id, "cancelled")
+        progress.finished = time.perf_counter()
+    return progress
+
@@ -0,0 +1,212 @@
+import re
+import sqlite3
+import threading
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+from blob import BlobView
+
+# これより大きい出力は索引を作らずに検索のたびに走査する
+INDEX_MAX_CHARS = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_entries (
+    entry_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS search_docs (
+    doc      INTEGER PRIMARY KEY AUTOINCREMENT,
+    entry_id TEXT NOT NULL,
+    path     TEXT NOT NULL,
+    indexed  INTEGER NOT NULL,
+    trigrams BLOB
+);
+"""
+
+
+def iter_documents(value, path: str = "output"):
+    """
+    結果の中の文字列(とblob)を、その場所を表すパス(output.0.nameなど)と一緒に列挙する
+    """
+    if isinstance(value, (str, BlobView)):
+        yield path, value
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            yield from iter_documents(item, f"{path}.{index}")
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            yield from iter_documents(item, f"{path}.{key}")
+
+
+def get_trigrams(text: str) -> set:
+    # 大文字小文字を区別しない検索にも使えるように小文字にしてから作る
+    text = text.lower()
+    return set(map("".join, zip(text, text[1:], text[2:])))
+
+
+def extract_literals(pattern: str, flags: int = 0) -> list:
+    """
+    正規表現にマッチする文字列が必ず含む部分文字列を取り出す
+
+    Returns:
+        list: 部分文字列のリスト
+    """
+    return _required_literals(sre_parse.parse(pattern, flags))
+
+
+def _required_literals(items) -> list:
+    literals = []
+    current = []
+
+    def flush():
+        if current:
+            literals.append("".join(current))
+            current.clear()
+
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            current.append(chr(av))
+        elif op is sre_parse.AT:
+            # ^や\bなどは幅が無いので前後の文字列はつながったまま
+            continue
+        elif op is sre_parse.SUBPATTERN:
+            flush()
+            literals.extend(_required_literals(av[-1]))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            flush()
+            if av[0] >= 1:
+                literals.extend(_required_literals(av[2]))
+        else:
+            # 選択や文字クラスなど、必ず含まれる文字が決まらないもの
+            flush()
+    flush()
+    return literals
+
+
+class TrigramIndex:
+    def __init__(self, conn: sqlite3.Connection = None, lock: threading.Lock = None) -> None:
+        """
+        ワークスペースの結果の文字列に対するtrigram索引
+        文字列ごとのtrigramの集合をSQLiteのテーブルに追記していき(ワークスペースのストアと同じファイル)、
+        最初の検索のときにメモリ上の転置索引(trigram -> 文字列の番号)を作る
+        INDEX_MAX_CHARSを超える文字列とblobは索引を作らず、検索のたびに走査する
+
+        Args:
+            conn (sqlite3.Connection): 索引を置くDB Noneならメモリ上に作る
+            lock (threading.Lock): connを共有する場合のロック
+        """
+        self._conn = conn if conn is not None else sqlite3.connect(":memory:", check_same_thread=False)
+        self._lock = lock if lock is not None else threading.Lock()
+        self._postings = None  # trigram -> 文字列の番号のリスト (読み込むまではNone)
+        self._docs = {}        # 文字列の番号 -> (ID, パス)
+        self._unindexed = []   # 索引を作っていない文字列の番号
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+            if self._conn.execute("SELECT 1 FROM search_docs LIMIT 1").fetchone() is None:
+                # 空の索引ならメモリ上の転置索引も最初から作っていく
+                self._postings = {}
+
+    def indexed_entries(self) -> set:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT entry_id FROM search_entries")}
+
+    def add(self, entry_id: str, output) -> None:
+        """
+        終わったモジュール/レシピ/コマンドの結果を索引に追加する(追加済みなら何もしない)
+        """
+        documents = []
+        for path, value in iter_documents(output):
+            indexed = isinstance(value, str) and len(value) <= INDEX_MAX_CHARS
+            documents.append((path, indexed, get_trigrams(value) if indexed else None))
+
+        with self._lock, self._conn:
+            if self._conn.execute("SELECT 1 FROM search_entries WHERE entry_id = ?", (entry_id,)).fetchone():
+                return
+            self._conn.execute("INSERT INTO search_entries VALUES (?)", (entry_id,))
+            for path, indexed, trigrams in documents:
+                doc = self._conn.execute(
+                    "INSERT INTO search_docs (entry_id, path, indexed, trigrams) VALUES (?, ?, ?, ?)",
+                    (entry_id, path, int(indexed), "".join(trigrams).encode("utf-8", "surrogatepass") if indexed else None),
+                ).lastrowid
+                if self._postings is not None:
+                    self._add_doc(doc, entry_id, path, trigrams)
+
+    def candidates(self, pattern: str, flags: int = 0) -> list:
+        """
+        パターンにマッチする可能性のある文字列を返す
+
+        Returns:
+            list: (ID, パス) のリスト
+        """
+        trigrams = set()
+        for literal in extract_literals(pattern, flags):
+            trigrams |= get_trigrams(literal)
+
+        with self._lock:
+            self._load()
+            if not trigrams:
+                return [self._docs[doc] for doc in sorted(self._docs)]
+
+            docs = None
+            # 出現する文字列が少ないtrigramから絞り込む
+            for trigram in sorted(trigrams, key=lambda trigram: len(self._postings.get(trigram, ()))):
+                found = self._postings.get(trigram, ())
+                docs = set(found) if docs is None else docs.intersection(found)
+                if not docs:
+                    break
+            docs.update(self._unindexed)
+        return [self._docs[doc] for doc in sorted(docs)]
+
+    def _load(self) -> None:
+        if self._postings is not None:
+            return
+        self._postings = {}
+        for doc, entry_id, path, trigrams in self._conn.execute("SELECT doc, entry_id, path, trigrams FROM search_docs"):
+            if trigrams is not None:
+                trigrams = trigrams.decode("utf-8", "surrogatepass")
+                trigrams = [trigrams[i:i + 3] for i in range(0, len(trigrams), 3)]
+            self._add_doc(doc, entry_id, path, trigrams)
+
+    def _add_doc(self, doc: int, entry_id: str, path: str, trigrams) -> None:
+        self._docs[doc] = (entry_id, path)
+        if trigrams is None:
+            self._unindexed.append(doc)
+            return
+        postings = self._postings
+        for trigram in trigrams:
+            if trigram in postings:
+                postings[trigram].append(doc)
+            else:
+                postings[trigram] = [doc]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def search_text(value, regex: re.Pattern, limit: int) -> list:
+    """
+    文字列またはblobの中でregexにマッチする箇所を返す
+    blobはmmapのまま検索し、オフセットはバイト単位になる
+
+    Returns:
+        list: (オフセット, マッチした文字列, マッチした行) のリスト
+    """
+    matches = []
+    if isinstance(value, BlobView):
+        pattern = re.compile(regex.pattern.encode(), regex.flags & ~re.UNICODE)
+        for match in value.search(pattern):
+            if len(matches) >= limit:
+                break
+            matches.append((match.start(), match.group().decode(errors="replace"), value.line_at(match.start())))
+        return matches
+
+    for match in regex.finditer(value):
+        if len(matches) >= limit:
+            break
+        start = value.rfind("\n", 0, match.start()) + 1
+        end = value.find("\n", match.start())
+        matches.append((match.start(), match.group(), value[start:end if end != -1 else len(value)]))
+    return matches
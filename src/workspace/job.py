@@ -0,0 +1,203 @@
+import asyncio
+import weakref
+import contextlib
+
+from module import ResourceLimits, parse_size
+
+# プロセス全体で同時に実行するジョブ数の上限
+max_concurrent_jobs = 16
+
+_semaphores = weakref.WeakKeyDictionary()
+
+def set_max_concurrent_jobs(limit: int) -> None:
+    """
+    同時実行数の上限を変更する
+    既に待機中のジョブには反映されない
+
+    Args:
+        limit (int): 上限
+    """
+    global max_concurrent_jobs
+    max_concurrent_jobs = limit
+    _semaphores.clear()
+
+def _get_semaphore() -> asyncio.Semaphore:
+    # Semaphoreはイベントループごとに作る
+    loop = asyncio.get_running_loop()
+    if loop not in _semaphores:
+        _semaphores[loop] = asyncio.Semaphore(max_concurrent_jobs)
+    return _semaphores[loop]
+
+
+class ResourceBudget:
+    def __init__(self, max_jobs: int = None, memory=None, limits: ResourceLimits = None) -> None:
+        """
+        WorkSpace全体で使う資源の上限
+        ジョブは同時実行数とメモリの予約がこの上限に収まるまで待ってから実行される
+        
+        Args:
+            max_jobs (int): このWorkSpaceで同時に実行するジョブ数の上限 Noneなら無制限(max_concurrent_jobsのみ)
+            memory (int | str): 同時に実行するジョブが予約するメモリ(モジュールのlimits.memory)の合計の上限
+            limits (ResourceLimits): 各モジュールのlimitsの上限 これより緩い(または無い)指定は切り詰める
+        """
+        self.max_jobs = max_jobs
+        self.memory = parse_size(memory)
+        self.limits = limits if limits is not None else ResourceLimits()
+        self.running = 0
+        self.reserved = 0
+        self._waiters = []
+    
+    @classmethod
+    def from_json(cls, budget: dict) -> "ResourceBudget":
+        return cls(budget.get("max_jobs"), budget.get("memory"), ResourceLimits.from_json(budget.get("limits")))
+    
+    def to_json(self) -> dict:
+        return {"max_jobs": self.max_jobs, "memory": self.memory, "limits": self.limits.to_json()}
+    
+    def __getstate__(self) -> dict:
+        # 実行中の予約と待っているジョブは保存しない
+        return self.to_json()
+    
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["max_jobs"], state["memory"], ResourceLimits.from_json(state["limits"]))
+    
+    def _fits(self, memory: int) -> bool:
+        if self.max_jobs is not None and self.running >= self.max_jobs:
+            return False
+        return self.memory is None or self.reserved + memory <= self.memory
+    
+    @contextlib.asynccontextmanager
+    async def reserve(self, memory: int = None):
+        """
+        ジョブ1つ分とmemoryバイトを予約し、抜けるときに返す
+        """
+        memory = memory or 0
+        if self.memory is not None and memory > self.memory:
+            raise ValueError(f"Error: {memory} bytes of memory exceeds the workspace budget ({self.memory} bytes).")
+        while not self._fits(memory):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                self._waiters.remove(waiter)
+        self.running += 1
+        self.reserved += memory
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self.reserved -= memory
+            # 返した分で実行できるようになったジョブを起こす (収まらなければまた待つ)
+            for waiter in self._waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+
+class Job:
+    def __init__(self, job_id: str, coro, timeout: float = None, on_status=None, budget: ResourceBudget = None, memory: int = None) -> None:
+        """
+        Args:
+            job_id (str): ジョブID(モジュールID/レシピID/コマンドID)
+            coro (coroutine): 実行するコルーチン
+            timeout (float): タイムアウト秒数 Noneなら無制限
+            on_status (callable): 状態が変わるたびにJobを引数に呼ばれる
+            budget (ResourceBudget): 実行前に予約するWorkSpaceの資源 Noneなら予約しない
+            memory (int): budgetから予約するメモリのバイト数
+        """
+        self.job_id = job_id
+        self.timeout = timeout
+        self.budget = budget
+        self.memory = memory
+        self.status = "pending"
+        self.result = None
+        self.error = None
+        self._on_status = on_status
+        self._coro = coro
+        self.task = asyncio.ensure_future(self._run())
+        # 誰もawaitしなかった場合の警告を抑える
+        self.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    async def _run(self) -> object:
+        started = False
+        try:
+            reservation = self.budget.reserve(self.memory) if self.budget is not None else contextlib.nullcontext()
+            async with reservation, _get_semaphore():
+                self._set_status("running")
+                started = True
+                self.result = await asyncio.wait_for(self._coro, self.timeout)
+        except asyncio.CancelledError:
+            self._set_status("cancelled")
+            raise
+        except asyncio.TimeoutError:
+            self.error = TimeoutError(f"job_id: {self.job_id} timed out after {self.timeout} seconds")
+            self._set_status("failed")
+            raise self.error
+        except Exception as e:
+            self.error = e
+            self._set_status("failed")
+            raise
+        finally:
+            if not started:
+                # セマフォ待ちの間にキャンセルされた
+                self._coro.close()
+        self._set_status("done")
+        return self.result
+
+    def _set_status(self, status: str) -> None:
+        self.status = status
+        if self._on_status is not None:
+            self._on_status(self)
+
+    def cancel(self) -> bool:
+        return self.task.cancel()
+
+    def done(self) -> bool:
+        return self.task.done()
+
+    def __await__(self):
+        return self.task.__await__()
+
+
+class JobTable:
+    def __init__(self, budget: ResourceBudget = None) -> None:
+        """
+        WorkSpace内で非同期実行中/実行済みのジョブの一覧
+
+        Args:
+            budget (ResourceBudget): 全てのジョブが実行前に予約するWorkSpaceの資源
+        """
+        self.jobs = {}
+        self.budget = budget
+
+    def submit(self, job_id: str, coro, timeout: float = None, on_status=None, memory: int = None) -> Job:
+        """
+        ジョブを登録して実行を開始する
+        イベントループの中から呼ぶこと
+
+        Args:
+            memory (int): budgetから予約するメモリのバイト数
+
+        Returns:
+            Job: awaitすると結果が返る
+        """
+        job = Job(job_id, coro, timeout=timeout, on_status=on_status, budget=self.budget, memory=memory)
+        self.jobs[job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Job:
+        if job_id not in self.jobs:
+            raise KeyError("job_id: {} not found".format(job_id))
+        return self.jobs[job_id]
+
+    def status(self, job_id: str) -> str:
+        return self.get(job_id).status
+
+    def cancel(self, job_id: str) -> bool:
+        return self.get(job_id).cancel()
+
+    async def wait(self, job_id: str) -> object:
+        return await self.get(job_id)
+
+    def running(self) -> list:
+        return [job_id for job_id, job in self.jobs.items() if not job.done()]
@@ -1,9 +1,15 @@
+import json
 import pickle
 import utils
+import tracing
 import os
 from .workspace import WorkSpace
+from .job import ResourceBudget
+from .store import WorkspaceStore
 
 WORKSPACE_DIR = "workspace"
+# Pickle(プロトコル2以降)のファイルはこのバイトで始まる
+PICKLE_MAGIC = b"\x80"
 
 def create_workspace(workspace_name: str) -> WorkSpace:
     """
@@ -19,28 +25,122 @@ def create_workspace(workspace_name: str) -> WorkSpace:
 
 def load_workspace(workspace_path: str) -> WorkSpace:
     """
-    json形式のworkspaceを読み込む
+    SQLite形式のworkspaceを読み込む
+    読み込むのは各結果のメタデータだけで、結果本体(output)は参照されたときに読み込まれる
+    読み込んだworkspaceはそのファイルに結果を追記していく
 
     Args:
-        workspace_path (str): _description_
+        workspace_path (str): WORKSPACE_DIRからのWorkSpaceファイルパス
 
     Returns:
         WorkSpace: WorkSpace
     """
-    pass
-
-def save_workspace(workspace: WorkSpace,workspace_path: str) -> int:
+    if is_legacy_workspace(workspace_path):
+        raise ValueError(f"Error: {workspace_path} is a workspace saved in the old pickle format. Load it from the CLI to convert it.")
+    with tracing.collect() as trace, tracing.span("workspace.load", path=workspace_path) as span:
+        store = WorkspaceStore(os.path.join(WORKSPACE_DIR, workspace_path), create=False)
+        meta = store.read_meta()
+        workspace = WorkSpace(
+            workspace_name=meta.get("workspace_name", workspace_path),
+            workspace_id=meta.get("workspace_id"),
+            budget=ResourceBudget.from_json(meta["budget"]) if "budget" in meta else None,
+        )
+        workspace.variables = meta.get("variables", {})
+        states = {"module": workspace.module_state, "recipe": workspace.recipe_state, "cmd": workspace.cmd_state}
+        for kind, id, state in store.load_entries():
+            states[kind][id] = state
+        workspace.store = store
+        span.set(entries=sum(len(state) for state in states.values()))
+    workspace.trace = trace
+    return workspace
+
+def save_workspace(workspace: WorkSpace, workspace_path: str) -> int:
     """
-    json形式のworkspaceを保存する
+    SQLite形式のworkspaceを保存する
     モジュールなどの内部状態は破棄され結果のみが残る
+    前回の保存(または読み込み)以降に終わった結果だけを書き込み、以降は終わった結果をその都度追記する
 
     Args:
-        workspace_path (str): WorkSpaceファイルパス
+        workspace (WorkSpace): WorkSpaceインスタンス
+        workspace_path (str): WORKSPACE_DIRからのWorkSpaceファイルパス
 
     Returns:
-        int: 未定
+        int: 書き込んだ結果の数
+    """
+    path = os.path.join(WORKSPACE_DIR, workspace_path)
+    with tracing.collect(workspace.trace), tracing.span("workspace.save", path=workspace_path):
+        if workspace.store is None or os.path.abspath(workspace.store.path) != os.path.abspath(path):
+            workspace.attach_store(WorkspaceStore(path))
+        return workspace.flush()
+
+def is_legacy_workspace(workspace_path: str) -> bool:
+    """
+    SQLite形式になる前の、Pickleで保存されたworkspaceか
+    """
+    try:
+        with open(os.path.join(WORKSPACE_DIR, workspace_path), "rb") as f:
+            return f.read(1) == PICKLE_MAGIC
+    except (FileNotFoundError, IsADirectoryError):
+        return False
+
+def migrate_workspace(workspace_path: str) -> str:
+    """
+    Pickleで保存されたworkspaceをSQLite形式で保存し直す
+    load_workspace_unsafeで読み込むので、信頼できないソースからのWorkspaceには使わないでください。
+    元のファイルは<workspace_path>.pickleとして残す
+
+    Args:
+        workspace_path (str): WORKSPACE_DIRからのWorkSpaceファイルパス
+
+    Returns:
+        str: 元のファイルを移したパス
+    """
+    workspace = load_workspace_unsafe(workspace_path)
+    # 以前は結果を取得するまでoutputが空だったので、保存する前に取得しておく
+    for states in (workspace.module_state, workspace.recipe_state, workspace.cmd_state):
+        for id, state in states.items():
+            state["running"] = False
+            state.setdefault("status", "done")
+            if not state.get("output"):
+                state["output"] = get_legacy_output(state)
+            if "name" not in state:
+                execution = state.get("module") or state.get("recipe")
+                state["name"] = getattr(execution, "module_name", None) or getattr(execution, "recipe_name", None)
+    path = os.path.join(WORKSPACE_DIR, workspace_path)
+    backup = path + ".pickle"
+    os.replace(path, backup)
+    try:
+        save_workspace(workspace, workspace_path)
+    except BaseException:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        os.replace(backup, path)
+        raise
+    finally:
+        workspace.close()
+    return backup
+
+def get_legacy_output(state: dict) -> object:
+    """
+    Pickleで保存されたエントリのモジュール/レシピから結果を取り出す
     """
-    pass
+    execution = state.get("module") or state.get("recipe")
+    variables = getattr(execution, "variables", None) or {}
+    if "output" in variables:
+        return variables["output"]
+    recipe_json = getattr(execution, "recipe_json", None)
+    if recipe_json is not None:
+        return [utils.replace_template_nostr(variables, arg) for arg in recipe_json.get("output", [])]
+    stdout = getattr(getattr(execution, "shell", None), "stdout", None)
+    if isinstance(stdout, bytes):
+        stdout = stdout.decode(errors="replace")
+    if not isinstance(stdout, str):
+        return []
+    try:
+        return json.loads(stdout)
+    except ValueError:
+        return [stdout]
 
 def load_workspace_unsafe(workspace_path: str) -> WorkSpace:
     """
@@ -0,0 +1,205 @@
+import os
+import json
+import base64
+import time
+import sqlite3
+import threading
+
+from blob import BlobView, blob_store
+from .index import TrigramIndex
+
+SCHEMA_VERSION = 1
+
+# 状態エントリのうち、ストアから必要になったときに読み込むもの(大きくなりうるもの)
+PAYLOAD_KEYS = ("args", "cmd", "output", "variables", "trace")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    seq      INTEGER PRIMARY KEY AUTOINCREMENT,
+    id       TEXT UNIQUE NOT NULL,
+    kind     TEXT NOT NULL,
+    name     TEXT,
+    status   TEXT NOT NULL,
+    error    TEXT,
+    finished REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS payloads (
+    id    TEXT NOT NULL,
+    key   TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (id, key)
+);
+"""
+
+
+class WorkspaceStore:
+    def __init__(self, path: str, create: bool = True) -> None:
+        """
+        ワークスペースを保存するSQLiteファイル
+        終わったモジュール/レシピ/コマンドの結果を1件ずつ追記していく
+        メタデータ(entries)と結果本体(payloads)を分けてあるので、読み込み時は本体を必要になるまで読まない
+
+        Args:
+            path (str): ファイルのパス
+            create (bool): Falseならファイルが無いときにFileNotFoundErrorを投げる
+        """
+        if not create and not os.path.isfile(path):
+            raise FileNotFoundError(f"Error: {path} is not found.")
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        try:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            with self._conn:
+                self._conn.executescript(SCHEMA)
+                self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+        except sqlite3.DatabaseError:
+            self._conn.close()
+            raise ValueError(f"Error: {path} is not a workspace file.")
+
+    def write_meta(self, meta: dict) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                [(key, json.dumps(value, default=str)) for key, value in meta.items()],
+            )
+
+    def read_meta(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM meta WHERE key != 'schema_version'").fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def append(self, entries: list) -> None:
+        """
+        終わったエントリをまとめて書き込む(同じIDなら上書き)
+
+        Args:
+            entries (list): (kind, id, 状態エントリ) のリスト
+        """
+        with self._lock, self._conn:
+            for kind, entry_id, state in entries:
+                self._conn.execute(
+                    "INSERT INTO entries (id, kind, name, status, error, finished) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (id) DO UPDATE SET status = excluded.status, error = excluded.error, finished = excluded.finished",
+                    (
+                        entry_id,
+                        kind,
+                        state.get("name"),
+                        state.get("status", "done"),
+                        state.get("error"),
+                        time.time(),
+                    ),
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO payloads VALUES (?, ?, ?)",
+                    [
+                        (entry_id, key, json.dumps(state[key], default=encode_payload, ensure_ascii=False))
+                        for key in PAYLOAD_KEYS if key in state
+                    ],
+                )
+
+    def load_entries(self) -> list:
+        """
+        結果本体を除いたエントリの一覧を保存順に返す
+
+        Returns:
+            list: (kind, id, 状態エントリ) のリスト
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, id, name, status, error, (SELECT group_concat(key) FROM payloads WHERE payloads.id = entries.id) "
+                "FROM entries ORDER BY seq"
+            ).fetchall()
+        entries = []
+        for kind, entry_id, name, status, error, payload_keys in rows:
+            payload_keys = set(payload_keys.split(",")) if payload_keys else set()
+            state = StoredEntry(self, entry_id, payload_keys, running=False, status=status)
+            if name is not None:
+                state["name"] = name
+            if error is not None:
+                state["error"] = error
+            entries.append((kind, entry_id, state))
+        return entries
+
+    def load_payload(self, entry_id: str, key: str) -> object:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM payloads WHERE id = ? AND key = ?", (entry_id, key)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0], object_hook=decode_payload)
+
+    def open_index(self) -> TrigramIndex:
+        """
+        このファイルに置かれた全文検索の索引
+        """
+        return TrigramIndex(self._conn, self._lock)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def encode_payload(obj) -> object:
+    # blobは中身ではなくダイジェストだけを保存する
+    if isinstance(obj, BlobView):
+        return {"$blob": obj.digest, "size": obj.size}
+    # built-inモジュールの結果はbytesのこともある (str()すると読み込んだときに"b'...'"になる)
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return {"$bytes": base64.b64encode(obj).decode()}
+    raise TypeError(f"Error: {type(obj).__name__} cannot be saved in a workspace.")
+
+
+def decode_payload(obj: dict) -> object:
+    if "$blob" in obj and len(obj) == 2 and "size" in obj:
+        return blob_store.get(obj["$blob"])
+    if "$bytes" in obj and len(obj) == 1:
+        return base64.b64decode(obj["$bytes"])
+    return obj
+
+
+class StoredEntry(dict):
+    def __init__(self, store: WorkspaceStore, entry_id: str, payload_keys: set, **fields) -> None:
+        """
+        ストアから読み込んだ状態エントリ
+        args/cmd/output/variables/traceは最初にアクセスされたときにストアから読み込む
+
+        Args:
+            payload_keys (set): ストアに保存されているargs/cmd/output/variables/traceのキー
+        """
+        super().__init__(**fields)
+        self._store = store
+        self._entry_id = entry_id
+        self._payload_keys = payload_keys
+
+    def __missing__(self, key):
+        if key not in self._payload_keys:
+            raise KeyError(key)
+        value = self._store.load_payload(self._entry_id, key)
+        self[key] = value
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key) -> bool:
+        return super().__contains__(key) or key in self._payload_keys
+
+    def load(self) -> None:
+        """
+        まだ読み込んでいないargs/cmd/output/variables/traceを全て読み込む
+        """
+        for key in self._payload_keys:
+            self[key]
+
+    def __reduce__(self):
+        # pickleするときは全て読み込んだ普通のdictにする
+        self.load()
+        return (dict, (dict(self),))
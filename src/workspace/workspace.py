@@ -1,26 +1,133 @@
 import utils
-from module import Module
+import tracing
+from module import Module, result_cache
 from recipe import Recipe
 import uuid
+import subprocess
+import asyncio
+import re
+import threading
 from dataclasses import dataclass
+from .job import JobTable, ResourceBudget
+from .store import WorkspaceStore, StoredEntry
+from .index import TrigramIndex, search_text
+from .batch import BatchProgress, expand_batch_inputs, run_batch
 
 class WorkSpace:
     def __init__(self,
-                module_state = {}, # モジュール ID(連番とか) 実行状態 モジュールは実行後に破棄してoutputだけ保持しておくべき
-                recipe_state = {}, # レシピ ID(連番とか) 実行状態 レシピは実行後に破棄してoutputだけ保持しておくべき
-                cmd_state = {},
+                module_state = None, # モジュール ID(連番とか) 実行状態 モジュールは実行後に破棄してoutputだけ保持しておくべき
+                recipe_state = None, # レシピ ID(連番とか) 実行状態 レシピは実行後に破棄してoutputだけ保持しておくべき
+                cmd_state = None,
                 workspace_name = "default_workspace",
-                workspace_id = "workspace-" + str(uuid.uuid4()),
+                workspace_id = None,
+                budget = None, # WorkSpace全体の資源の上限(ResourceBudget)
                 #workspace_path = "./default_workspace.json",
                 ) -> None:
-        self.module_state = module_state
-        self.recipe_state = recipe_state
-        self.cmd_state = cmd_state
+        # デフォルト引数を共有しないようにここで作る
+        self.module_state = module_state if module_state is not None else {}
+        self.recipe_state = recipe_state if recipe_state is not None else {}
+        self.cmd_state = cmd_state if cmd_state is not None else {}
         self.workspace_name = workspace_name
-        self.workspace_id = workspace_id
+        self.workspace_id = workspace_id if workspace_id is not None else "workspace-" + str(uuid.uuid4())
         #self.workspace_path = workspace_path
         
         self.variables = {}
+        self.budget = budget if budget is not None else ResourceBudget()
+        self.jobs = JobTable(self.budget)
+        # 保存先のストア(save_workspace/load_workspaceで設定される)と、まだストアに書いていない終わったエントリ
+        self.store = None
+        self.unsaved = {}  # ID -> kind
+        # 結果の全文検索用の索引(必要になったときに作る)
+        self.index = None
+        # 保存/読み込みなど、エントリに属さない処理のスパン (保存しない)
+        self.trace = tracing.Trace()
+        # 複数のクライアント(Web UI)やスレッドから使うときにmodule_state/recipe_state/cmd_stateを守る
+        self.lock = threading.RLock()
+        # 非同期実行のエントリの状態が変わるたびに(kind, id, state)を引数に呼ばれる
+        self.listeners = []
+        
+    def __getstate__(self) -> dict:
+        # 実行中のタスクとストアの接続はpickleできないので保存しない
+        state = self.__dict__.copy()
+        del state["jobs"]
+        del state["store"]
+        del state["unsaved"]
+        del state["index"]
+        del state["trace"]
+        del state["lock"]
+        del state["listeners"]
+        return state
+    
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        # 上限を持たない古いpickleは無制限にする
+        self.budget = state.get("budget") or ResourceBudget()
+        self.jobs = JobTable(self.budget)
+        self.store = None
+        self.unsaved = {}
+        self.index = None
+        self.trace = tracing.Trace()
+        self.lock = threading.RLock()
+        self.listeners = []
+    
+    def attach_store(self, store: WorkspaceStore) -> None:
+        """
+        保存先のストアを設定する
+        別のストアに切り替えた場合は、終わっている全てのエントリを次のflushで書き込む
+        """
+        with self.lock:
+            self._attach_store(store)
+    
+    def _attach_store(self, store: WorkspaceStore) -> None:
+        if self.store is store:
+            return
+        for kind, states in (("module", self.module_state), ("recipe", self.recipe_state), ("cmd", self.cmd_state)):
+            for id, state in states.items():
+                if state.get("running"):
+                    continue
+                if isinstance(state, StoredEntry):
+                    # 前のストアを閉じる前に結果を読み込んでおく
+                    state.load()
+                self.unsaved[id] = kind
+        if self.store is not None:
+            self.store.close()
+        elif self.index is not None:
+            self.index.close()
+        self.store = store
+        # 索引はストアのファイルに作り直す
+        self.index = None
+    
+    def flush(self) -> int:
+        """
+        まだストアに書いていない終わったエントリとメタデータを書き込む
+        
+        Returns:
+            int: 書き込んだエントリ数
+        """
+        with self.lock:
+            return self._flush()
+    
+    def _flush(self) -> int:
+        states = {"module": self.module_state, "recipe": self.recipe_state, "cmd": self.cmd_state}
+        entries = [(kind, id, states[kind][id]) for id, kind in self.unsaved.items() if id in states[kind]]
+        with tracing.collect(self.trace), tracing.span("workspace.flush", entries=len(entries)):
+            self.store.write_meta({
+                "workspace_name": self.workspace_name,
+                "workspace_id": self.workspace_id,
+                "variables": self.variables,
+                "budget": self.budget.to_json(),
+            })
+            self.store.append(entries)
+        self.unsaved = {}
+        return len(entries)
+    
+    def close(self) -> None:
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+        elif self.index is not None:
+            self.index.close()
+        self.index = None
         
     def run_module(self, module_name: str, args: list) -> str:
         """
@@ -33,21 +140,65 @@ class WorkSpace:
         Returns:
             str: モジュール実行id
         """
-        module = Module(module_name, dict(**self.module_state, **self.recipe_state))
-        module.run(args)
+        with tracing.collect() as trace:
+            module = Module(module_name, self.get_states(), self.budget.limits)
+            module.run(args)
         module_id = self.get_next_module_id()
-        self.module_state[module_id] = {
-                "module" : module,
-                "running": False, # syncなのでFalse
-                "output" : []
-            }
+        with self.lock:
+            self.module_state[module_id] = {
+                    "module" : module,
+                    "name"   : module_name,
+                    "args"   : args,
+                    "running": False, # syncなのでFalse
+                    "status" : "done",
+                    "output" : [],
+                    "trace"  : trace,
+                }
+        self._finish("module", module_id)
         
         return module_id
         
     
-    async def run_module_async(self, module_name, args) -> int:
-        #クリティカルセクションには気を付けよう！
-        pass
+    async def run_module_async(self, module_name: str, args: list, timeout: float = None, on_output=None, quote_input: bool = False) -> str:
+        """
+        モジュールの非同期実行
+        実行の完了は待たずにIDを返す 結果はwait_moduleで待つ
+        
+        Args:
+            module_name (str): モジュール名
+            args (list): モジュールの引数
+            timeout (float): タイムアウト秒数 Noneなら無制限
+            on_output (callable): stdoutを受け取るたびにそのbytesを引数に呼ばれる
+            quote_input (bool): Trueなら引数をクォートしてコマンドに埋め込む (引数が信頼できない場合)
+
+        Returns:
+            str: モジュール実行id
+        """
+        # ジョブのタスクはsubmitしたときのコンテキストを引き継ぐので、スパンはtraceに記録される
+        with tracing.collect() as trace:
+            module = Module(module_name, self.get_states(), self.budget.limits, quote_input)
+            module_id = self.get_next_module_id()
+            with self.lock:
+                self.module_state[module_id] = {
+                        "module" : module,
+                        "name"   : module_name,
+                        "args"   : args,
+                        "running": True,
+                        "status" : "pending",
+                        "output" : [],
+                        "trace"  : trace,
+                    }
+            self.jobs.submit(module_id, module.run_async(args, on_output), timeout=timeout, on_status=self._update_state("module", module_id), memory=module.limits.memory)
+        
+        return module_id
+    
+    async def wait_module(self, id: str) -> object:
+        """
+        非同期実行したモジュールの完了を待って結果を返す
+        失敗/キャンセルされた場合はその例外を投げる
+        """
+        await self.jobs.wait(id)
+        return self.get_module_result(id)
     
     def get_module_result(self, id: str) -> object:
         """
@@ -65,10 +216,12 @@ class WorkSpace:
         # todo raiseするのは違うよね
         if self.module_state[id]["running"]:
             raise RuntimeError("module_id: {} is running".format(id))
+        if self.module_state[id].get("status") in ("failed", "cancelled"):
+            raise RuntimeError("module_id: {} is {}".format(id, self.module_state[id]["status"]))
         
-        self.module_state[id]["output"] = self.module_state[id]["module"].get_result()
-        
-        # del self.module_state[id]["module"] # モジュールは実行後に破棄 todo 後で確認
+        if "module" in self.module_state[id]:
+            # 古いpickleから読み込んだワークスペースにはモジュールが残っている
+            self.module_state[id]["output"] = self.module_state[id]["module"].get_result()
         
         return self.module_state[id]["output"]
     
@@ -83,19 +236,73 @@ class WorkSpace:
         return Module.get_module_info(modulename)
             
     def run_recipe(self, recipe_name: str, args: list) -> str:
-        recipe = Recipe(recipe_name, dict(**self.module_state, **self.recipe_state))
-        recipe_id = self.get_next_recipe_id()
-        recipe.run(args)
-        self.recipe_state[recipe_id]={
-                "recipe" : recipe,
-                "running": False,
-                "output" : []
-            }
+        with tracing.collect() as trace:
+            recipe = Recipe(recipe_name, self.get_states(), self.budget.limits)
+            recipe_id = self.get_next_recipe_id()
+            recipe.run(args)
+        with self.lock:
+            self.recipe_state[recipe_id]={
+                    "recipe" : recipe,
+                    "name"   : recipe_name,
+                    "args"   : args,
+                    "running": False,
+                    "status" : "done",
+                    "output" : [],
+                    "trace"  : trace,
+                }
+        self._finish("recipe", recipe_id)
         
         return recipe_id
     
-    async def run_recipe_async(self, recipe_name, args) -> int:
-        pass
+    def run_recipe_batch(self, recipe_name: str, inputs, args: list = None, max_workers: int = None, on_progress=None) -> BatchProgress:
+        """
+        複数のファイルそれぞれに対して同じレシピをプロセスプールで並列に実行する
+        ファイルごとにレシピのエントリができ、終わった順に結果がワークスペースに書き込まれる
+        
+        Args:
+            recipe_name (str): レシピ名
+            inputs (str | list): ファイルのglobパターン(dir/*など) またはそのリスト 一致したファイルがinput.0になる
+            args (list): input.1以降の引数(全てのファイルで共通)
+            max_workers (int): 同時に実行するプロセス数 Noneならbudget.max_jobs(無ければcpu数)
+            on_progress (callable): ファイルが1つ終わるたびに(BatchProgress, そのファイルの結果のdict)を引数に呼ばれる
+        
+        Returns:
+            BatchProgress: ファイルごとのID/状態/時間と、全体の集計(summary())
+        """
+        files = expand_batch_inputs(inputs)
+        if not files:
+            raise FileNotFoundError(f"Error: no files match {inputs}.")
+        return run_batch(self, recipe_name, files, args or [], max_workers=max_workers or self.budget.max_jobs, on_progress=on_progress)
+    
+    async def run_recipe_async(self, recipe_name: str, args: list, timeout: float = None, on_output=None, quote_input: bool = False) -> str:
+        """
+        レシピの非同期実行
+        実行の完了は待たずにIDを返す 結果はwait_recipeで待つ
+        
+        Args:
+            on_output (callable): ステップのstdoutを受け取るたびに(inrecipe-name, chunk)を引数に呼ばれる
+            quote_input (bool): run_module_asyncと同じ
+        """
+        with tracing.collect() as trace:
+            recipe = Recipe(recipe_name, self.get_states(), self.budget.limits, quote_input)
+            recipe_id = self.get_next_recipe_id()
+            with self.lock:
+                self.recipe_state[recipe_id] = {
+                        "recipe" : recipe,
+                        "name"   : recipe_name,
+                        "args"   : args,
+                        "running": True,
+                        "status" : "pending",
+                        "output" : [],
+                        "trace"  : trace,
+                    }
+            self.jobs.submit(recipe_id, recipe.run_async(args, on_output), timeout=timeout, on_status=self._update_state("recipe", recipe_id), memory=recipe.get_memory_limit())
+        
+        return recipe_id
+    
+    async def wait_recipe(self, id: str) -> object:
+        await self.jobs.wait(id)
+        return self.get_recipe_result(id)
     
     def get_recipe_result(self, id) -> object:
         if id not in self.recipe_state:
@@ -104,10 +311,12 @@ class WorkSpace:
         # todo raiseするのは違うよね
         if self.recipe_state[id]["running"]:
             raise KeyError("recipe_id: {} is running".format(id))
+        if self.recipe_state[id].get("status") in ("failed", "cancelled"):
+            raise RuntimeError("recipe_id: {} is {}".format(id, self.recipe_state[id]["status"]))
         
-        self.recipe_state[id]["output"] = self.recipe_state[id]["recipe"].get_result()
-        
-        # del self.recipe_state[id]["recipe"] # レシピは実行後に破棄 todo 後で確認
+        if "recipe" in self.recipe_state[id]:
+            # 古いpickleから読み込んだワークスペースにはレシピが残っている
+            self.recipe_state[id]["output"] = self.recipe_state[id]["recipe"].get_result()
         
         return self.recipe_state[id]["output"]
     
@@ -115,7 +324,9 @@ class WorkSpace:
         if id not in self.recipe_state:
             raise KeyError("recipe_id: {} not found".format(id))
         
-        return self.recipe_state[id]["recipe"].get_variables()
+        if "recipe" in self.recipe_state[id]:
+            return self.recipe_state[id]["recipe"].get_variables()
+        return self.recipe_state[id].get("variables", {})
     
     def get_recipe_state_list(self) -> object:
         return self.recipe_state
@@ -127,15 +338,258 @@ class WorkSpace:
     def get_recipe_info(recipe_name: str) -> str:
         return Recipe.get_recipe_info(recipe_name)
     
+    @staticmethod
+    def warmup_environments(max_workers: int = None) -> dict:
+        """
+        venvを使うモジュールの環境を事前に並列で用意する
+        """
+        return Module.warmup_environments(max_workers=max_workers)
+    
+    @staticmethod
+    def get_cache_stats() -> dict:
+        """
+        モジュール実行結果キャッシュのヒット/ミス数など
+        """
+        return result_cache.stats()
+    
     def run_cmd(self, args: list) -> str:
-        pass
+        cmd_id = self.get_next_cmd_id()
+        shell = subprocess.run(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+        with self.lock:
+            self.cmd_state[cmd_id] = {
+                "cmd"    : args,
+                "running": False,
+                "status" : "done",
+                "output" : shell.stdout.decode(errors="replace")
+                }
+        self._finish("cmd", cmd_id)
+        
+        return cmd_id
     
-    def run_cmd_async(self, args: list) -> str:
-        pass
+    async def run_cmd_async(self, args: list, timeout: float = None) -> str:
+        cmd_id = self.get_next_cmd_id()
+        with self.lock:
+            self.cmd_state[cmd_id] = {
+                    "cmd"    : args,
+                    "running": True,
+                    "status" : "pending",
+                    "output" : ""
+                }
+        
+        async def run():
+            process = await asyncio.create_subprocess_exec(*args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+            try:
+                stdout, _ = await process.communicate()
+            except asyncio.CancelledError:
+                process.kill()
+                await process.wait()
+                raise
+            self.cmd_state[cmd_id]["output"] = stdout.decode(errors="replace")
+        
+        self.jobs.submit(cmd_id, run(), timeout=timeout, on_status=self._update_state("cmd", cmd_id))
+        return cmd_id
     
     def get_cmd_result(self, id: str) -> object:
-        pass
+        if id not in self.cmd_state:
+            raise KeyError("cmd_id: {} not found".format(id))
+        
+        if self.cmd_state[id]["running"]:
+            raise RuntimeError("cmd_id: {} is running".format(id))
+        
+        return self.cmd_state[id]["output"]
+    
+    def get_result(self, id: str) -> object:
+        """
+        モジュール/レシピ/コマンドのいずれかの実行結果をIDから取得する
+        """
+        if id in self.module_state:
+            return self.get_module_result(id)
+        if id in self.recipe_state:
+            return self.get_recipe_result(id)
+        if id in self.cmd_state:
+            return self.get_cmd_result(id)
+        raise KeyError("id: {} not found".format(id))
+    
+    def get_trace(self, id: str) -> list:
+        """
+        エントリの実行中に記録したスパンを返す
+        
+        Args:
+            id (str): モジュール/レシピのID または "workspace"(保存/読み込みなど)
+        
+        Returns:
+            list: スパン(dict)のリスト
+        """
+        if id == "workspace":
+            return self.trace.to_json()
+        for state in (self.module_state, self.recipe_state, self.cmd_state):
+            if id in state:
+                trace = state[id].get("trace") or []
+                return trace.to_json() if isinstance(trace, tracing.Trace) else trace
+        raise KeyError("id: {} not found".format(id))
+    
+    def get_traces(self, ids: list = None) -> dict:
+        """
+        Args:
+            ids (list): エントリのID Noneならスパンのある全てのエントリと"workspace"
+        
+        Returns:
+            dict: ID -> スパンのリスト
+        """
+        with self.lock:
+            if ids is None:
+                ids = [id for states in (self.module_state, self.recipe_state) for id, state in states.items() if "trace" in state]
+                ids.append("workspace")
+            return {id: self.get_trace(id) for id in ids}
+    
+    def export_trace(self, path: str, ids: list = None) -> int:
+        """
+        スパンをChrome trace形式(chrome://tracing, https://ui.perfetto.dev で開ける)のJSONに書き出す
+        
+        Returns:
+            int: 書き出したスパンの数
+        """
+        return tracing.write_chrome_trace(self.get_traces(ids), path)
+    
+    def get_profile(self, ids: list = None) -> list:
+        """
+        スパンを名前ごとに集計する
+        
+        Returns:
+            list: tracing.summarizeの結果
+        """
+        return tracing.summarize([span for spans in self.get_traces(ids).values() for span in spans])
+    
+    def get_job_status(self, id: str) -> str:
+        """
+        Returns:
+            str: pending / running / done / failed / cancelled
+        """
+        with self.lock:
+            for state in (self.module_state, self.recipe_state, self.cmd_state):
+                if id in state:
+                    return state[id].get("status", "done")
+        raise KeyError("id: {} not found".format(id))
+    
+    def cancel_job(self, id: str) -> bool:
+        return self.jobs.cancel(id)
+    
+    def _update_state(self, kind: str, id: str):
+        states = {"module": self.module_state, "recipe": self.recipe_state, "cmd": self.cmd_state}
+        state = states[kind][id]
+        def on_status(job):
+            with self.lock:
+                state["status"] = job.status
+                state["running"] = job.status in ("pending", "running")
+                if job.error is not None:
+                    state["error"] = str(job.error)
+                if not state["running"]:
+                    self._finish(kind, id)
+            for listener in list(self.listeners):
+                listener(kind, id, state)
+        return on_status
+    
+    def _finish(self, kind: str, id: str) -> None:
+        """
+        終わったエントリの結果を確定させ、モジュール/レシピのオブジェクトを破棄する
+        ストアがあればその場で書き込み、なければ次のsave_workspaceまで覚えておく
+        """
+        with self.lock:
+            self._finish_locked(kind, id)
+    
+    def _finish_locked(self, kind: str, id: str) -> None:
+        states = {"module": self.module_state, "recipe": self.recipe_state, "cmd": self.cmd_state}
+        state = states[kind][id]
+        # cmdの"cmd"は実行したコマンドなので残す
+        execution = state.pop(kind, None) if kind != "cmd" else None
+        trace = state.get("trace")
+        with tracing.collect(trace if isinstance(trace, tracing.Trace) else None):
+            if execution is not None and state["status"] == "done":
+                state["output"] = execution.get_result()
+                if kind == "recipe":
+                    state["variables"] = execution.get_variables()
+        if isinstance(trace, tracing.Trace):
+            # 保存できるようにdictのリストにする
+            state["trace"] = trace.to_json()
+        
+        self.unsaved[id] = kind
+        if self.store is not None:
+            self.flush()
+        self.get_index().add(id, state.get("output"))
+    
+    def get_index(self) -> TrigramIndex:
+        """
+        全文検索用の索引を返す
+        まだ無ければ作り、索引に入っていない終わった結果を全て追加する
+        """
+        with self.lock:
+            return self._get_index()
+    
+    def _get_index(self) -> TrigramIndex:
+        if self.index is None:
+            self.index = self.store.open_index() if self.store is not None else TrigramIndex()
+            indexed = self.index.indexed_entries()
+            for states in (self.module_state, self.recipe_state, self.cmd_state):
+                for id, state in states.items():
+                    if not state.get("running") and id not in indexed:
+                        self.index.add(id, state.get("output"))
+        return self.index
+    
+    def search(self, pattern: str, flags: int = 0, limit: int = 100) -> list:
+        """
+        全ての結果から正規表現にマッチする箇所を探す
+        索引で候補を絞ってから、候補の文字列だけを実際に検索する
+        
+        Args:
+            pattern (str): 正規表現
+            flags (int): reのフラグ
+            limit (int): 返す最大件数
+        
+        Returns:
+            list: {"id", "path", "offset", "match", "line"} のリスト
+        """
+        regex = re.compile(pattern, flags)
+        # 候補を決めるまでロックし、候補の文字列の検索は他のクライアントを止めずに行う
+        with self.lock:
+            states = {**self.module_state, **self.recipe_state, **self.cmd_state}
+            candidates = list(self.get_index().candidates(pattern, flags))
+        results = []
+        for id, path in candidates:
+            if len(results) >= limit:
+                break
+            try:
+                value = states[id]
+                for key in path.split("."):
+                    value = value[int(key)] if isinstance(value, list) else value[key]
+            except (KeyError, IndexError, ValueError, TypeError):
+                continue
+            for offset, match, line in search_text(value, regex, limit - len(results)):
+                results.append({"id": id, "path": path, "offset": offset, "match": match, "line": line})
+        return results
 
+    def get_states(self) -> dict:
+        """
+        Returns:
+            dict: module_stateとrecipe_stateをまとめたもの(テンプレートの参照先) ロックしてコピーする
+        """
+        with self.lock:
+            return dict(**self.module_state, **self.recipe_state)
+    
+    def get_entries(self) -> list:
+        """
+        Returns:
+            list: 全てのエントリの {"id", "kind", "name", "status", "args", "error"} のリスト
+        """
+        with self.lock:
+            return [{
+                "id": id,
+                "kind": kind,
+                "name": state.get("name") or " ".join(state.get("cmd") or []),
+                "status": state.get("status", "done"),
+                "args": state.get("args") if kind != "cmd" else state.get("cmd"),
+                "error": state.get("error"),
+            } for kind, states in (("module", self.module_state), ("recipe", self.recipe_state), ("cmd", self.cmd_state)) for id, state in states.items()]
+    
     def get_next_module_id(self) -> str:
         return "module-" + str(uuid.uuid4())
     